@@ -209,6 +209,20 @@ class ValueTooHigh(BadRequestError):
     id = "value-too-high"
 
 
+class UnknownMetric(BadRequestError):
+    """400 Unknown telemetry history metric"""
+    title = "Unknown metric"
+    text = "The telemetry history does not keep this metric"
+    id = "unknown-metric"
+
+
+class InvalidTimestamp(BadRequestError):
+    """400 Invalid timestamp"""
+    title = "Invalid timestamp"
+    text = "The timestamp has to be a number of seconds since the epoch"
+    id = "invalid-timestamp"
+
+
 class CantMoveAxis(BadRequestError):
     """400 Can't Move Axis"""
     title = "Can't move axis"
@@ -105,6 +105,9 @@ class Config(Get):
                     ("pid_file", str, "./prusalink.pid"),
                     ("power_panic_file", str, "./power_panic"),
                     ("threshold_file", str, "./threshold.data"),
+                    ("identity_file", str, "./printer_identity.json"),
+                    ("metadata_index_file", str, "./metadata_index.json"),
+                    ("thumbnail_dir", str, ""),
                     ("user", str, "pi"),
                     ("group", str, "pi"),
                     ("printer_number", int, None),
@@ -124,11 +127,15 @@ class Config(Get):
         if args.printer_number is not None:
             self.daemon.printer_number = args.printer_number
 
-        for file_ in ('pid_file', 'power_panic_file', 'threshold_file'):
+        for file_ in ('pid_file', 'power_panic_file', 'threshold_file',
+                      'identity_file', 'metadata_index_file'):
             setattr(
                 self.daemon, file_,
                 abspath(join(self.daemon.data_dir, getattr(self.daemon,
                                                            file_))))
+        if self.daemon.thumbnail_dir:
+            self.daemon.thumbnail_dir = abspath(
+                join(self.daemon.data_dir, self.daemon.thumbnail_dir))
 
         # [logging]
         self.set_global_log_level(args)
@@ -178,6 +185,9 @@ class Config(Get):
                     # Your 32u2 EEPROM might wear out and the enable/disable
                     # would get stuck in one or the other state
                     ("reset_disabling", bool, False),
+                    # How many print instructions can wait for confirmation
+                    # at once, one sends them strictly one by one
+                    ("pipeline_depth", int, 1),
                     ("settings", str, "./prusa_printer_settings.ini"),
                     # Support for monitoring mountpoints temporarily off
                     # ("storage", tuple, [], ':'),
@@ -69,6 +69,8 @@ TELEMETRY_PRINTING_INTERVAL = 1
 TELEMETRY_SLEEPING_INTERVAL = 4  # can be sleeping in any state
 TELEMETRY_SLEEP_AFTER = 3 * 60
 TELEMETRY_REFRESH_INTERVAL = 5 * 60  # full telemetry re-send
+# The telemetry history bucket lengths and counts: 10 min, 1 h and 24 h
+TELEMETRY_HISTORY_LEVELS = ((1, 600), (10, 360), (60, 1440))
 
 FAST_POLL_INTERVAL = 1
 SLOW_POLL_INTERVAL = 10  # for values, that aren't that important
@@ -110,6 +112,9 @@ RX_SIZE = 128  # Not used much, limits the max serial message size
 SERIAL_QUEUE_TIMEOUT = 25
 SERIAL_QUEUE_MONITOR_INTERVAL = 1
 HISTORY_LENGTH = 100  # How many messages to remember for Resends
+DECOUPLED_WORKERS = 3  # Threads running the decoupled serial handlers
+EEPROM_MAX_GAP = 64  # Unused bytes worth reading to merge two EEPROM reads
+EEPROM_MAX_AGE = 0.5  # How long can a merged EEPROM read serve other values
 
 # --- Is planner fed ---
 QUEUE_SIZE = 10000  # From how many messages to compute the percentile
@@ -122,6 +127,7 @@ USE_DYNAMIC_THRESHOLD = True  # Compute the percentile or use a fixed value?
 STATS_EVERY = 100
 TAIL_COMMANDS = 10  # how many commands after the last progress report
 PRINT_QUEUE_SIZE = 4
+PRINT_BATCH_SIZE = 4  # how many print instructions to enqueue at once
 
 # --- Storage ---
 MAX_FILENAME_LENGTH = 52
@@ -135,6 +141,8 @@ BLACKLISTED_PATHS = [
 ]
 BLACKLISTED_NAMES = [SD_STORAGE_NAME]
 SFN_TO_LFN_EXTENSIONS = {"GCO": "gcode", "G": "g", "GC": "gc"}
+METADATA_WORKERS = 2  # Threads parsing the gcode metadata for the index
+THUMBNAIL_CACHE_SIZE = 8 * 1024 * 1024  # Bytes of decoded thumbnails kept
 
 RESET_PIN = 22  # RPi gpio pin for resetting printer
 SUPPORTED_FIRMWARE = "3.14.0"
@@ -53,6 +53,7 @@ class Daemon:
             adapter_logger.exception("Adapter was not start")
             self.http.stop()
             return 1
+        app.thumbnails.follow(self.prusa_link.metadata_index)
 
         try:
             self.prusa_link.stopped_event.wait()
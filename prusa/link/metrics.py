@@ -0,0 +1,111 @@
+"""
+Contains implementation of the LatencyHistogram class and the registries
+of histograms and gauges
+
+The histograms are cheap enough to stay on in production, recording a value
+is a bisect into a fixed list of bucket bounds and a few additions.
+Updates are not locked, under contention a sample can rarely get lost,
+which is fine for monitoring purposes.
+"""
+from bisect import bisect_left
+from typing import Callable, Dict, List
+
+# Bucket upper bounds in seconds, doubling from 1 us to ~33 s
+BUCKET_BOUNDS: List[float] = [2**exponent / 1_000_000
+                              for exponent in range(26)]
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+class LatencyHistogram:
+    """Counts durations into exponentially growing buckets"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        # The last bucket is for everything above the last bound
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, duration: float) -> None:
+        """Counts a duration in seconds"""
+        self.counts[bisect_left(BUCKET_BOUNDS, duration)] += 1
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def percentile(self, ratio: float) -> float:
+        """
+        Estimates the percentile as the upper bound of the bucket it falls
+        into, in seconds. The maximum if it's in the overflow bucket
+        """
+        if not self.count:
+            return 0.0
+        rank = ratio * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                if index < len(BUCKET_BOUNDS):
+                    return min(BUCKET_BOUNDS[index], self.max)
+                break
+        return self.max
+
+    def to_dict(self) -> Dict:
+        """Returns the histogram in a json friendly format, in ms"""
+        result = {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0,
+            "max_ms": self.max * 1000,
+        }
+        for ratio in PERCENTILES:
+            result[f"p{round(ratio * 100)}_ms"] = \
+                self.percentile(ratio) * 1000
+        result["buckets"] = [
+            [bound * 1000, count]
+            for bound, count in zip(BUCKET_BOUNDS + [float("inf")],
+                                    self.counts) if count]
+        return result
+
+    def reset(self) -> None:
+        """Forgets all recorded durations"""
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+HISTOGRAMS: Dict[str, LatencyHistogram] = {}
+
+
+def histogram(name: str) -> LatencyHistogram:
+    """Returns the histogram of the given name, creates it if needed"""
+    if name not in HISTOGRAMS:
+        HISTOGRAMS[name] = LatencyHistogram(name)
+    return HISTOGRAMS[name]
+
+
+def histograms_dict() -> Dict[str, Dict]:
+    """Returns all histograms in a json friendly format"""
+    return {name: latency_histogram.to_dict()
+            for name, latency_histogram in sorted(HISTOGRAMS.items())}
+
+
+GAUGES: Dict[str, Callable[[], float]] = {}
+
+
+def gauge(name: str, getter: Callable[[], float]) -> None:
+    """Registers a function returning the current value of something"""
+    GAUGES[name] = getter
+
+
+def gauges_dict() -> Dict[str, float]:
+    """Returns the current values of all gauges"""
+    return {name: getter() for name, getter in sorted(GAUGES.items())}
+
+
+# The serial pipeline
+ENQUEUE_TO_SEND = histogram("serial_enqueue_to_send")
+SEND_TO_OK = histogram("serial_send_to_ok")
+READ_TO_DISPATCH = histogram("serial_read_to_dispatch")
+DECOUPLED_WAIT = histogram("serial_decoupled_wait")
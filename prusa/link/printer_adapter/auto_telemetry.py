@@ -35,15 +35,23 @@ class AutoTelemetry(ThreadedUpdatable):
         self.serial_queue = serial_queue
         self.model: Model = model
         self.telemetry_passer = telemetry_passer
+        # The autoreports are frequent, do not hold up other handlers
+        # and if behind, skip straight to the newest values
         self.serial_parser.add_decoupled_handler(
-                TEMPERATURE_REGEX, self.temps_recorded)
+                TEMPERATURE_REGEX, self.temps_recorded, key="telemetry",
+                coalesce=True)
         self.serial_parser.add_decoupled_handler(
-                HEATING_REGEX, self.temps_recorded)
+                HEATING_REGEX, self.temps_recorded, key="telemetry",
+                coalesce=True)
         self.serial_parser.add_decoupled_handler(
-                HEATING_HOTEND_REGEX, self.temps_recorded)
+                HEATING_HOTEND_REGEX, self.temps_recorded, key="telemetry",
+                coalesce=True)
         self.serial_parser.add_decoupled_handler(
-                POSITION_REGEX, self.positions_recorded)
-        self.serial_parser.add_decoupled_handler(FAN_REGEX, self.fans_recorded)
+                POSITION_REGEX, self.positions_recorded, key="telemetry",
+                coalesce=True)
+        self.serial_parser.add_decoupled_handler(
+                FAN_REGEX, self.fans_recorded, key="telemetry",
+                coalesce=True)
 
         self.last_seen_positions = 0.
         self.last_seen_fans = 0.
@@ -0,0 +1,128 @@
+"""
+Contains implementation of the EEPROMReader class
+
+Reading the EEPROM with the D3 code costs a serial round trip per read.
+The variables PrusaLink reads are mostly close to each other. When more
+of them are waiting to be read, like when the printer info gets refreshed,
+their address ranges get merged into a single D3 read. A fresh read then
+serves all the variables inside it. A lone variable gets read by itself.
+"""
+import logging
+import re
+from threading import Lock
+from time import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from ..const import EEPROM_MAX_AGE, EEPROM_MAX_GAP
+from ..util import get_d3_code
+from .structures.model_classes import EEPROMParams
+from .structures.regular_expressions import D3_OUTPUT_REGEX
+
+log = logging.getLogger(__name__)
+
+# address, byte count
+Span = Tuple[int, int]
+
+
+def merge_ranges(ranges: Iterable[Span], max_gap: int) -> List[Span]:
+    """
+    Merges the address ranges, which overlap or are at most max_gap bytes
+    apart, into spans sorted by address
+    """
+    spans: List[Span] = []
+    for address, count in sorted(ranges):
+        if spans:
+            span_address, span_count = spans[-1]
+            span_end = span_address + span_count
+            if address - span_end <= max_gap:
+                end = max(span_end, address + count)
+                spans[-1] = (span_address, end - span_address)
+                continue
+        spans.append((address, count))
+    return spans
+
+
+def parse_d3_output(matches: List[re.Match], count: int) -> bytes:
+    """Puts together the hex dump lines of a D3 read"""
+    data = bytes.fromhex("".join(match.group("data").replace(" ", "")
+                                 for match in matches))
+    if len(data) < count:
+        raise RuntimeError(f"The EEPROM read returned {len(data)} bytes "
+                           f"instead of {count}")
+    return data[:count]
+
+
+class EEPROMReader:
+    """
+    Serves the EEPROM variables from merged D3 reads. Only the ranges,
+    which are waiting to be read at the same time get merged, a read
+    serves them for at most EEPROM_MAX_AGE
+    """
+
+    def __init__(self,
+                 do_multimatch: Callable[..., List[re.Match]],
+                 pending: Optional[Callable[[], Iterable[Span]]] = None,
+                 max_gap: int = EEPROM_MAX_GAP,
+                 max_age: float = EEPROM_MAX_AGE) -> None:
+        """
+        :param do_multimatch: sends a gcode and returns its output matches
+        :param pending: returns the address ranges waiting to be read,
+            nothing gets merged without it
+        :param max_gap: how many unused bytes to read to spare a read
+        :param max_age: for how long can a read serve the other variables
+        """
+        self.do_multimatch = do_multimatch
+        self.pending = pending
+        self.max_gap = max_gap
+        self.max_age = max_age
+        self.lock = Lock()
+        # span -> (read at, data)
+        self.cache: Dict[Span, Tuple[float, bytes]] = {}
+
+    def _span_for(self, address: int, count: int) -> Span:
+        """Returns the range merged with the pending ones close to it"""
+        ranges = [(address, count)]
+        if self.pending is not None:
+            ranges.extend(self.pending())
+        for span_address, span_count in merge_ranges(ranges, self.max_gap):
+            if span_address <= address and \
+                    address + count <= span_address + span_count:
+                return span_address, span_count
+        return address, count
+
+    def _cached(self, address: int, count: int) -> Optional[bytes]:
+        """Returns the range from a fresh read, forgets the old reads"""
+        now = time()
+        found = None
+        for span, (read_at, data) in list(self.cache.items()):
+            if now - read_at > self.max_age:
+                del self.cache[span]
+                continue
+            span_address, span_count = span
+            if span_address <= address and \
+                    address + count <= span_address + span_count:
+                offset = address - span_address
+                found = data[offset:offset + count]
+        return found
+
+    def read(self, address: int, count: int) -> bytes:
+        """Returns count bytes of the EEPROM from the given address"""
+        with self.lock:
+            data = self._cached(address, count)
+            if data is not None:
+                return data
+            span_address, span_count = self._span_for(address, count)
+            if span_count != count:
+                log.debug("EEPROM range %s, %s merged into %s, %s",
+                          address, count, span_address, span_count)
+            matches = self.do_multimatch(
+                get_d3_code(span_address, span_count),
+                D3_OUTPUT_REGEX, to_front=True)
+            data = parse_d3_output(matches, span_count)
+            self.cache[(span_address, span_count)] = (time(), data)
+        offset = address - span_address
+        return data[offset:offset + count]
+
+    def read_param(self, param: EEPROMParams) -> bytes:
+        """Returns the bytes of the EEPROM variable"""
+        return self.read(*param.value)
@@ -12,6 +12,7 @@ from blinker import Signal  # type: ignore
 from ..config import Config
 from ..const import (
     HISTORY_LENGTH,
+    PRINT_BATCH_SIZE,
     PRINT_QUEUE_SIZE,
     QUIT_INTERVAL,
     STATS_EVERY,
@@ -21,7 +22,8 @@ from ..serial.helpers import enqueue_instruction, wait_for_instruction
 from ..serial.instruction import Instruction
 from ..serial.serial_parser import ThreadedSerialParser
 from ..serial.serial_queue import SerialQueue
-from ..util import get_clean_path, get_gcode, get_print_stats_gcode, prctl_name
+from ..util import get_clean_path, get_print_stats_gcode, prctl_name
+from .gcode_stream import gcode_commands
 from .model import Model
 from .print_stats import PrintStats
 from .structures.mc_singleton import MCSingleton
@@ -73,6 +75,7 @@ class FilePrinter(metaclass=MCSingleton):
             file_path="",
             pp_file_path=get_clean_path(cfg.daemon.power_panic_file),
             enqueued=deque(),
+            batch=[],
             gcode_number=0)
         self.data = self.model.file_printer
 
@@ -121,6 +124,7 @@ class FilePrinter(metaclass=MCSingleton):
         self.data.power_panic = False
         self.data.paused = False
         self.data.enqueued.clear()
+        self.data.batch.clear()
         self.print_stats.start_time_segment()
         self.new_print_started_signal.send(self)
         self.print_stats.track_new_print(self.data.file_path,
@@ -145,34 +149,34 @@ class FilePrinter(metaclass=MCSingleton):
             goes into pause when the correct gcode number is reached
         """
         history_accumulator = []
+        start = 0
+        if self.data.recovering:
+            # Nothing before the history is needed, seek right to it
+            start = max(0, from_gcode_number - HISTORY_LENGTH)
 
         prctl_name()
         total_size = os.path.getsize(self.data.file_path)
-        with open(self.data.file_path, "r", encoding='utf-8') as file:
-            self.data.gcode_number = 0
+        with gcode_commands(self.data.file_path, start) as commands:
+            self.data.gcode_number = start
             self.data.enqueued.clear()
+            self.data.batch.clear()
 
             if not self.data.recovering:
                 # Reset the line counter, printing a new file
                 self.serial_queue.reset_message_number()
                 self.do_instruction("M75")  # start printer's print timer
 
-            while True:
-                line = file.readline()
-
-                # Recognise the end of the file
-                if line == "" or not self.data.printing:
+            for gcode, current_byte, layer_change in commands:
+                if not self.data.printing:
                     break
 
-                gcode = get_gcode(line)
                 # Skip to the part we need to recover from
                 if (self.data.recovering
                         and from_gcode_number > self.data.gcode_number):
-                    if gcode:
-                        history_from = from_gcode_number - HISTORY_LENGTH
-                        if self.data.gcode_number >= history_from:
-                            history_accumulator.append(gcode)
-                        self.data.gcode_number += 1
+                    history_from = from_gcode_number - HISTORY_LENGTH
+                    if self.data.gcode_number >= history_from:
+                        history_accumulator.append(gcode)
+                    self.data.gcode_number += 1
                     continue
 
                 # Skip finished, pause here, remove the recovering flag
@@ -184,24 +188,26 @@ class FilePrinter(metaclass=MCSingleton):
                 # This will make it PRINT_QUEUE_SIZE lines in front of what
                 # is being sent to the printer, which is another as much as
                 # 16 gcode commands in front of what's actually being printed.
-                current_byte = file.tell()
                 self.byte_position_signal.send(self,
                                                current=current_byte,
                                                total=total_size)
 
                 if self.data.paused:
+                    self.flush_batch()
                     self._print_pause()
                     if not self.data.printing:
                         break
 
                 # Trigger cameras on layer change
-                if ";LAYER_CHANGE" in line:
+                if layer_change:
                     self.layer_trigger_signal.send()
 
-                if gcode:
-                    self.print_gcode(gcode)
-                    self.wait_for_queue()
-                    self.react_to_gcode(gcode)
+                self.print_gcode(gcode)
+                self.wait_for_queue()
+                self.react_to_gcode(gcode)
+
+            if self.data.printing:
+                self.flush_batch()
 
             # Print ended
             self._print_end()
@@ -230,6 +236,7 @@ class FilePrinter(metaclass=MCSingleton):
     def _print_end(self):
         """Handles the end of a file print"""
         self.data.enqueued.clear()
+        self.data.batch.clear()
         self.print_stats.reset_stats()
         log.debug("Print ended")
 
@@ -274,30 +281,29 @@ class FilePrinter(metaclass=MCSingleton):
             if self.to_print_stats(self.data.gcode_number):
                 self.send_print_stats()
 
-            log.debug("USB enqueuing gcode: %s", gcode)
-            instruction = enqueue_instruction(self.serial_queue,
-                                              gcode,
-                                              to_front=True,
-                                              to_checksum=True)
+            log.debug("USB batching gcode: %s", gcode)
+            instruction = Instruction(gcode, to_checksum=True)
+            self.data.batch.append(instruction)
             self.data.enqueued.append(instruction)
 
+    def flush_batch(self) -> None:
+        """Hands the batched instructions over to the serial queue"""
+        if not self.data.batch:
+            return
+        self.serial_queue.enqueue_list(self.data.batch, to_front=True)
+        self.data.batch = []
+
     def wait_for_queue(self) -> None:
-        """Gets rid of already confirmed messages and waits for any
-        unconfirmed surplus"""
-        # Pop all already confirmed instructions from the queue
-        while self.data.enqueued:  # ensure there is at least one item
-            instruction = self.data.enqueued.popleft()
-            if not instruction.is_confirmed():
-                self.data.enqueued.appendleft(instruction)
-                break
-            log.debug("Throwing out trash %s", instruction.message)
-        # If there are more than allowed and yet unconfirmed messages
-        # Wait for the surplus ones
-        while len(self.data.enqueued) >= PRINT_QUEUE_SIZE:
-            wait_for: Instruction = self.data.enqueued.popleft()
-            wait_for_instruction(wait_for, lambda: self.data.printing)
-
-            log.debug("%s confirmed", wait_for.message)
+        """Once the batch is full, enqueues it and waits for the unconfirmed
+        surplus. The batch gets read while there's still PRINT_QUEUE_SIZE - 1
+        unconfirmed instructions, so the printer does not wait for it"""
+        if len(self.data.batch) < PRINT_BATCH_SIZE:
+            return
+        self.flush_batch()
+        # Keep the serial pipeline full
+        queue_size = PRINT_QUEUE_SIZE + self.serial_queue.pipeline_depth - 1
+        self.serial_queue.wait_for_confirmations(
+            self.data.enqueued, queue_size, lambda: self.data.printing)
 
     def react_to_gcode(self, gcode):
         """
@@ -325,9 +331,8 @@ class FilePrinter(metaclass=MCSingleton):
             normal_left=time_remaining,
             quiet_percent=percent_done,
             quiet_left=time_remaining)
-        instruction = enqueue_instruction(self.serial_queue,
-                                          stat_command,
-                                          to_front=True)
+        instruction = Instruction(stat_command)
+        self.data.batch.append(instruction)
         self.data.enqueued.append(instruction)
 
     def to_print_stats(self, gcode_number):
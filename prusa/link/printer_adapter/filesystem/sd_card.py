@@ -362,7 +362,8 @@ class SDCard(ThreadedUpdatable):
 
         instruction = enqueue_matchable(self.serial_queue,
                                         message="M20 LT",
-                                        regexp=LFN_CAPTURE)
+                                        regexp=LFN_CAPTURE,
+                                        coalesce=True)
         wait_for_instruction(instruction, should_wait_evt=self.quit_evt)
         matches = instruction.get_matches()
         file_tree_parser = FileTreeParser(matches)
@@ -417,6 +418,7 @@ class SDCard(ThreadedUpdatable):
             self._set_files(FileTreeParser(matches=[]))
 
         self.data.sd_state = new_state
+        self.model.generation.bump()
         self.state_changed_signal.send(self, sd_state=self.data.sd_state)
 
     def decide_presence(self):
@@ -0,0 +1,303 @@
+"""
+Contains the implementation of the pre-tokenized gcode stream
+
+A gcode file gets sanitized once into a hidden binary sidecar file next to it
+.<filename>.stream containing just the ASCII gcode commands, the source file
+byte positions and layer change markers. Printing then streams the sidecar
+through mmap without re-doing the string sanitization for every line.
+
+The sidecar format is a header followed by records, each record being
+a record header and the command bytes. After the records comes the index
+- the layer changes and checkpoints every CHECKPOINT_INTERVAL gcodes, so
+the file info needed for a print start is available without a re-scan.
+"""
+import logging
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+from itertools import islice
+from tempfile import NamedTemporaryFile
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+from ..util import get_gcode, prctl_name
+from .updatable import Thread
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"PLGS"
+VERSION = 2
+# magic, version, source size, source mtime in ns, gcode count, file flags,
+# index offset, layer change count, checkpoint count
+HEADER = struct.Struct("<4sHQqIBQII")
+# source bytes consumed since the last record, command length, flags
+RECORD = struct.Struct("<IHB")
+# gcode number, source byte position before the gcode
+LAYER = struct.Struct("<IQ")
+# sidecar offset of the record, source byte position before its gcode
+CHECKPOINT = struct.Struct("<QQ")
+CHECKPOINT_INTERVAL = 1000
+
+LAYER_CHANGE_FLAG = 0b1
+INBUILT_STATS_FLAG = 0b1
+LAYER_CHANGE = ";LAYER_CHANGE"
+INBUILT_STATS = "M73"
+
+# gcode, source byte position after the command, layer change before it
+Command = Tuple[str, int, bool]
+
+
+def get_stream_path(path: str) -> str:
+    """Returns the sidecar path for a gcode file path
+    in format .<filename>.stream"""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.stream")
+
+
+class StreamWriter:
+    """Writes the sidecar records, makes the sidecar visible only
+    after a successful finish"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.stat = os.stat(path)
+        self.file = NamedTemporaryFile(  # pylint: disable=consider-using-with
+            dir=os.path.dirname(path) or ".",
+            prefix=".", suffix=".stream.part", delete=False)
+        self.file.write(bytes(HEADER.size))
+        self.offset = HEADER.size
+        self.gcode_count = 0
+        self.last_position = 0
+        self.file_flags = 0
+        self.layers: List[Tuple[int, int]] = []
+        self.checkpoints: List[Tuple[int, int]] = []
+
+    def add(self, gcode: str, position: int, layer_change: bool) -> None:
+        """Adds a command record, keeps track of the index"""
+        if self.gcode_count % CHECKPOINT_INTERVAL == 0:
+            self.checkpoints.append((self.offset, self.last_position))
+        flags = 0
+        if layer_change:
+            flags |= LAYER_CHANGE_FLAG
+            self.layers.append((self.gcode_count, self.last_position))
+        if INBUILT_STATS in gcode:
+            self.file_flags |= INBUILT_STATS_FLAG
+        data = gcode.encode("ascii")
+        self.file.write(RECORD.pack(position - self.last_position,
+                                    len(data), flags))
+        self.file.write(data)
+        self.offset += RECORD.size + len(data)
+        self.last_position = position
+        self.gcode_count += 1
+
+    def finish(self) -> None:
+        """Writes the index and the header,
+        then moves the sidecar into place"""
+        for layer in self.layers:
+            self.file.write(LAYER.pack(*layer))
+        for checkpoint in self.checkpoints:
+            self.file.write(CHECKPOINT.pack(*checkpoint))
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.stat.st_size,
+                                    self.stat.st_mtime_ns, self.gcode_count,
+                                    self.file_flags, self.offset,
+                                    len(self.layers), len(self.checkpoints)))
+        self.file.close()
+        if not is_source_unchanged(self.path, self.stat.st_size,
+                                   self.stat.st_mtime_ns):
+            self.discard()
+            return
+        os.replace(self.file.name, get_stream_path(self.path))
+
+    def discard(self) -> None:
+        """Throws away the unfinished sidecar"""
+        self.file.close()
+        try:
+            os.unlink(self.file.name)
+        except FileNotFoundError:
+            pass
+
+
+def is_source_unchanged(path: str, size: int, mtime_ns: int) -> bool:
+    """Checks the gcode file still has the given size and mtime"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    return stat.st_size == size and stat.st_mtime_ns == mtime_ns
+
+
+def text_commands(file: BinaryIO,
+                  writer: Optional[StreamWriter] = None) -> Iterator[Command]:
+    """
+    Reads and sanitizes the gcode file line by line
+    If a writer is supplied, records the commands into it
+    """
+    position = 0
+    layer_change = False
+    for raw_line in file:
+        position += len(raw_line)
+        line = raw_line.decode("utf-8", errors="replace")
+        if LAYER_CHANGE in line:
+            layer_change = True
+        gcode = get_gcode(line)
+        if not gcode:
+            continue
+        if writer is not None:
+            writer.add(gcode, position, layer_change)
+        yield gcode, position, layer_change
+        layer_change = False
+
+
+class GcodeStream:
+    """Reads a fresh sidecar through mmap"""
+
+    def __init__(self, path: str) -> None:
+        with open(get_stream_path(path), "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version = struct.unpack_from("<4sH", self.map)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("Unsupported gcode stream format")
+            (_, _, size, mtime_ns, self.gcode_count, file_flags,
+             index_offset, layer_count, checkpoint_count) = \
+                HEADER.unpack_from(self.map)
+            if not is_source_unchanged(path, size, mtime_ns):
+                raise ValueError("The gcode stream is stale")
+            self.has_inbuilt_stats = bool(file_flags & INBUILT_STATS_FLAG)
+            checkpoint_offset = index_offset + layer_count * LAYER.size
+            index_end = checkpoint_offset + checkpoint_count * CHECKPOINT.size
+            if index_end != len(self.map):
+                raise ValueError("The gcode stream index is damaged")
+            # (gcode number, source position) of each layer change
+            self.layers: List[Tuple[int, int]] = list(LAYER.iter_unpack(
+                self.map[index_offset:checkpoint_offset]))
+            # (sidecar offset, source position) of every
+            # CHECKPOINT_INTERVAL-th gcode
+            self.checkpoints: List[Tuple[int, int]] = list(
+                CHECKPOINT.iter_unpack(self.map[checkpoint_offset:]))
+        except (ValueError, struct.error):
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self) -> None:
+        """Un-maps the sidecar"""
+        self.map.close()
+
+    def commands(self, start: int = 0) -> Iterator[Command]:
+        """
+        Yields the pre-sanitized commands
+        :param start: the gcode number to start from, gets found
+            from the closest checkpoint before it
+        """
+        if start >= self.gcode_count:
+            return
+        stream_map = self.map
+        unpack_from = RECORD.unpack_from
+        record_size = RECORD.size
+        checkpoint = start // CHECKPOINT_INTERVAL
+        offset, position = self.checkpoints[checkpoint]
+        for _ in range(start - checkpoint * CHECKPOINT_INTERVAL):
+            consumed, length, _ = unpack_from(stream_map, offset)
+            offset += record_size + length
+            position += consumed
+        for _ in range(start, self.gcode_count):
+            consumed, length, flags = unpack_from(stream_map, offset)
+            offset += record_size
+            position += consumed
+            yield (stream_map[offset:offset + length].decode("ascii"),
+                   position, bool(flags & LAYER_CHANGE_FLAG))
+            offset += length
+
+
+def load_stream(path: str) -> Optional[GcodeStream]:
+    """Returns the stream for the file if a fresh one exists"""
+    try:
+        return GcodeStream(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, struct.error) as exception:
+        log.debug("Cannot use the gcode stream for %s: %s", path, exception)
+        return None
+
+
+def build_stream(path: str) -> None:
+    """Sanitizes the whole gcode file into its sidecar"""
+    try:
+        writer = StreamWriter(path)
+    except OSError:
+        log.exception("Cannot create a gcode stream for %s", path)
+        return
+    try:
+        with open(path, "rb") as file:
+            for _ in text_commands(file, writer):
+                pass
+        writer.finish()
+    except Exception:  # pylint: disable=broad-except
+        log.exception("Failed to build a gcode stream for %s", path)
+        writer.discard()
+
+
+def _build_stream_thread(path: str) -> None:
+    """The gcode stream building thread target"""
+    prctl_name()
+    build_stream(path)
+
+
+def build_stream_in_background(path: str) -> None:
+    """Sanitizes the gcode file into its sidecar in a new thread"""
+    Thread(target=_build_stream_thread, args=(path,),
+           name="gcode_stream", daemon=True).start()
+
+
+def remove_stream(path: str) -> None:
+    """Removes the sidecar of a gcode file if there is one"""
+    try:
+        os.unlink(get_stream_path(path))
+    except FileNotFoundError:
+        pass
+
+
+@contextmanager
+def gcode_commands(path: str,
+                   start: int = 0) -> Iterator[Iterator[Command]]:
+    """
+    Provides the commands of a gcode file. From its sidecar if there is
+    a fresh one, otherwise from the text while writing the sidecar
+    for the next time
+    :param start: the gcode number to start from. Only the sidecar can
+        skip the commands before it without sanitizing them
+    """
+    stream = load_stream(path)
+    if stream is not None:
+        with stream:
+            yield stream.commands(start)
+        return
+
+    try:
+        writer: Optional[StreamWriter] = StreamWriter(path)
+    except OSError:
+        log.warning("Cannot create a gcode stream for %s", path)
+        writer = None
+
+    with open(path, "rb") as file:
+        commands = text_commands(file, writer)
+        try:
+            yield islice(commands, start, None)
+        except BaseException:
+            if writer is not None:
+                writer.discard()
+            raise
+        if writer is None:
+            return
+        # Record the stream only if all the commands went through
+        if next(commands, None) is None:
+            writer.finish()
+        else:
+            writer.discard()
@@ -0,0 +1,71 @@
+"""
+Contains implementation of the IdentityCache class
+
+Gathering the printer identity takes many serial round trips after every
+start and reconnect. The last validated identity is remembered for each
+printer connected by USB, so it can be used right away and confirmed
+in the background.
+"""
+import json
+import logging
+import os
+from threading import Lock
+from typing import Any, Dict, Optional
+
+log = logging.getLogger(__name__)
+
+
+class IdentityCache:
+    """Keeps the printer identity snapshots in a json file,
+    keyed by the USB serial number"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.lock = Lock()
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        """Reads all the snapshots, an unreadable file means none"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as identity_file:
+                data = json.load(identity_file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            log.warning("Cannot read the printer identity cache %s",
+                        self.path)
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        return data
+
+    def _write(self, data: Dict[str, Dict[str, Any]]) -> None:
+        """Replaces the file, so a power loss cannot leave half of it"""
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as identity_file:
+                json.dump(data, identity_file)
+            os.replace(temp_path, self.path)
+        except OSError:
+            log.exception("Cannot write the printer identity cache %s",
+                          self.path)
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns the snapshot remembered for the key if there is one"""
+        with self.lock:
+            return self._read().get(key)
+
+    def save(self, key: str, snapshot: Dict[str, Any]) -> None:
+        """Remembers the snapshot for the key"""
+        with self.lock:
+            data = self._read()
+            if data.get(key) == snapshot:
+                return
+            data[key] = snapshot
+            self._write(data)
+
+    def forget(self, key: str) -> None:
+        """Forgets the snapshot of the key, if it turned out to be wrong"""
+        with self.lock:
+            data = self._read()
+            if data.pop(key, None) is not None:
+                self._write(data)
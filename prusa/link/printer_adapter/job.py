@@ -143,6 +143,7 @@ class Job(metaclass=MCSingleton):
         """
         log.debug("Job changed state to %s", state)
         self.data.job_state = state
+        self.model.generation.bump()
 
     def write(self):
         """Writes_the job_id into the printer EEPROM"""
@@ -197,6 +198,7 @@ class Job(metaclass=MCSingleton):
         self.model.job.from_sd = path.startswith(
             os.path.join("/", SD_STORAGE_NAME))
         self.update_last_job_path()
+        self.model.generation.bump()
         self.job_info_updated()
 
     def update_last_job_path(self):
@@ -255,6 +257,7 @@ class Job(metaclass=MCSingleton):
         if self.data.selected_file_size is None:
             # In the future, this should be pointless, now it may get used
             self.data.selected_file_size = total
+            self.model.generation.bump()
             self.job_info_updated()
 
     def job_info_updated(self):
@@ -285,6 +288,7 @@ class Job(metaclass=MCSingleton):
             raise RuntimeError("Cannot deselect a file while printing it")
         self.data.selected_file_path = None
         self.model.job.from_sd = None
+        self.model.generation.bump()
 
     def job_id_from_eeprom(self, job_id):
         """Sets the job id read from the printer EEPROM"""
@@ -297,3 +301,4 @@ class Job(metaclass=MCSingleton):
             self.data.job_id_offset = 0
             self.write()
             self.job_info_updated()
+        self.model.generation.bump()
@@ -41,6 +41,7 @@ from ..const import (
     SLEEP_SCREEN_TIMEOUT,
 )
 from ..serial.helpers import enqueue_instruction, wait_for_instruction
+from ..serial.scheduler import COSMETIC
 from ..serial.serial_queue import SerialQueue
 from ..util import prctl_name
 from .model import Model
@@ -531,12 +532,13 @@ class LCDPrinter(metaclass=MCSingleton):
         self.ignore += 1
         instruction = enqueue_instruction(self.serial_queue,
                                           f"M117 \x7E{ascii_text}",
-                                          to_front=True)
+                                          traffic_class=COSMETIC)
 
         # Play a sound accompanying the newly shown thing
         if line.chime_gcode:
             for command in line.chime_gcode:
-                enqueue_instruction(self.serial_queue, command)
+                enqueue_instruction(self.serial_queue, command,
+                                    traffic_class=COSMETIC)
 
         if to_wait is None:
             success = wait_for_instruction(instruction,
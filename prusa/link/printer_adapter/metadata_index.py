@@ -0,0 +1,253 @@
+"""
+Contains implementation of the MetadataIndex class
+
+Parsing a gcode for its metadata and thumbnails takes seconds on a Pi.
+The local print files get parsed once, by a small pool of worker threads,
+and the results are kept in a compact index file. The web API answers from
+the index and never parses gcode on the request thread.
+
+The thumbnails themselves stay in the per file cache of gcode-metadata,
+which gets written by the same parsing, the index only says which preview
+is there.
+"""
+import json
+import logging
+import os
+from queue import Queue
+from threading import Lock
+from typing import Any, Dict, List, NamedTuple, Optional, Set
+
+from blinker import Signal  # type: ignore
+from gcode_metadata import get_metadata, get_preview
+from prusa.connect.printer.const import GCODE_EXTENSIONS
+
+from ..const import METADATA_WORKERS
+from ..util import prctl_name
+from .updatable import Thread
+
+log = logging.getLogger(__name__)
+
+VERSION = 1
+
+
+class IndexEntry(NamedTuple):
+    """The indexed info about one print file"""
+    size: int
+    mtime_ns: int
+    data: Dict[str, Any]  # the gcode metadata
+    preview: Optional[str]  # thumbnail info of the preview, e.g. 640x480_PNG
+
+    @property
+    def preview_format(self) -> Optional[str]:
+        """The lowercase image format of the preview"""
+        if self.preview is None:
+            return None
+        return self.preview.rsplit("_", 1)[-1].lower()
+
+    def is_fresh(self, stat: os.stat_result) -> bool:
+        """Whether the entry belongs to the file with the supplied stat"""
+        return stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns
+
+
+class MetadataIndex:
+    """
+    Keeps the metadata of the local print files. Files get queued for
+    indexing on upload, when their storage gets attached and when asked
+    for before being indexed. Directories get queued to be scanned for
+    files that are not indexed or changed
+    """
+
+    def __init__(self, path: str, workers: int = METADATA_WORKERS) -> None:
+        self.path = path
+        self.lock = Lock()
+        self.entries: Dict[str, IndexEntry] = self._read()
+        self.queue: Queue[Optional[str]] = Queue()
+        # Queued or being indexed, so nothing gets parsed twice at once
+        self.pending: Set[str] = set()
+        self.dirty = False
+        self.running = False
+        # For every file dropped from the index
+        self.forgotten_signal = Signal()  # kwargs: path: str
+        self.threads = [
+            Thread(target=self._work,
+                   name="metadata_index" + (str(number) if number else ""),
+                   daemon=True)
+            for number in range(workers)]
+
+    def _read(self) -> Dict[str, IndexEntry]:
+        """Reads the index file, an unreadable one means starting over"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as index_file:
+                data = json.load(index_file)
+            if data.get("version") != VERSION:
+                return {}
+            return {os_path: IndexEntry(*entry)
+                    for os_path, entry in data["files"].items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, TypeError, KeyError, AttributeError):
+            log.warning("Cannot read the metadata index %s", self.path)
+            return {}
+
+    def save(self) -> None:
+        """Replaces the index file if anything changed since the last save,
+        so a power loss cannot leave half of it"""
+        with self.lock:
+            if not self.dirty:
+                return
+            data = {"version": VERSION,
+                    "files": {os_path: list(entry)
+                              for os_path, entry in self.entries.items()}}
+            self.dirty = False
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as index_file:
+                json.dump(data, index_file, separators=(",", ":"))
+            os.replace(temp_path, self.path)
+        except OSError:
+            log.exception("Cannot write the metadata index %s", self.path)
+
+    def start(self) -> None:
+        """Starts the workers"""
+        self.running = True
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """Signals the workers to stop"""
+        self.running = False
+        for _ in self.threads:
+            self.queue.put(None)
+
+    def wait_stopped(self) -> None:
+        """Waits for the workers to stop, saves what they did not"""
+        for thread in self.threads:
+            thread.join()
+        self.save()
+
+    def get(self, os_path: str) -> Optional[IndexEntry]:
+        """Returns the entry of the file, if it is indexed and unchanged"""
+        with self.lock:
+            entry = self.entries.get(os_path)
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(os_path)
+        except OSError:
+            return None
+        return entry if entry.is_fresh(stat) else None
+
+    def lookup(self, os_path: str) -> Optional[IndexEntry]:
+        """Like get, but queues the file for indexing if it is not
+        indexed or if it changed"""
+        entry = self.get(os_path)
+        if entry is None:
+            self.enqueue(os_path)
+        return entry
+
+    def enqueue(self, os_path: str) -> None:
+        """Queues a file to be indexed, or a directory to be scanned"""
+        with self.lock:
+            if os_path in self.pending:
+                return
+            self.pending.add(os_path)
+        self.queue.put(os_path)
+
+    def scan(self, directory: str) -> None:
+        """Queues a directory to be scanned for files to index"""
+        self.enqueue(directory)
+
+    def paths(self) -> Set[str]:
+        """Returns the paths of all the indexed files"""
+        with self.lock:
+            return set(self.entries)
+
+    def forget(self, os_path: str) -> None:
+        """Forgets a deleted file, or everything in a deleted directory"""
+        prefix = os.path.join(os_path, "")
+        with self.lock:
+            forgotten = [indexed for indexed in self.entries
+                         if indexed == os_path or indexed.startswith(prefix)]
+            self._drop(forgotten)
+        self._send_forgotten(forgotten)
+
+    def _drop(self, forgotten: List[str]) -> None:
+        """Drops the entries, expects the lock to be held"""
+        for indexed in forgotten:
+            del self.entries[indexed]
+            self.dirty = True
+
+    def _send_forgotten(self, forgotten: List[str]) -> None:
+        """Tells everyone about the dropped entries, outside the lock"""
+        for indexed in forgotten:
+            self.forgotten_signal.send(self, path=indexed)
+
+    def _work(self) -> None:
+        """Indexes the queued files until stopped, saves the index
+        every time the queue runs out"""
+        prctl_name()
+        while self.running:
+            os_path = self.queue.get()
+            if os_path is None:
+                continue
+            try:
+                if os.path.isdir(os_path):
+                    self._scan(os_path)
+                else:
+                    self._index(os_path)
+            except Exception:  # pylint: disable=broad-except
+                log.exception("Cannot index %s", os_path)
+            finally:
+                with self.lock:
+                    self.pending.discard(os_path)
+                    drained = not self.pending
+            if drained:
+                self.save()
+
+    def _scan(self, directory: str) -> None:
+        """Queues the changed print files in the directory, forgets
+        the ones that are not there anymore"""
+        found: Set[str] = set()
+        for root, dirs, files in os.walk(directory):
+            # Skip the hidden directories, like the SDK does
+            dirs[:] = [name for name in dirs if not name.startswith(".")]
+            for name in files:
+                if name.startswith(".") or \
+                        not name.lower().endswith(GCODE_EXTENSIONS):
+                    continue
+                os_path = os.path.join(root, name)
+                found.add(os_path)
+                if self.get(os_path) is None:
+                    self.enqueue(os_path)
+
+        prefix = os.path.join(directory, "")
+        with self.lock:
+            forgotten = [indexed for indexed in self.entries
+                         if indexed.startswith(prefix)
+                         and indexed not in found]
+            self._drop(forgotten)
+        self._send_forgotten(forgotten)
+
+    def _index(self, os_path: str) -> None:
+        """Parses the file and puts it into the index"""
+        if not os_path.lower().endswith(GCODE_EXTENSIONS):
+            return
+        try:
+            stat = os.stat(os_path)
+        except FileNotFoundError:
+            self.forget(os_path)
+            return
+        if self.get(os_path) is not None:
+            return
+
+        meta = get_metadata(os_path)
+        preview = get_preview(meta.thumbnails)
+        entry = IndexEntry(
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            data=meta.data,
+            preview=preview.to_thumbnail_info() if preview else None)
+        with self.lock:
+            self.entries[os_path] = entry
+            self.dirty = True
+        log.debug("Indexed %s", os_path)
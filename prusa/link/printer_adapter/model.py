@@ -1,5 +1,6 @@
 """Contains implementation of the Model class"""
 
+from .structures.generation import Generation
 from .structures.mc_singleton import MCSingleton
 from .structures.model_classes import Telemetry
 from .structures.module_data_classes import (
@@ -21,6 +22,8 @@ class Model(metaclass=MCSingleton):
     Some values are reset upon reading, other, more state oriented should stay
     """
     latest_telemetry: Telemetry = Telemetry()
+    # Bumped on every change of what the web API shows
+    generation: Generation
 
     # Let's try and share inner module states for cooperation
     # The idea is, every module will get the model.
@@ -39,3 +42,4 @@ class Model(metaclass=MCSingleton):
 
     def __init__(self) -> None:
         self.latest_telemetry: Telemetry = Telemetry()
+        self.generation: Generation = Generation()
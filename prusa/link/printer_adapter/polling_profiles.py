@@ -0,0 +1,85 @@
+"""
+Contains the polling profiles used by PrinterPolling
+
+Each profile says how often the tuned items get polled in a printer state
+and which items get suspended. The items not mentioned keep the interval
+they were created with.
+"""
+from typing import Dict, FrozenSet, NamedTuple, Optional
+
+from prusa.connect.printer.const import State
+
+from ..const import (
+    FAST_POLL_INTERVAL,
+    SLOW_POLL_INTERVAL,
+    VERY_SLOW_POLL_INTERVAL,
+)
+
+
+class PollingProfile(NamedTuple):
+    """The item intervals by the item name, None stops the polling.
+    Suspended items do not get refreshed at all, the refreshes asked for
+    in the meantime are done once the item is resumed"""
+    name: str
+    intervals: Dict[str, Optional[float]]
+    suspended: FrozenSet[str] = frozenset()
+
+
+_IDLE_INTERVALS: Dict[str, Optional[float]] = {
+    "printer_type": VERY_SLOW_POLL_INTERVAL,
+    "nozzle_diameter": SLOW_POLL_INTERVAL,
+    "sheet_settings": VERY_SLOW_POLL_INTERVAL,
+    "active_sheet": SLOW_POLL_INTERVAL,
+    "flash_air": VERY_SLOW_POLL_INTERVAL,
+    "speed_multiplier": FAST_POLL_INTERVAL,
+    "flow_multiplier": FAST_POLL_INTERVAL,
+    "print_progress": None,
+    "print_state": FAST_POLL_INTERVAL,
+}
+
+# The printer is busy, leave the serial line to the print
+_PRINTING_INTERVALS: Dict[str, Optional[float]] = {
+    **_IDLE_INTERVALS,
+    "printer_type": None,
+    "nozzle_diameter": None,
+    "sheet_settings": None,
+    "active_sheet": None,
+    "flash_air": None,
+    "speed_multiplier": SLOW_POLL_INTERVAL,
+    "flow_multiplier": SLOW_POLL_INTERVAL,
+    "print_progress": SLOW_POLL_INTERVAL,
+}
+
+# The statistics change during the print, they get refreshed at its end
+_STATISTICS = frozenset({"total_filament", "total_print_time"})
+
+IDLE = PollingProfile("idle", _IDLE_INTERVALS)
+
+# Nothing is being printed, but the print can be resumed at any moment
+PAUSED = PollingProfile("paused", dict(_IDLE_INTERVALS))
+
+SD_PRINTING = PollingProfile("sd_printing", _PRINTING_INTERVALS, _STATISTICS)
+
+# We know whether we're printing, the M27 only looks for a pause
+# or a power panic recovery
+SERIAL_PRINTING = PollingProfile(
+    "serial_printing",
+    {**_PRINTING_INTERVALS, "print_state": SLOW_POLL_INTERVAL},
+    _STATISTICS)
+
+# The printer might not even answer, do not bother it with the big reads
+ERROR = PollingProfile(
+    "error", dict(_PRINTING_INTERVALS), _STATISTICS | {"mbl"})
+
+
+def profile_for_state(state: State, serial_printing: bool) -> PollingProfile:
+    """Picks the polling profile for the printer state"""
+    if state == State.PRINTING:
+        if serial_printing:
+            return SERIAL_PRINTING
+        return SD_PRINTING
+    if state == State.PAUSED:
+        return PAUSED
+    if state in {State.ATTENTION, State.ERROR}:
+        return ERROR
+    return IDLE
@@ -4,6 +4,7 @@ from time import time
 
 from ..const import TAIL_COMMANDS
 from ..util import get_gcode
+from .gcode_stream import load_stream
 from .model import Model
 from .structures.module_data_classes import PrintStatsData
 
@@ -37,6 +38,21 @@ class PrintStats:
         """
         self.reset_stats()
         self.data.start_gcode_number = from_gcode_number or 0
+        stream = load_stream(file_path)
+        if stream is not None:
+            # The gcode stream index already knows
+            with stream:
+                self.data.total_gcode_count = stream.gcode_count
+                self.data.has_inbuilt_stats = stream.has_inbuilt_stats
+        else:
+            self._scan_file(file_path)
+
+        log.info(
+            "New file analyzed. It %s inbuilt percent and time reporting.",
+            'has' if self.data.has_inbuilt_stats else 'does not have')
+
+    def _scan_file(self, file_path):
+        """Reads the file until it finds out whether it has inbuilt stats"""
         with open(file_path, encoding='utf-8') as gcode_file:
             for line in gcode_file:
                 gcode = get_gcode(line)
@@ -46,10 +62,6 @@ class PrintStats:
                     self.data.has_inbuilt_stats = True
                     break
 
-        log.info(
-            "New file analyzed. It %s inbuilt percent and time reporting.",
-            'has' if self.data.has_inbuilt_stats else 'does not have')
-
     def reset_stats(self):
         """resets the tracked print stats"""
         self.data.total_gcode_count = 0
@@ -7,11 +7,13 @@ import logging
 import re
 import struct
 from datetime import timedelta
-from typing import List
+from threading import Lock
+from typing import List, Optional
 
 from packaging.version import Version
 from prusa.connect.printer import Printer
 from prusa.connect.printer.conditions import CondState
+from prusa.connect.printer.const import State
 
 from ..conditions import FW, ID, JOB_ID, SN
 from ..const import (
@@ -29,11 +31,15 @@ from ..const import (
 from ..serial.helpers import enqueue_matchable, wait_for_instruction
 from ..serial.serial_parser import ThreadedSerialParser
 from ..serial.serial_queue import SerialQueue
-from ..util import _parse_little_endian_uint32, get_d3_code, make_fingerprint
+from ..util import make_fingerprint
+from .eeprom import EEPROMReader
 from .filesystem.sd_card import SDCard
+from .identity_cache import IdentityCache
 from .job import Job
 from .model import Model
+from .polling_profiles import IDLE, PollingProfile, profile_for_state
 from .structures.item_updater import (
+    LOCAL,
     ItemUpdater,
     SideEffectOnly,
     WatchedGroup,
@@ -47,7 +53,6 @@ from .structures.model_classes import (
 )
 from .structures.module_data_classes import Sheet
 from .structures.regular_expressions import (
-    D3_OUTPUT_REGEX,
     FW_REGEX,
     M27_OUTPUT_REGEX,
     MBL_REGEX,
@@ -95,7 +100,8 @@ class PrinterPolling:
                  serial_parser: ThreadedSerialParser,
                  printer: Printer, model: Model,
                  telemetry_passer: TelemetryPasser,
-                 job: Job, sd_card: SDCard) -> None:
+                 job: Job, sd_card: SDCard,
+                 identity_file: Optional[str] = None) -> None:
         super().__init__()
         self.item_updater = ItemUpdater()
         self.serial_queue = serial_queue
@@ -105,11 +111,17 @@ class PrinterPolling:
         self.telemetry_passer = telemetry_passer
         self.job = job
         self.sd_card = sd_card
+        self.eeprom = EEPROMReader(self.do_multimatch,
+                                   self._pending_eeprom_ranges)
+        self.identity_cache: Optional[IdentityCache] = None
+        if identity_file is not None:
+            self.identity_cache = IdentityCache(identity_file)
 
         # Printer info (for init and SEND_INFO)
         self.network_info = WatchedItem("network_info",
                                         gather_function=self._get_network_info,
-                                        write_function=self._set_network_info)
+                                        write_function=self._set_network_info,
+                                        resource=LOCAL)
 
         self.printer_type = WatchedItem(
             "printer_type",
@@ -195,6 +207,22 @@ class PrinterPolling:
         self.printer_info.became_valid_signal.connect(
             self._printer_info_became_valid)
 
+        # Remembered between runs, so they don't have to be waited for.
+        # Seeded once the printer type is gathered, the printer type and
+        # the serial number get written to the SDK just once, a wrong
+        # seed of those could not be taken back
+        self.identity = [
+            self.firmware_version, self.nozzle_diameter,
+            self.sheet_settings, self.active_sheet,
+        ]
+        for item in self.identity:
+            item.value_changed_signal.connect(
+                lambda value: self._save_identity(), weak=False)
+        for item in (self.printer_type, self.firmware_version,
+                     self.serial_number):
+            item.validation_error_signal.connect(
+                lambda _: self._forget_identity(), weak=False)
+
         # Other stuff
 
         self.job_id = WatchedItem(
@@ -366,6 +394,23 @@ class PrinterPolling:
         for item in self.telemetry:
             self.item_updater.add_item(item, start_tracking=False)
 
+        # The items read from the EEPROM, the ones queued for a refresh
+        # together get read together
+        self.eeprom_items = {
+            self.sheet_settings: EEPROMParams.SHEET_SETTINGS,
+            self.active_sheet: EEPROMParams.ACTIVE_SHEET,
+            self.job_id: EEPROMParams.JOB_ID,
+            self.flash_air: EEPROMParams.FLASH_AIR,
+            self.print_mode: EEPROMParams.PRINT_MODE,
+            self.total_filament: EEPROMParams.TOTAL_FILAMENT,
+            self.total_print_time: EEPROMParams.TOTAL_PRINT_TIME,
+        }
+
+        # Nothing is suspended yet, the intervals get set right away
+        self.profile_lock = Lock()
+        self.profile = PollingProfile("initial", {})
+        self.use_profile(IDLE)
+
         self.invalidate_printer_info()
 
     def start(self):
@@ -389,6 +434,61 @@ class PrinterPolling:
 
         self.item_updater.enable(self.printer_type)
 
+    def _identity_key(self) -> Optional[str]:
+        """The printer identity is remembered for the USB serial number.
+        Not for a port path, another printer can get connected to it"""
+        serial_port = self.model.serial_adapter.using_port
+        if serial_port is None:
+            return None
+        return serial_port.sn
+
+    def _seed_identity(self):
+        """Seeds the printer identity remembered for the current printer,
+        where it is not known yet. The values get gathered again
+        in the background"""
+        if self.identity_cache is None:
+            return
+        key = self._identity_key()
+        if key is None:
+            return
+        snapshot = self.identity_cache.load(key)
+        if snapshot is None:
+            return
+        try:
+            values = {item.name: snapshot[item.name]
+                      for item in self.identity}
+            values["sheet_settings"] = [
+                Sheet(**sheet) for sheet in values["sheet_settings"]]
+        except (KeyError, TypeError, ValueError):
+            log.warning("The remembered printer identity is incomplete")
+            self.identity_cache.forget(key)
+            return
+
+        log.debug("Seeding the printer identity remembered for %s", key)
+        for item in self.identity:
+            if not item.valid:
+                self.item_updater.seed(item, values[item.name])
+
+    def _save_identity(self):
+        """Remembers the printer identity, if it's all valid"""
+        if self.identity_cache is None or not self.printer_info.valid:
+            return
+        key = self._identity_key()
+        if key is None:
+            return
+        snapshot = {item.name: item.value for item in self.identity}
+        snapshot["sheet_settings"] = [
+            sheet.dict() for sheet in snapshot["sheet_settings"]]
+        self.identity_cache.save(key, snapshot)
+
+    def _forget_identity(self):
+        """The printer identity did not validate, do not remember it"""
+        if self.identity_cache is None:
+            return
+        key = self._identity_key()
+        if key is not None:
+            self.identity_cache.forget(key)
+
     def invalidate_network_info(self):
         """Invalidates just the network info"""
         self.item_updater.invalidate(self.network_info)
@@ -419,27 +519,26 @@ class PrinterPolling:
         else:
             self.item_updater.schedule_invalidation(item)
 
-    def polling_not_ok(self):
-        """Stops polling of some values"""
-        self._change_interval(self.nozzle_diameter, None)
-        self._change_interval(self.flow_multiplier, SLOW_POLL_INTERVAL)
-        self._change_interval(self.speed_multiplier, SLOW_POLL_INTERVAL)
-        self._change_interval(self.print_progress, SLOW_POLL_INTERVAL)
-        self._change_interval(self.sheet_settings, None)
-        self._change_interval(self.active_sheet, None)
-        self._change_interval(self.flash_air, None)
-        self._change_interval(self.printer_type, None)
-
-    def polling_ok(self):
-        """Re-starts polling of some values"""
-        self._change_interval(self.nozzle_diameter, SLOW_POLL_INTERVAL)
-        self._change_interval(self.flow_multiplier, FAST_POLL_INTERVAL)
-        self._change_interval(self.speed_multiplier, FAST_POLL_INTERVAL)
-        self._change_interval(self.print_progress, None)
-        self._change_interval(self.sheet_settings, VERY_SLOW_POLL_INTERVAL)
-        self._change_interval(self.active_sheet, SLOW_POLL_INTERVAL)
-        self._change_interval(self.flash_air, VERY_SLOW_POLL_INTERVAL)
-        self._change_interval(self.printer_type, VERY_SLOW_POLL_INTERVAL)
+    def use_profile(self, profile: PollingProfile):
+        """Re-tunes the item intervals and suspends the items
+        according to the supplied polling profile"""
+        with self.profile_lock:
+            if profile is self.profile:
+                return
+            log.debug("Switching to the %s polling profile", profile.name)
+            items = {item.name: item for item in self.item_updater.items}
+            for name, interval in profile.intervals.items():
+                self._change_interval(items[name], interval)
+
+            for name in profile.suspended - self.profile.suspended:
+                self.item_updater.suspend(items[name])
+            for name in self.profile.suspended - profile.suspended:
+                self.item_updater.resume(items[name])
+            self.profile = profile
+
+    def state_changed(self, to_state: State, serial_printing: bool):
+        """Switches to the polling profile of the new printer state"""
+        self.use_profile(profile_for_state(to_state, serial_printing))
 
     def ensure_job_id(self):
         """This is an oddball, I don't have anything able to ensure the job_id
@@ -469,7 +568,8 @@ class PrinterPolling:
                                         gcode,
                                         regex,
                                         to_front=to_front,
-                                        has_to_match=has_to_match)
+                                        has_to_match=has_to_match,
+                                        coalesce=True)
         wait_for_instruction(instruction, self.should_wait)
         match = instruction.match()
         if match is None:
@@ -479,7 +579,8 @@ class PrinterPolling:
     def do_multimatch(self, gcode, regex, to_front=False):
         """Send an instruction with multiple lines as output"""
         instruction = enqueue_matchable(
-            self.serial_queue, gcode, regex, to_front=to_front)
+            self.serial_queue, gcode, regex, to_front=to_front,
+            coalesce=True)
         wait_for_instruction(instruction, self.should_wait)
         matches = instruction.get_matches()
         if not matches:
@@ -487,6 +588,11 @@ class PrinterPolling:
                                f"That is weird.")
         return matches
 
+    def _pending_eeprom_ranges(self):
+        """Returns the EEPROM ranges of the items queued for a refresh"""
+        return [param.value for item, param in self.eeprom_items.items()
+                if item.scheduled]
+
     def _get_network_info(self):
         """Gets the mac and ip addresses and packages them into an object."""
         network_info = NetworkInfo()
@@ -556,16 +662,9 @@ class PrinterPolling:
     def _get_sheet_settings(self) -> List[Sheet]:
         """Gets all the sheet settings from the EEPROM"""
         # TODO: How do we deal with default settings?
-        matches = self.do_multimatch(
-            get_d3_code(*EEPROMParams.SHEET_SETTINGS.value),
-            D3_OUTPUT_REGEX, to_front=True)
+        data = self.eeprom.read_param(EEPROMParams.SHEET_SETTINGS)
 
         sheets: List[Sheet] = []
-        str_data = ""
-        for match in matches:
-            str_data += match.group("data").replace(" ", "")
-
-        data = bytes.fromhex(str_data)
         for i in range(0, 8*11, 11):
             sheet_data = data[i:i+11]
 
@@ -588,12 +687,7 @@ class PrinterPolling:
 
     def get_active_sheet(self):
         """Gets the active sheet from the EEPROM"""
-        matches = self.do_matchable(
-            get_d3_code(*EEPROMParams.ACTIVE_SHEET.value),
-            D3_OUTPUT_REGEX, to_front=True)
-
-        str_data = matches.group("data").replace(" ", "")
-        data = bytes.fromhex(str_data)
+        data = self.eeprom.read_param(EEPROMParams.ACTIVE_SHEET)
         active_sheet = struct.unpack("B", data)[0]
         return active_sheet
 
@@ -614,10 +708,8 @@ class PrinterPolling:
 
     def _get_job_id(self):
         """Gets the current job_id from the printer"""
-        match = self.do_matchable(
-            get_d3_code(*EEPROMParams.JOB_ID.value),
-            D3_OUTPUT_REGEX, to_front=True)
-        return int(match.group("data").replace(" ", ""), base=16)
+        data = self.eeprom.read_param(EEPROMParams.JOB_ID)
+        return int.from_bytes(data, "big")
 
     def _get_mbl(self):
         """Gets the current MBL data"""
@@ -641,16 +733,12 @@ class PrinterPolling:
 
     def _get_flash_air(self):
         """Determines if the Flash Air functionality is on"""
-        match = self.do_matchable(
-            get_d3_code(*EEPROMParams.FLASH_AIR.value), D3_OUTPUT_REGEX)
-        return match.group("data") == "01"
+        data = self.eeprom.read_param(EEPROMParams.FLASH_AIR)
+        return data == b"\x01"
 
     def _get_print_mode(self):
         """Gets the print mode from the printer"""
-        match = self.do_matchable(
-            get_d3_code(*EEPROMParams.PRINT_MODE.value),
-            D3_OUTPUT_REGEX, to_front=True)
-        index = int(match.group("data").replace(" ", ""), base=16)
+        index = self.eeprom.read_param(EEPROMParams.PRINT_MODE)[0]
         return PRINT_MODE_ID_PAIRING[index]
 
     def _get_speed_multiplier(self):
@@ -823,24 +911,21 @@ class PrinterPolling:
                   value, adjusted_value)
         return adjusted_value
 
-    def _eeprom_little_endian_uint32(self, dcode):
-        """Reads and decodes the D-Code specified little-endian uint32_t
-        eeprom variable"""
-        match = self.do_matchable(dcode,
-                                  D3_OUTPUT_REGEX,
-                                  to_front=True)
-        return _parse_little_endian_uint32(match)
+    def _eeprom_little_endian_uint32(self, param: EEPROMParams):
+        """Reads and decodes a little-endian uint32_t eeprom variable"""
+        data = self.eeprom.read_param(param)
+        return struct.unpack("<I", data)[0]
 
     def _get_total_filament(self):
         """Gets the total filament used from the eeprom"""
         total_filament = self._eeprom_little_endian_uint32(
-            get_d3_code(*EEPROMParams.TOTAL_FILAMENT.value))
+            EEPROMParams.TOTAL_FILAMENT)
         return total_filament * 1000
 
     def _get_total_print_time(self):
         """Gets the total print time from the eeprom"""
         total_minutes = self._eeprom_little_endian_uint32(
-            get_d3_code(*EEPROMParams.TOTAL_PRINT_TIME.value))
+            EEPROMParams.TOTAL_PRINT_TIME)
         return total_minutes * 60
 
     # -- Validate --
@@ -1038,8 +1123,9 @@ class PrinterPolling:
         JOB_ID.state = state
 
     def _printer_type_became_valid(self, _):
-        """Printer type became valid,
+        """Printer type became valid, seed the rest of the identity,
         set the condition and enable the fw check"""
+        self._seed_identity()
         self.item_updater.enable(self.firmware_version)
         self._set_id_condition(CondState.OK)
 
@@ -1072,6 +1158,7 @@ class PrinterPolling:
                 return  # We'll get here again when it becomes valid
 
         self._send_info_if_changed()
+        self._save_identity()
         for item in itertools.chain(self.telemetry, self.other_stuff):
             self.item_updater.enable(item)
 
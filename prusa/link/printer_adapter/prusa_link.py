@@ -72,10 +72,12 @@ from .command_queue import CommandQueue, CommandResult
 from .file_printer import FilePrinter
 from .filesystem.sd_card import SDState
 from .filesystem.storage_controller import StorageController
+from .gcode_stream import build_stream, remove_stream
 from .ip_updater import IPUpdater
 from .job import Job, JobState
 from .keepalive import Keepalive
 from .lcd_printer import LCDPrinter
+from .metadata_index import MetadataIndex
 from .mmu_observer import MMUObserver
 from .model import Model
 from .print_stat_doubler import PrintStatDoubler
@@ -161,7 +163,8 @@ class PrusaLink:
         self.serial_queue = MonitoredSerialQueue(
             serial_adapter=self.serial,
             serial_parser=self.serial_parser,
-            threshold_path=self.cfg.daemon.threshold_file)
+            threshold_path=self.cfg.daemon.threshold_file,
+            pipeline_depth=self.cfg.printer.pipeline_depth)
         # -----
 
         self.keepalive = Keepalive(self.serial_queue)
@@ -235,6 +238,8 @@ class PrusaLink:
 
         self.file_printer = FilePrinter(self.serial_queue, self.serial_parser,
                                         self.model, self.cfg)
+        self.metadata_index = MetadataIndex(
+            self.cfg.daemon.metadata_index_file)
         self.storage_controller = StorageController(cfg, self.serial_queue,
                                                     self.serial_parser,
                                                     self.model)
@@ -244,7 +249,8 @@ class PrusaLink:
                                               self.serial_parser, self.printer,
                                               self.model,
                                               self.telemetry_passer, self.job,
-                                              self.storage_controller.sd_card)
+                                              self.storage_controller.sd_card,
+                                              self.cfg.daemon.identity_file)
         self.command_queue = CommandQueue()
         self.special_commands = SpecialCommands(self.serial_parser,
                                                 self.command_queue)
@@ -330,6 +336,8 @@ class PrusaLink:
             connect(self.folder_detach)
         self.storage_controller.sd_attached_signal.connect(self.sd_attach)
         self.storage_controller.sd_detached_signal.connect(self.sd_detach)
+        self.printer.file_removed_signal.connect(self.file_removed)
+        self.printer.file_added_signal.connect(self.file_added)
         self.printer_polling.printer_type.became_valid_signal.connect(
             self.printer_type_changed)
         self.printer_polling.print_state.became_valid_signal.connect(
@@ -376,6 +384,7 @@ class PrusaLink:
 
         self.keepalive.start()
         self.printer_polling.start()
+        self.metadata_index.start()
         self.storage_controller.start()
         self.ip_updater.start()
         self.lcd_printer.start()
@@ -451,6 +460,7 @@ class PrusaLink:
         self.printer.indicate_stop()
         self.printer_polling.stop()
         self.storage_controller.stop()
+        self.metadata_index.stop()
         self.keepalive.stop()
         self.lcd_printer.stop(fast)
         # This is for pylint to stop complaining, I'd like stop(fast) more
@@ -483,6 +493,7 @@ class PrusaLink:
             self.printer.wait_stopped()
             self.printer_polling.wait_stopped()
             self.storage_controller.wait_stopped()
+            self.metadata_index.wait_stopped()
             self.keepalive.wait_stopped()
             self.lcd_printer.wait_stopped()
             self.ip_updater.wait_stopped()
@@ -508,6 +519,11 @@ class PrusaLink:
     # Not type annotated, has problems
     def download_finished_cb(self, transfer):
         """Called when download is finished successfully"""
+        # Printing creates the gcode stream on its own
+        Thread(target=self._process_download,
+               args=(transfer.path, not transfer.to_print),
+               name="process_download",
+               daemon=True).start()
         if not transfer.to_print:
             return TransferCallbackState.SUCCESS
 
@@ -530,6 +546,18 @@ class PrusaLink:
         log.warning("Printer is printing another file.")
         return TransferCallbackState.ANOTHER_PRINTING
 
+    def _process_download(self, path, gcode_stream):
+        """Queues a downloaded gcode for the metadata index and
+        pre-sanitizes it, so its print can start faster"""
+        prctl_name()
+        if not self.printer.fs.wait_until_path(path, PATH_WAIT_TIMEOUT):
+            return
+        os_path = self.printer.fs.get_os_path(path)
+        if os.path.isfile(os_path):
+            self.metadata_index.enqueue(os_path)
+            if gcode_stream:
+                build_stream(os_path)
+
     # --- Command handlers ---
 
     def execute_gcode(self, caller: SDKCommand) -> CommandResult:
@@ -916,10 +944,22 @@ class PrusaLink:
     def folder_attach(self, _, path: str) -> None:
         """Connects a folder being attached to PrusaConnect events"""
         self.printer.attach(path, os.path.basename(path))
+        self.model.generation.bump()
+        self.metadata_index.scan(path)
 
     def folder_detach(self, _, path: str) -> None:
         """Connects a folder being detached to PrusaConnect events"""
         self.printer.detach(os.path.basename(path))
+        self.model.generation.bump()
+
+    def file_removed(self, _, path: str) -> None:
+        """Cleans up after a local file deleted or moved away"""
+        remove_stream(path)
+        self.metadata_index.forget(path)
+
+    def file_added(self, _, path: str) -> None:
+        """Indexes a local file written or moved in, scans a folder"""
+        self.metadata_index.enqueue(path)
 
     def sd_attach(self, _, files: File) -> None:
         """Connects the sd being attached to PrusaConnect events"""
@@ -1045,12 +1085,8 @@ class PrusaLink:
                 printer_type in MK25_PRINTERS:
             self.printer_polling.invalidate_mbl()
 
-        # The states should be completely re-done i'm told. So this janky
-        # stuff is what we're going to deal with for now
-        if to_state in {State.PRINTING, State.ATTENTION, State.ERROR}:
-            self.printer_polling.polling_not_ok()
-        if to_state not in {State.PRINTING, State.ATTENTION, State.ERROR}:
-            self.printer_polling.polling_ok()
+        self.printer_polling.state_changed(
+            to_state, serial_printing=self.model.file_printer.printing)
 
         # Set download throttling depending on printer state and cpu count
         if to_state == State.PRINTING and is_potato_cpu():
@@ -1070,6 +1106,7 @@ class PrusaLink:
                                job_id=self.model.job.get_job_id_for_api(),
                                ready=ready,
                                **extra_data)
+        self.model.generation.bump()
 
     def time_printing_updated(self, _, time_printing: int) -> None:
         """Connects the serial-print print-timer with telemetry"""
@@ -0,0 +1,31 @@
+"""
+Contains implementation of the Generation class
+A counter of the model changes, the readers can wait for it to move on
+"""
+from threading import Condition
+from typing import Optional
+
+
+class Generation:
+    """
+    Monotonically increasing, bumped by the components that change what
+    the web API shows. Bumps get coalesced, a waiter that missed a few
+    just sees the latest value
+    """
+
+    def __init__(self) -> None:
+        self.condition = Condition()
+        self.value = 0
+
+    def bump(self) -> None:
+        """Marks a change and wakes up everyone waiting for one"""
+        with self.condition:
+            self.value += 1
+            self.condition.notify_all()
+
+    def wait_past(self, seen: int, timeout: Optional[float] = None) -> int:
+        """Waits until the generation differs from the seen one
+        or for the timeout, returns the current generation"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.value != seen, timeout)
+            return self.value
@@ -2,18 +2,37 @@
 
 import logging
 from math import inf
-from multiprocessing import Event
-from queue import Empty, PriorityQueue, Queue
-from threading import RLock, Thread
+from queue import Empty, Queue
+from threading import Lock, RLock, Thread
 from time import time
-from typing import Any, Callable, Iterable, Optional, Set
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
 
 from blinker import Signal  # type: ignore
 
+from ...metrics import gauge
 from ...util import prctl_name
+from .timer_wheel import TimerWheel
 
 log = logging.getLogger(__name__)
 
+# Kinds of the item timers
+INVALIDATION = "invalidation"
+TIMEOUT = "timeout"
+
+# Resource classes of the gathers, the ones of different classes
+# don't wait for each other
+SERIAL = "serial"  # Talks to the printer
+LOCAL = "local"  # Just looks around the host system
+NETWORK = "network"  # Talks to something over the network
+
+# How many gathers of each resource class can run at once
+# The serial ones would only wait for each other in the serial queue
+DEFAULT_CONCURRENCY = {
+    SERIAL: 1,
+    LOCAL: 1,
+    NETWORK: 2,
+}
+
 
 class SideEffectOnly(Exception):
     """An exception to raise in a gatherer that has nothing to return,
@@ -48,18 +67,29 @@ class WatchedItem(Watchable):
                  validation_function: Optional[Callable[[Any], bool]] = None,
                  interval=None,
                  timeout=None,
-                 on_fail_interval=default_on_fail_interval):
+                 on_fail_interval=default_on_fail_interval,
+                 resource=SERIAL):
         super().__init__()
         self.name = name
+        # Which resource class the gather uses
+        self.resource = resource
         self.value: Any = None
         self.lock = RLock()
 
         self.in_groups: Set["WatchedGroup"] = set()
 
         self.scheduled = False  # Are we scheduled for a value refresh
+        self.gathering = False  # Is a refresher gathering our value
+        self.regather = False  # Got invalidated during the gather
+        # Valid with a remembered value, which is being gathered again
+        self.stale = False
         # Imprecise timing intended
         self.interval = interval  # If set, gets invalidated each interval
         self.disabled = False  # If True, the interval is overridden with None
+        # Like disabled, but the refreshes asked for in the meantime
+        # are done on resume
+        self.suspended = False
+        self.deferred = False  # A refresh was asked for while suspended
 
         self.on_fail_interval = on_fail_interval  # Refresh reschedule timeout
         self.timeout = timeout  # How long can we be invalid, before timing out
@@ -184,48 +214,88 @@ class ItemUpdater:
     Variables can be validated
     On validation or read error, variable refresh can be re-scheduled
     automatically on a timer
+    Gathers of different resource classes run concurrently,
+    each class has its own limit of concurrent gathers. The refreshers
+    of a class get started with its first item, so unused classes
+    cost nothing
     """
 
-    def __init__(self, quit_interval=0.2):
+    def __init__(self, quit_interval=0.2,
+                 concurrency: Optional[Dict[str, int]] = None):
         self.quit_interval = quit_interval
+        # Refresher thread count for each resource class
+        self.concurrency = dict(DEFAULT_CONCURRENCY)
+        if concurrency is not None:
+            self.concurrency.update(concurrency)
 
         self.running = True
-
-        self.invalidate_timers = PriorityQueue()
-        self.invalidate_queue_event = Event()
-        self.timeout_timers = PriorityQueue()
-        self.timeout_queue_event = Event()
-        self.refresh_queue = Queue()
-
-        self.refresher_thread = Thread(target=self._refresher,
-                                       name="polling",
-                                       daemon=True)
-        self.invalidator_thread = Thread(target=self._process_invalidations,
-                                         name="item_invalidator",
-                                         daemon=True)
-        self.timeout_thread = Thread(target=self._process_timeouts,
-                                     name="polling_timeout",
-                                     daemon=True)
+        self.started = False
+
+        # Services both the invalidations and the timeouts
+        # keyed by (item, INVALIDATION) or (item, TIMEOUT)
+        self.timers = TimerWheel(name="item_timers")
+        gauge("polling_timers", self.timers.__len__)
+        self.refresh_queues: Dict[str, Queue] = {}
+        for resource, limit in self.concurrency.items():
+            if limit < 1:
+                raise ValueError(f"Resource class {resource} needs at least "
+                                 f"one refresher, got {limit}")
+            refresh_queue: Queue = Queue()
+            self.refresh_queues[resource] = refresh_queue
+            gauge(f"polling_queued_{resource}", refresh_queue.qsize)
+        # Guards the lazy creation of the refreshers
+        self.refresher_lock = Lock()
+        self.refresher_threads: Dict[str, List[Thread]] = {}
 
         self.items = set()
 
+    def _add_refreshers(self, resource: str):
+        """Creates the refreshers of the resource class if it does not
+        have them yet, starts them if the updater is running already"""
+        with self.refresher_lock:
+            if resource in self.refresher_threads:
+                return
+            limit = self.concurrency[resource]
+            threads = []
+            for number in range(limit):
+                # The serial one keeps its historical name
+                name = "polling" if resource == SERIAL \
+                    else f"polling_{resource}"
+                if limit > 1:
+                    name += f"_{number}"
+                threads.append(
+                    Thread(target=self._refresher,
+                           args=(self.refresh_queues[resource],),
+                           name=name,
+                           daemon=True))
+            self.refresher_threads[resource] = threads
+            if self.started:
+                for thread in threads:
+                    thread.start()
+
     def start(self):
         """Starts up the governing threads"""
-        self.refresher_thread.start()
-        self.invalidator_thread.start()
-        self.timeout_thread.start()
+        with self.refresher_lock:
+            self.started = True
+            for threads in self.refresher_threads.values():
+                for refresher_thread in threads:
+                    refresher_thread.start()
+        self.timers.start()
 
     def stop(self):
         """Stops the value tracker"""
         self.running = False
-        self.invalidate_queue_event.set()
-        self.timeout_queue_event.set()
+        self.timers.stop()
 
     def wait_stopped(self):
         """waits for the value tracker to quit"""
-        self.invalidator_thread.join()
-        self.timeout_thread.join()
-        self.refresher_thread.join()
+        self.timers.join()
+        with self.refresher_lock:
+            threads = [thread for threads in self.refresher_threads.values()
+                       for thread in threads]
+        for refresher_thread in threads:
+            if refresher_thread.is_alive():
+                refresher_thread.join()
 
     def add_item(self, item: WatchedItem, start_tracking=True):
         """
@@ -237,6 +307,10 @@ class ItemUpdater:
         """
         if not issubclass(type(item), WatchedItem):
             raise TypeError("Can't track something, that isn't a WatchedItem.")
+        if item.resource not in self.refresh_queues:
+            raise ValueError(f"Item {item.name} uses an unknown resource "
+                             f"class {item.resource}")
+        self._add_refreshers(item.resource)
         self.items.add(item)
         if start_tracking:
             self.invalidate(item)
@@ -266,8 +340,15 @@ class ItemUpdater:
                 log.debug("Will not invalidate item %s because it's disabled.",
                           item.name)
                 return
+            if item.suspended:
+                log.debug("Deferring the invalidation of item %s because "
+                          "it's suspended.", item.name)
+                item.deferred = True
+                return
             log.debug("Item %s has been invalidated", item.name)
             item.invalidate_at = inf
+            self.timers.cancel((item, INVALIDATION))
+            item.stale = False
             if item.valid:
                 item.valid = False
                 for group in item.in_groups:
@@ -295,7 +376,69 @@ class ItemUpdater:
             if not item.disabled:
                 return
             item.disabled = False
-            self.invalidate(item)
+            if item.stale and not item.suspended:
+                # Keep the remembered value until it's gathered again
+                if not item.scheduled:
+                    self._enqueue_refresh(item)
+            else:
+                self.invalidate(item)
+
+    def suspend(self, item: WatchedItem):
+        """Suspends the item polling, the invalidations get deferred
+        until the item is resumed"""
+        self._validate_is_tracked(item)
+
+        with item.lock:
+            if item.suspended:
+                return
+            log.debug("Suspending item %s", item.name)
+            item.suspended = True
+            self.cancel_scheduled_invalidation(item)
+
+    def resume(self, item: WatchedItem):
+        """Resumes the item polling, doing the deferred invalidation
+        if there was any"""
+        self._validate_is_tracked(item)
+
+        with item.lock:
+            if not item.suspended:
+                return
+            log.debug("Resuming item %s", item.name)
+            item.suspended = False
+            deferred = item.deferred
+            item.deferred = False
+            if item.disabled:
+                return
+            if deferred:
+                self.invalidate(item)
+            elif item.interval is not None:
+                self.schedule_invalidation(item)
+
+    def seed(self, item: WatchedItem, value):
+        """
+        Sets a remembered value, for example from the last run. The item
+        becomes valid right away, but its value gets gathered again in
+        the background. If that fails, the item becomes invalid
+        """
+        self._validate_is_tracked(item)
+
+        with item.lock:
+            try:
+                valid = item.validation_function(value)
+            # pylint: disable=broad-except
+            except Exception:
+                valid = False
+            if not valid:
+                log.debug("Not seeding item %s with an invalid value %s",
+                          item.name, value)
+                return
+            # Stale before the signals go out, so their handlers
+            # enabling the item do not invalidate it
+            self._set_value(item, value, stale=True)
+            log.debug("Item %s seeded with %s", item.name, value)
+            if not item.disabled and not item.suspended \
+                    and not item.scheduled:
+                self._enqueue_refresh(item)
 
     def set_value(self, item: WatchedItem, value):
         """
@@ -314,6 +457,8 @@ class ItemUpdater:
             # pylint: disable=broad-except
             except Exception:
                 log.debug("Validation of item %s has failed", item.name)
+                if item.stale:
+                    self._drop_stale(item)
                 item.validation_error_signal.send(item)
                 item.val_err_timeout_signal.send(item)
 
@@ -350,6 +495,13 @@ class ItemUpdater:
                 log.debug("Will not schedule item %s because it is disabled.",
                           item.name)
                 return
+            if item.suspended:
+                log.debug("Will not schedule item %s because it is "
+                          "suspended.", item.name)
+                # Make sure a failed refresh gets retried on resume
+                if not item.valid:
+                    item.deferred = True
+                return
             if item.invalidate_at != inf and not reschedule:
                 log.debug(
                     "Will not schedule an invalidation for item %s because "
@@ -368,16 +520,12 @@ class ItemUpdater:
                 "Scheduling invalidation of item %s for %ss in "
                 "the future", item.name, interval)
             item.invalidate_at = time() + interval
-            self.invalidate_timers.put((item.invalidate_at, item))
-            self.invalidate_queue_event.set()
+            self.timers.schedule((item, INVALIDATION), item.invalidate_at,
+                                 self._invalidation_due, item,
+                                 item.invalidate_at)
 
     def cancel_scheduled_invalidation(self, item: WatchedItem):
-        """
-        Cancels the scheduled invalidation. The timer itself cannot
-        be cancelled, but the invalidate_at value has to match before
-        anything is executed. Changing it to infinity will accomplish
-        that nicely
-        """
+        """Cancels the scheduled invalidation"""
         self._validate_is_tracked(item)
 
         with item.lock:
@@ -386,6 +534,7 @@ class ItemUpdater:
             log.debug("Cancelling scheduled invalidation of item %s ",
                       item.name)
             item.invalidate_at = inf
+            self.timers.cancel((item, INVALIDATION))
 
     # -- Private --
 
@@ -415,8 +564,9 @@ class ItemUpdater:
         If the value gathering throws an error, it re-schedules its refresh
         and notifies of a fail
         """
-        if item.valid:
-            return
+        with item.lock:
+            if item.valid and not item.stale:
+                return
 
         # Items without gather functions have no point in spinning,
         # something else needs to take care of them
@@ -441,6 +591,8 @@ class ItemUpdater:
         except Exception:
             with item.lock:
                 log.exception("Gather of %s has failed", item.name)
+                if item.stale:
+                    self._drop_stale(item)
                 item.error_refreshing_signal.send(item)
                 item.val_err_timeout_signal.send(item)
                 self._gather_error_reschedule(item)
@@ -460,10 +612,24 @@ class ItemUpdater:
                     "%ss in the future", item.name, item.on_fail_interval)
                 self.schedule_invalidation(item, item.on_fail_interval)
 
-    def _set_value(self, item, value):
+    @staticmethod
+    def _drop_stale(item: WatchedItem):
+        """The remembered value could not be confirmed, invalidates the
+        item without scheduling a refresh"""
+        with item.lock:
+            log.debug("Remembered value of item %s is not valid anymore",
+                      item.name)
+            item.stale = False
+            item.valid = False
+            for group in item.in_groups:
+                group.invalid_handler(item)
+            item.became_invalid_signal.send(item)
+
+    def _set_value(self, item, value, stale=False):
         """
         Internal, only sets the value without validation
         Should be pre-validate before this gets called
+        :param stale: whether the value is a remembered one
         """
         with item.lock:
             changed = value != item.value
@@ -474,7 +640,9 @@ class ItemUpdater:
             item.write_function(value)
             was_invalid = not item.valid
             item.valid = True
+            item.stale = stale
             item.times_out_at = inf
+            self.timers.cancel((item, TIMEOUT))
             if item.interval is not None:
                 self.schedule_invalidation(item, reschedule=True)
             if was_invalid:
@@ -496,74 +664,57 @@ class ItemUpdater:
         with item.lock:
             if item.timeout is not None and item.times_out_at == inf:
                 item.times_out_at = time() + item.timeout
-                self.timeout_timers.put((item.times_out_at, item))
+                self.timers.schedule((item, TIMEOUT), item.times_out_at,
+                                     self._timeout_due, item,
+                                     item.times_out_at)
 
             item.scheduled = True
-            self.refresh_queue.put(item)
+            self.refresh_queues[item.resource].put(item)
 
-    def _refresher(self):
+    def _refresher(self, refresh_queue: Queue):
         """
-        Processes all values queued up for refreshing
+        Processes the values of one resource class queued up for refreshing
+        There can be more refreshers per queue, one item gets gathered
+        by only one of them at a time though
         """
         prctl_name()
         while self.running:
             try:
-                item = self.refresh_queue.get(timeout=self.quit_interval)
+                item = refresh_queue.get(timeout=self.quit_interval)
             except Empty:
-                pass
-            else:
-                with item.lock:
-                    item.scheduled = False
-                self._gather(item)
+                continue
 
-    def _process_invalidations(self):
-        """
-        Processes the invalidation queue.
-        If a timer is checked and does not match with the set timer on an
-        item, it is discarded, so only valid timers call their callbacks
-        :return:
-        """
-        prctl_name()
-        while self.running:
-            try:
-                invalidate_at, item = self.invalidate_timers.get(
-                    timeout=self.quit_interval)
-            except Empty:
-                pass
-            else:
-                # Check if the timer is valid
-                if invalidate_at != item.invalidate_at:
+            with item.lock:
+                item.scheduled = False
+                if item.gathering:
+                    # Let the one gathering it now enqueue it again
+                    item.regather = True
                     continue
+                item.gathering = True
+            try:
+                self._gather(item)
+            finally:
+                with item.lock:
+                    item.gathering = False
+                    if item.regather:
+                        item.regather = False
+                        if not item.scheduled:
+                            self._enqueue_refresh(item)
 
-                current_time = time()
-                if invalidate_at > current_time:
-                    self.invalidate_timers.put((invalidate_at, item))
-                    self.invalidate_queue_event.wait(invalidate_at -
-                                                     current_time)
-                    self.invalidate_queue_event.clear()
-                else:
-                    self.invalidate(item)
-
-    def _process_timeouts(self):
+    def _invalidation_due(self, item: WatchedItem, invalidate_at: float):
         """
-        Same as invalidators, except its timeouts
+        Invalidation timer callback, re-scheduling or cancelling
+        right before the timer fires can still let it through,
+        so the time has to match what's set on the item
         """
-        prctl_name()
-        while self.running:
-            try:
-                times_out_at, item = self.timeout_timers.get(
-                    timeout=self.quit_interval)
-            except Empty:
-                pass
-            else:
-                # Check if the timer is valid
-                if times_out_at != item.times_out_at:
-                    continue
+        with item.lock:
+            if invalidate_at != item.invalidate_at:
+                return
+            self.invalidate(item)
 
-                current_time = time()
-                if times_out_at > current_time:
-                    self.timeout_timers.put((times_out_at, item))
-                    self.timeout_queue_event.wait(times_out_at - current_time)
-                    self.timeout_queue_event.clear()
-                else:
-                    self._time_out(item)
+    def _timeout_due(self, item: WatchedItem, times_out_at: float):
+        """Timeout timer callback, the same as the invalidation one"""
+        with item.lock:
+            if times_out_at != item.times_out_at:
+                return
+            self._time_out(item)
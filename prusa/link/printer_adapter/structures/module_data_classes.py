@@ -55,6 +55,9 @@ class FilePrinterData(BaseModel):
 
     # In reality Deque[Instruction] but that cannot be validated by pydantic
     enqueued: Deque[Any]
+    # Prepared instructions not handed over to the serial queue yet
+    # In reality List[Instruction]
+    batch: List[Any]
     gcode_number: int
 
 
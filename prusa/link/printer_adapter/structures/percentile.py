@@ -0,0 +1,96 @@
+"""
+Contains implementation of the BinnedPercentile class
+A sliding window percentile, which does not allocate anything per value
+"""
+from array import array
+
+
+class BinnedPercentile:
+    """
+    Keeps the latest `size` values in an array ring buffer and counts them
+    into fixed width bins spanning from zero to max_value. Values outside
+    that range get counted into the first or the last bin.
+
+    The bin containing the percentile is tracked incrementally along with
+    the count of values in the bins below it. An added or evicted value
+    moves it by just the bins it has to skip, so there is no sorting
+    or heap balancing.
+    """
+
+    def __init__(self, size: int, ratio: float, max_value: float,
+                 bins: int = 1000) -> None:
+        """
+        :param size: how many latest values to compute the percentile from
+        :param ratio: which percentile to compute 0.95 means 95th
+        :param max_value: the upper bound of the binned range
+        :param bins: how many bins to divide the range into, determines
+            the resolution of the result
+        """
+        self.size = size
+        self.ratio = ratio
+        self.bin_count = bins
+        self.bin_width = max_value / bins
+
+        self.values = array("d", [0.0]) * size
+        self.counts = array("L", [0]) * bins
+        self.next_index = 0
+        self.count = 0
+
+        self.percentile_bin = 0
+        self.below = 0
+
+    def __len__(self):
+        return self.count
+
+    def _bin(self, value: float) -> int:
+        """Returns the index of the bin the value belongs into"""
+        return max(0, min(int(value / self.bin_width), self.bin_count - 1))
+
+    def _rank(self) -> int:
+        """Returns the index of the percentile value in the sorted values"""
+        return min(self.count - 1, int(self.count * self.ratio))
+
+    def add(self, value: float) -> None:
+        """Adds a value, evicting the oldest one if the window is full"""
+        if self.count == self.size:
+            evicted_bin = self._bin(self.values[self.next_index])
+            self.counts[evicted_bin] -= 1
+            if evicted_bin < self.percentile_bin:
+                self.below -= 1
+        else:
+            self.count += 1
+
+        self.values[self.next_index] = value
+        self.next_index = (self.next_index + 1) % self.size
+
+        new_bin = self._bin(value)
+        self.counts[new_bin] += 1
+        if new_bin < self.percentile_bin:
+            self.below += 1
+        self._move_percentile()
+
+    def _move_percentile(self) -> None:
+        """Finds the bin with the percentile, starting from the last one"""
+        rank = self._rank()
+        counts = self.counts
+        percentile_bin = self.percentile_bin
+        below = self.below
+        while below > rank:
+            percentile_bin -= 1
+            below -= counts[percentile_bin]
+        while below + counts[percentile_bin] <= rank:
+            below += counts[percentile_bin]
+            percentile_bin += 1
+        self.percentile_bin = percentile_bin
+        self.below = below
+
+    def get(self) -> float:
+        """
+        Returns the percentile value, interpolated linearly inside its bin
+        Infinity if there are no values yet
+        """
+        if not self.count:
+            return float("inf")
+        in_bin = self.counts[self.percentile_bin]
+        position = (self._rank() - self.below + 0.5) / in_bin
+        return (self.percentile_bin + position) * self.bin_width
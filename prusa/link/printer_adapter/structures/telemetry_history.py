@@ -0,0 +1,141 @@
+"""
+Contains implementation of the TelemetryHistory class
+Keeps the recent telemetry values in fixed size ring buffers, averaged
+into buckets of a few different lengths
+"""
+from array import array
+from math import floor
+from threading import Lock
+from time import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# bucket length in seconds, bucket count
+Level = Tuple[int, int]
+
+# The averages are kept as 32-bit floats, do not pretend more precision
+PRECISION = 2
+
+
+class RollupSeries:
+    """
+    One metric at one resolution. The finished buckets are kept in
+    a ring of columnar arrays, the one being filled only as a sum
+    and a count. Nothing gets allocated per value
+    """
+
+    def __init__(self, resolution: int, size: int) -> None:
+        self.resolution = resolution
+        self.size = size
+        self.starts = array("d", bytes(8 * size))
+        self.values = array("f", bytes(4 * size))
+        self.head = 0  # Where the next finished bucket goes
+        self.count = 0  # How many finished buckets there are
+
+        self.bucket_start: Optional[float] = None
+        self.bucket_sum = 0.
+        self.bucket_count = 0
+
+    def add(self, timestamp: float, value: float) -> None:
+        """Adds the value into its bucket, finishing the previous one"""
+        bucket_start = floor(timestamp / self.resolution) * self.resolution
+        if bucket_start != self.bucket_start:
+            if self.bucket_start is not None and bucket_start < \
+                    self.bucket_start:
+                return  # The clock went back, ignore until it catches up
+            self._finish_bucket()
+            self.bucket_start = bucket_start
+        self.bucket_sum += value
+        self.bucket_count += 1
+
+    def _finish_bucket(self) -> None:
+        """Moves the average of the current bucket into the ring"""
+        if self.bucket_start is None or not self.bucket_count:
+            return
+        self.starts[self.head] = self.bucket_start
+        self.values[self.head] = self.bucket_sum / self.bucket_count
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+        self.bucket_sum = 0.
+        self.bucket_count = 0
+
+    def since(self, since: float) -> Tuple[List[int], List[float]]:
+        """Returns the bucket starts and averages from the supplied
+        timestamp on, the unfinished bucket included"""
+        starts: List[int] = []
+        values: List[float] = []
+        oldest = (self.head - self.count) % self.size
+        for i in range(self.count):
+            index = (oldest + i) % self.size
+            if self.starts[index] >= since:
+                starts.append(int(self.starts[index]))
+                values.append(round(self.values[index], PRECISION))
+        if self.bucket_count and self.bucket_start is not None \
+                and self.bucket_start >= since:
+            starts.append(int(self.bucket_start))
+            values.append(round(self.bucket_sum / self.bucket_count,
+                                PRECISION))
+        return starts, values
+
+
+class TelemetryHistory:
+    """
+    Keeps the history of the numeric telemetry values. Every value gets
+    rolled up into each of the levels, the finest level reaching far
+    enough back answers the query
+    """
+
+    def __init__(self, metrics: Iterable[str],
+                 levels: Iterable[Level]) -> None:
+        self.levels = sorted(levels)
+        self.lock = Lock()
+        self.series: Dict[str, List[RollupSeries]] = {
+            metric: [RollupSeries(resolution, size)
+                     for resolution, size in self.levels]
+            for metric in metrics}
+
+    @property
+    def metrics(self) -> List[str]:
+        """The names of the recorded metrics"""
+        return list(self.series)
+
+    def record(self, values: Iterable[Tuple[Tuple[str, ...], Any]],
+               timestamp: Optional[float] = None) -> None:
+        """Records the values of the tracked metrics from the
+        (path, value) pairs, other ones are ignored"""
+        if timestamp is None:
+            timestamp = time()
+        with self.lock:
+            for path, value in values:
+                if len(path) != 1:
+                    continue
+                series = self.series.get(path[0])
+                if series is None:
+                    continue
+                for rollup in series:
+                    rollup.add(timestamp, value)
+
+    def query(self, metrics: Iterable[str],
+              since: Optional[float] = None,
+              now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Returns the history of the supplied metrics since the timestamp
+        at the finest resolution that reaches that far back
+        :raises KeyError: for a metric that is not recorded
+        """
+        if now is None:
+            now = time()
+        resolution, size = self.levels[0]
+        if since is None:
+            since = now - resolution * size
+        level = len(self.levels) - 1
+        for i, (resolution, size) in enumerate(self.levels):
+            if now - since <= resolution * size:
+                level = i
+                break
+
+        data: Dict[str, Any] = {}
+        with self.lock:
+            for metric in metrics:
+                starts, values = self.series[metric][level].since(since)
+                data[metric] = {"timestamps": starts, "values": values}
+        return {"resolution": self.levels[level][0], "metrics": data}
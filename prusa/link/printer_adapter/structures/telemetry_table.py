@@ -0,0 +1,272 @@
+"""
+Contains implementation of the TelemetryTable class
+The telemetry schema flattened into a table of channels, one for each
+bottom-most value, so the new values get diffed in a single loop
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+from pydantic.fields import MAPPING_LIKE_SHAPES
+
+Path = Tuple[str, ...]
+
+
+class Channel:
+    """
+    A single bottom-most telemetry value
+
+    The path is the one of the dict sent to Connect, the model path
+    the one of the pydantic models. Each step of the model path remembers
+    whether it's in a dict and what to create, when there's nothing there
+    """
+
+    __slots__ = ("path", "model_path", "steps", "leaf", "leaf_in_dict",
+                 "mask", "jitter", "full", "latest", "sent", "pending")
+
+    def __init__(self, path: Path, model_path: Path,
+                 steps: List[Tuple[str, bool, Any]], leaf_in_dict: bool,
+                 mask: int, jitter: bool):
+        self.path = path
+        self.model_path = model_path
+        self.steps = steps
+        self.leaf = model_path[-1]
+        self.leaf_in_dict = leaf_in_dict
+        self.mask = mask  # Modifier bits of the value and its parents
+        self.jitter = jitter
+
+        self.full: Any = None  # The latest value, even if filtered
+        self.latest: Any = None  # What's in the model
+        self.sent: Any = None  # What has been sent
+        self.pending: Any = None  # What's waiting to be sent
+
+    def write(self, model: BaseModel, value):
+        """Writes the value into the model, creating the missing parents"""
+        target: Any = model
+        for key, in_dict, factory in self.steps:
+            if in_dict:
+                next_target = target.get(key)
+            else:
+                next_target = getattr(target, key)
+            if next_target is None:
+                next_target = factory()
+                if in_dict:
+                    target[key] = next_target
+                else:
+                    setattr(target, key, next_target)
+            target = next_target
+        if self.leaf_in_dict:
+            target[self.leaf] = value
+        else:
+            setattr(target, self.leaf, value)
+
+    def reset(self, model: BaseModel):
+        """Sets the value in the model to None, if it's there"""
+        target: Any = model
+        for key, in_dict, _ in self.steps:
+            if in_dict:
+                target = target.get(key)
+            else:
+                target = getattr(target, key)
+            if target is None:
+                return
+        if self.leaf_in_dict:
+            target[self.leaf] = None
+        else:
+            setattr(target, self.leaf, None)
+
+
+class TelemetryTable:
+    """
+    Keeps a channel for each telemetry value, with the modifier bits of
+    its path precomputed. The channels of the model fields are compiled
+    up front, the ones for dict entries, like the MMU slots, the first time
+    they are seen.
+
+    The dict fields of the models are merged into their parents in the
+    dict paths, the same way Slot.dict() does it.
+    """
+
+    def __init__(self, model_type: Type[BaseModel], masks: Dict[Path, int],
+                 jitter_bit: int, jitter_threshold: float):
+        self.model_type = model_type
+        self.masks = masks
+        self.jitter_bit = jitter_bit
+        self.jitter_threshold = jitter_threshold
+
+        self.channels: Dict[Path, Channel] = {}
+        self._by_model_path: Dict[Path, Channel] = {}
+        self._pending: Dict[Path, Channel] = {}
+
+        self._compile_model(model_type, ())
+
+    def __iter__(self) -> Iterator[Channel]:
+        return iter(self.channels.values())
+
+    def _compile_model(self, model_type: Type[BaseModel], model_path: Path):
+        """Compiles the channels of every field not under a dict"""
+        for name, field in model_type.__fields__.items():
+            field_path = model_path + (name,)
+            if field.shape in MAPPING_LIKE_SHAPES:
+                continue  # The keys are not known up front
+            if isinstance(field.type_, type) \
+                    and issubclass(field.type_, BaseModel):
+                self._compile_model(field.type_, field_path)
+            else:
+                self._compile(field_path)
+
+    def _compile(self, model_path: Path) -> Channel:
+        """Compiles the channel for the supplied model path"""
+        steps: List[Tuple[str, bool, Any]] = []
+        path: List[str] = []
+        model_type: Optional[Type[BaseModel]] = self.model_type
+        dict_value_type: Any = None
+        for key in model_path:
+            if model_type is None:
+                # A key of a dict field, its value is one of its items
+                steps.append((key, True, dict_value_type))
+                path.append(key)
+                model_type = dict_value_type
+                continue
+            field = model_type.__fields__[key]
+            if field.shape in MAPPING_LIKE_SHAPES:
+                steps.append((key, False, dict))
+                dict_value_type = field.type_
+                model_type = None
+                continue  # Merged into the parent
+            steps.append((key, False, field.type_))
+            path.append(key)
+            model_type = field.type_
+        leaf_in_dict = steps[-1][1]
+        steps.pop()
+
+        mask = 0
+        for i in range(len(path)):
+            mask |= self.masks.get(tuple(path[:i + 1]), 0)
+        channel = Channel(path=tuple(path),
+                          model_path=model_path,
+                          steps=steps,
+                          leaf_in_dict=leaf_in_dict,
+                          mask=mask,
+                          jitter=bool(mask & self.jitter_bit))
+        self.channels[channel.path] = channel
+        self._by_model_path[model_path] = channel
+        return channel
+
+    def get(self, path: Path) -> Optional[Channel]:
+        """Gets the channel for the dict path"""
+        return self.channels.get(path)
+
+    def flatten(self, model: BaseModel,
+                model_path: Path = ()) -> Iterator[Tuple[Path, Any]]:
+        """Yields the model paths and values of everything that has been
+        set in the model, skipping Nones"""
+        for name in model.__fields_set__:
+            value = getattr(model, name)
+            if value is None:
+                continue
+            if isinstance(value, BaseModel):
+                yield from self.flatten(value, model_path + (name,))
+            elif isinstance(value, dict):
+                for key, item in value.items():
+                    item_path = model_path + (name, key)
+                    if isinstance(item, BaseModel):
+                        yield from self.flatten(item, item_path)
+                    elif item is not None:
+                        yield item_path, item
+            else:
+                yield model_path + (name,), value
+
+    def apply(self, values, filter_mask: int,
+              model: BaseModel) -> Tuple[List[Channel], bool]:
+        """
+        Takes the model paths and values, writes the ones that are not
+        filtered into the model and marks the ones that differ from the sent
+        ones for sending. Filtered values get removed from the model
+        :return: The channels marked for sending and whether the model
+            has changed
+        """
+        by_model_path = self._by_model_path
+        pending = self._pending
+        threshold = self.jitter_threshold
+        changed = []
+        model_changed = False
+        for model_path, value in values:
+            channel = by_model_path.get(model_path)
+            if channel is None:
+                channel = self._compile(model_path)
+            channel.full = value
+
+            if channel.mask & filter_mask:
+                if channel.latest is not None:
+                    channel.latest = None
+                    channel.reset(model)
+                    model_changed = True
+                continue
+
+            if value != channel.latest:
+                channel.latest = value
+                channel.write(model, value)
+                model_changed = True
+
+            sent = channel.sent
+            if sent is None:
+                to_send = True
+            elif channel.jitter:
+                to_send = abs(sent - value) > threshold
+            else:
+                to_send = value != sent
+
+            if to_send:
+                channel.pending = value
+                pending[channel.path] = channel
+                changed.append(channel)
+            elif channel.pending is not None:
+                # Got back to what was sent, there's nothing to send
+                channel.pending = None
+                del pending[channel.path]
+        return changed, model_changed
+
+    def full_values(self) -> List[Tuple[Path, Any]]:
+        """The model paths and the latest values, even the filtered ones"""
+        return [(channel.model_path, channel.full) for channel in self
+                if channel.full is not None]
+
+    def take_pending(self) -> Dict[str, Any]:
+        """Returns the values waiting to be sent as a dict,
+        considering them sent"""
+        data: Dict[str, Any] = {}
+        for channel in self._pending.values():
+            target = data
+            for key in channel.path[:-1]:
+                target = target.setdefault(key, {})
+            target[channel.path[-1]] = channel.pending
+            channel.sent = channel.pending
+            channel.pending = None
+        self._pending.clear()
+        return data
+
+    def resend(self):
+        """Marks everything in the model to be sent"""
+        self._pending.clear()
+        for channel in self:
+            channel.pending = channel.latest
+            if channel.latest is not None:
+                self._pending[channel.path] = channel
+
+    def reset(self, path: Path, model: BaseModel):
+        """Forgets the value for the dict path"""
+        channel = self.channels.get(path)
+        if channel is None:
+            return
+        channel.full = None
+        channel.latest = None
+        channel.reset(model)
+
+    def wipe(self):
+        """Forgets what's in the model and what has been sent,
+        the model itself has to be replaced by the caller"""
+        self._pending.clear()
+        for channel in self:
+            channel.latest = None
+            channel.sent = None
+            channel.pending = None
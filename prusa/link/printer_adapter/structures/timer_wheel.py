@@ -0,0 +1,167 @@
+"""
+Contains implementation of the TimerWheel class
+A hashed timer wheel, where scheduling, re-scheduling and cancelling
+a timer takes a constant time and leaves nothing behind
+"""
+import logging
+from math import ceil, floor
+from threading import Event, Lock, Thread
+from time import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from ...util import prctl_name
+
+log = logging.getLogger(__name__)
+
+# deadline, callback, callback arguments
+Timer = Tuple[float, Callable[..., None], Tuple[Any, ...]]
+
+
+class TimerWheel:
+    """
+    The timers are hashed by their deadline tick into a ring of buckets.
+    A bucket holds the timers of every revolution, so the ones due in
+    a later revolution stay in it when it gets processed.
+    Each timer has a key. Scheduling an already existing key replaces
+    its timer, so there is at most one timer per key.
+
+    One thread services all the timers. It sleeps until the earliest
+    deadline in the nearest non-empty bucket and calls the due callbacks.
+    Its wakeups do not depend on how many times the timers have been
+    re-scheduled or cancelled
+    """
+
+    def __init__(self, resolution: float = 0.01, slots: int = 512,
+                 name: str = "timer_wheel") -> None:
+        """
+        :param resolution: the tick length, a bucket holds the timers
+            due within one tick
+        :param slots: the bucket count, one revolution takes
+            resolution * slots seconds
+        :param name: the name of the servicing thread
+        """
+        self.resolution = resolution
+        self.slots = slots
+
+        self.lock = Lock()
+        self.buckets: List[Dict[Hashable, Timer]] = [
+            {} for _ in range(slots)]
+        # key: the tick the timer is hashed by
+        self.ticks: Dict[Hashable, int] = {}
+
+        # The last fully processed tick and when we're sleeping until
+        self.current_tick = floor(time() / resolution)
+        self.wake_at: Optional[float] = None
+        self.wakeup_event = Event()
+
+        self.running = True
+        self.thread = Thread(target=self._service, name=name, daemon=True)
+
+    def __len__(self) -> int:
+        return len(self.ticks)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.ticks
+
+    def start(self) -> None:
+        """Starts the servicing thread"""
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stops the servicing thread"""
+        self.running = False
+        self.wakeup_event.set()
+
+    def join(self) -> None:
+        """Waits for the servicing thread to quit"""
+        self.thread.join()
+
+    def schedule(self, key: Hashable, deadline: float,
+                 callback: Callable[..., None], *args: Any) -> None:
+        """
+        Calls the callback with args at the deadline
+        Replaces the timer of the same key if there is one
+        """
+        with self.lock:
+            # Rounding up, so nothing fires early
+            tick = max(ceil(deadline / self.resolution),
+                       self.current_tick + 1)
+            self._remove(key)
+            self.buckets[tick % self.slots][key] = (deadline, callback, args)
+            self.ticks[key] = tick
+            if self.wake_at is None or deadline < self.wake_at:
+                self.wakeup_event.set()
+
+    def cancel(self, key: Hashable) -> None:
+        """Cancels the timer of the key, does nothing if there's none"""
+        with self.lock:
+            self._remove(key)
+
+    def _remove(self, key: Hashable) -> None:
+        """Removes the timer of the key, the lock needs to be held"""
+        tick = self.ticks.pop(key, None)
+        if tick is not None:
+            del self.buckets[tick % self.slots][key]
+
+    def _collect_due(self, now: float) -> List[Timer]:
+        """
+        Processes the buckets of the ticks that have passed,
+        takes out the due timers
+        The lock needs to be held
+        """
+        now_tick = floor(now / self.resolution)
+        # The timers due by now are hashed up to this tick
+        last_tick = ceil(now / self.resolution)
+        # After a long sleep, every bucket needs to be looked at just once
+        first_tick = max(self.current_tick + 1, last_tick - self.slots + 1)
+        due = []
+        for tick in range(first_tick, last_tick + 1):
+            bucket = self.buckets[tick % self.slots]
+            for key, timer in list(bucket.items()):
+                if timer[0] <= now:
+                    del bucket[key]
+                    del self.ticks[key]
+                    due.append(timer)
+        self.current_tick = max(self.current_tick, now_tick)
+        return due
+
+    def _next_deadline(self) -> Optional[float]:
+        """
+        Returns the earliest deadline of the nearest tick with timers,
+        the buckets can have timers of later revolutions in them too
+        The lock needs to be held
+        """
+        if not self.ticks:
+            return None
+        for tick in range(self.current_tick + 1,
+                          self.current_tick + self.slots + 1):
+            deadlines = [
+                deadline
+                for key, (deadline, _, _) in self.buckets[
+                    tick % self.slots].items()
+                if self.ticks[key] == tick]
+            if deadlines:
+                return min(deadlines)
+        # Everything is more than a revolution away
+        return (self.current_tick + self.slots) * self.resolution
+
+    def _service(self) -> None:
+        """Calls the due callbacks and sleeps until the next ones"""
+        prctl_name()
+        while self.running:
+            self.wakeup_event.clear()
+            now = time()
+            with self.lock:
+                due = self._collect_due(now)
+                self.wake_at = self._next_deadline()
+            for _, callback, args in sorted(due, key=lambda timer: timer[0]):
+                try:
+                    callback(*args)
+                except Exception:  # pylint: disable=broad-except
+                    log.exception("Timer callback %s failed", callback)
+
+            if self.wake_at is None:
+                timeout = None
+            else:
+                timeout = max(self.wake_at - time(), 0)
+            self.wakeup_event.wait(timeout)
@@ -5,32 +5,31 @@ send telemetry and what actual telemetry to send
 """
 
 import logging
-from copy import deepcopy
 from enum import Enum
 from threading import Event, RLock, Thread
 from time import time
-from typing import Any
 
 from prusa.connect.printer import Printer
 from prusa.connect.printer.const import State
-from pydantic import BaseModel
-from pydantic.utils import deep_update
 
 from ..config import Settings
 from ..const import (
     JITTER_THRESHOLD,
     MMU_SLOTS,
     PRINTING_STATES,
+    TELEMETRY_HISTORY_LEVELS,
     TELEMETRY_IDLE_INTERVAL,
     TELEMETRY_PRINTING_INTERVAL,
     TELEMETRY_REFRESH_INTERVAL,
     TELEMETRY_SLEEP_AFTER,
     TELEMETRY_SLEEPING_INTERVAL,
 )
-from ..util import loop_until, walk_dict
+from ..util import loop_until
 from .model import Model
 from .structures.mc_singleton import MCSingleton
 from .structures.model_classes import Telemetry
+from .structures.telemetry_history import TelemetryHistory
+from .structures.telemetry_table import TelemetryTable
 
 log = logging.getLogger(__name__)
 
@@ -49,8 +48,11 @@ class Modifier(Enum):
     ACTIVATE_PRINTING = "ACTIVATE_PRINTING"  # Same but when printing
 
 
+# Each modifier gets a bit, so the ones of a value can be kept in an int
+MODIFIER_BITS = {modifier: 1 << i for i, modifier in enumerate(Modifier)}
+
 # Important - all filter paths are in the dict format
-# model is different in structure, the paths are mapped using a mapping below
+# model is different in structure, the telemetry table maps the paths
 MODIFIERS: dict[tuple[str, ...], set[Modifier]] = {
     ("target_nozzle",): {Modifier.ACTIVATE_IDLE},
     ("target_bed",): {Modifier.ACTIVATE_IDLE},
@@ -70,16 +72,24 @@ MODIFIERS: dict[tuple[str, ...], set[Modifier]] = {
     # ("a") - applies to "a", so if it's filtered, its children are too
 }
 
-MAPPING = {  # type: ignore
-    "slot": {},
-}
-
 for i_ in range(1, MMU_SLOTS+1):
-    # Map slots from orm to the dict representation
-    MAPPING["slot"][str(i_)] = ("slot", "slots", str(i_))
     # Add jitter temps to every slot temp value
     MODIFIERS[("slot", str(i_), "temp")] = {Modifier.JITTER_TEMP}
 
+# The values kept in the telemetry history for the web UI charts
+HISTORY_METRICS = (
+    "temp_nozzle", "temp_bed", "target_nozzle", "target_bed",
+    "fan_hotend", "fan_print", "speed", "flow", "progress",
+)
+
+
+def modifier_mask(modifiers) -> int:
+    """Combines the modifier bits into one mask"""
+    mask = 0
+    for modifier in modifiers:
+        mask |= MODIFIER_BITS[modifier]
+    return mask
+
 
 class TelemetryPasser(metaclass=MCSingleton):
     """Tasked with passing the correct telemetry with the correct timing"""
@@ -97,12 +107,19 @@ class TelemetryPasser(metaclass=MCSingleton):
                              name="telemetry_passer")
         self.full_refresh_at = 0
 
-        self._active_filters: set[Any] = set()
+        # The modifier bits of the currently active filters
+        self._filter_mask = 0
 
-        self._last_sent: dict[str, Any] = {}
-        self._to_send: dict[str, Any] = {}
-        self._latest_full = Telemetry()
+        # Remembers the latest, the sent and the to be sent values
+        self._table = TelemetryTable(
+            Telemetry,
+            masks={key_path: modifier_mask(modifiers)
+                   for key_path, modifiers in MODIFIERS.items()},
+            jitter_bit=MODIFIER_BITS[Modifier.JITTER_TEMP],
+            jitter_threshold=JITTER_THRESHOLD)
         self.model.latest_telemetry = Telemetry()
+        self.history = TelemetryHistory(HISTORY_METRICS,
+                                        TELEMETRY_HISTORY_LEVELS)
 
         self.last_activity_at = time()
 
@@ -165,202 +182,51 @@ class TelemetryPasser(metaclass=MCSingleton):
             return
 
         with self.lock:
-            # Update what we sent last time
-
-            self._last_sent = deep_update(self._last_sent, self._to_send)
-
-            telemetry = self._to_send
-            self._to_send = {}
+            # The taken values are considered sent
+            telemetry = self._table.take_pending()
 
         self.printer.telemetry(**telemetry)
 
-    def _get_filtered_paths(self):
-        state = self.model.state_manager.current_state
-        if state not in PRINTING_STATES:
-            looking_for = Modifier.FILTER_IDLE
-        elif state == State.PRINTING:
-            looking_for = Modifier.FILTER_PRINTING
-        else:
-            return set()
-
-        filtered = set()
-        for key_path, filters in MODIFIERS.items():
-            if looking_for in filters:
-                filtered.add(key_path)
-
-        return filtered
-
-    def _get_modifiers(self, key_path):
-        modifiers = set()
-        for i in range(len(key_path)):
-            modifiers.update(MODIFIERS.get(key_path[:i+1], set()))
-        return modifiers
-
     def set_telemetry(self, new_telemetry: Telemetry):
         """Filters jitter, state inappropriate or unchanged data
         Updates the telemetries with new data"""
+        values = list(self._table.flatten(new_telemetry))
+        self.history.record(values)
+        self.apply(values)
+
+    def apply(self, values):
+        """Diffs the (model path, value) pairs against the sent ones
+        in bulk, the ones to be sent get sent on the next update"""
         with self.lock:
-            new_telemetry_dict = new_telemetry.dict(exclude_none=True)
-            for key_path, value in walk_dict(new_telemetry_dict):
-                key_path = tuple(key_path)
-
-                if value is None or value == {}:
-                    continue  # ignore nones and empty dicts
-
-                modifiers = self._get_modifiers(key_path)
-
-                self._update_by_path(
-                    self._latest_full, new_telemetry, key_path)
-
-                if modifiers & self._active_filters:
-                    # Internally we need to check against none
-                    self._reset_by_path(
-                        self.model.latest_telemetry, key_path)
-                    continue
-
-                self._update_by_path(
-                    self.model.latest_telemetry, new_telemetry, key_path)
-
-                to_update = False
-                if self._get_by_path(self._last_sent, key_path) is None:
-                    to_update = True
-                elif Modifier.JITTER_TEMP in modifiers:
-                    old = self._get_by_path(self._last_sent, key_path)
-                    new = value
-                    assert new is not None
-                    if old is None:
-                        to_update = True
-                    else:
-                        assert isinstance(new, float)
-                        assert isinstance(old, float)
-                        if abs(old - new) > JITTER_THRESHOLD:
-                            to_update = True
-                elif value != self._get_by_path(self._last_sent, key_path):
-                    to_update = True
-
-                # Wake up from sleep, when specific values change
-                if to_update:
-                    if self._should_wake_up(modifiers):
-                        self.activity_observed()
-                    self._update_by_path(
-                        self._to_send, new_telemetry_dict, key_path)
+            changed, model_changed = self._table.apply(
+                values, self._filter_mask, self.model.latest_telemetry)
+            if model_changed:
+                self.model.generation.bump()
+
+            # Wake up from sleep, when specific values change
+            for channel in changed:
+                if self._should_wake_up(channel.mask):
+                    self.activity_observed()
+                    break
 
         self._resend_telemetry_on_timer()
 
-    def _should_wake_up(self, modifiers):
+    def _should_wake_up(self, mask):
         """Returns true if the telemetry passer should wake up from sleep
-        based on the current state and the modifiers present"""
+        based on the current state and the modifier bits present"""
         state = self.model.state_manager.current_state
         if state in PRINTING_STATES:
-            if Modifier.ACTIVATE_PRINTING not in modifiers:
+            if not mask & MODIFIER_BITS[Modifier.ACTIVATE_PRINTING]:
                 return False
-            if Modifier.FILTER_PRINTING in modifiers:
+            if mask & MODIFIER_BITS[Modifier.FILTER_PRINTING]:
                 return True
-        return Modifier.ACTIVATE_IDLE in modifiers
+        return bool(mask & MODIFIER_BITS[Modifier.ACTIVATE_IDLE])
 
     def reset_value(self, key_path):
         """Resets the value for filament_change_in and nothing else"""
         with self.lock:
-            self._reset_by_path(self._latest_full, key_path)
-            self._reset_by_path(self.model.latest_telemetry, key_path)
-
-    def _set_multi(self, structure, key, value):
-        """Sets a value from a dictionary or a model"""
-        if isinstance(structure, dict):
-            structure[key] = value
-        elif issubclass(type(structure), BaseModel):
-            setattr(structure, key, value)
-        else:
-            raise TypeError("Unsupported type for traversing")
-
-    def _get_multi(self, structure, key):
-        """Gets a value from a dictionary or a model"""
-        if isinstance(structure, dict):
-            return structure.get(key)
-        if issubclass(type(structure), BaseModel):
-            return getattr(structure, key)
-        raise TypeError("Unsupported type for traversing")
-
-    def _get_correct_path(self, structure, key_path):
-        """Gets the correct path depending on the structure type"""
-        if isinstance(structure, dict):
-            return key_path
-        if issubclass(type(structure), BaseModel):
-            return self._path_to_model(key_path)
-        raise TypeError("Unsupported type for traversing")
-
-    def _update_by_path(self, target, source, key_path,
-                        set_none=False):
-        """Sets a value in the model,
-        allow setting none, or pushing more data
-        key path is auto mapped, provide the dict equivalent one
-
-        Some assumptions not to be broken as this is fragile AF
-        Always supply the full path, do not let it end on a sub dict
-        or sub model, full paths only
-        Supply only models or dicts
-        """
-        if not isinstance(target, type(source)):
-            raise TypeError("Source and target must be of the same type")
-        model_path = self._get_correct_path(target, key_path)
-
-        for key in model_path[:-1]:
-            if not isinstance(target, type(source)):
-                raise TypeError("Source and target differ in structure")
-            next_source = self._get_multi(source, key)
-            next_target = self._get_multi(target, key)
-            if next_source is None:
-                # Source has less depth than target
-                if set_none:
-                    self._set_multi(target, key, None)
-                return
-            if next_target is None:
-                self._set_multi(target, key, deepcopy(next_source))
-                return  # We have set a subtree, we're done
-            source = next_source
-            target = next_target
-        value = self._get_multi(source, model_path[-1])
-        if value is None and not set_none:
-            return  # We don't want to set None, only add more data
-        self._set_multi(target, model_path[-1], value)
-
-    def _reset_by_path(self, target, key_path):
-        """Resets a value in the model, does so only for the node at the end
-        of the supplied path"""
-        model_path = self._get_correct_path(target, key_path)
-
-        for key in model_path[:-1]:
-            target = self._get_multi(target, key)
-            if target is None:
-                return
-        self._set_multi(target, model_path[-1], None)
-
-    def _get_by_path(self, source, key_path):
-        """Gets a value from model or dict"""
-        model_path = self._get_correct_path(source, key_path)
-
-        for key in model_path:
-            source = self._get_multi(source, key)
-            if source is None:
-                return None
-        return source
-
-    def _path_to_model(self, key_path) -> tuple[Any, ...]:
-        """As the ORM is now different from the dict structure,
-        this maps the key path to the model"""
-        sub_mapping = MAPPING
-        iterable_path = iter(key_path)
-        for key in iterable_path:
-            result = sub_mapping.get(key)
-            if result is None:
-                return key_path
-            if isinstance(result, tuple):
-                break
-            sub_mapping = result
-        else:  # no break or return encountered
-            raise ValueError("Mapping seems to be invalid")
-
-        return result + tuple(iterable_path)
+            self._table.reset(tuple(key_path), self.model.latest_telemetry)
+            self.model.generation.bump()
 
     def _resend_telemetry_on_timer(self):
         """If sufficient time elapsed, mark all telemetry values to be sent"""
@@ -374,24 +240,18 @@ class TelemetryPasser(metaclass=MCSingleton):
         changes, to update them"""
         with self.lock:
             # Update the active filters
+            active_filters = set()
             state = self.model.state_manager.current_state
             if state not in PRINTING_STATES:
-                self._active_filters.add(Modifier.FILTER_IDLE)
-            elif Modifier.FILTER_IDLE in self._active_filters:
-                self._active_filters.remove(Modifier.FILTER_IDLE)
-
+                active_filters.add(Modifier.FILTER_IDLE)
             if state == State.PRINTING:
-                self._active_filters.add(Modifier.FILTER_PRINTING)
-            elif Modifier.FILTER_PRINTING in self._active_filters:
-                self._active_filters.remove(Modifier.FILTER_PRINTING)
-
+                active_filters.add(Modifier.FILTER_PRINTING)
             if not self.printer.mmu_enabled:
-                self._active_filters.add(Modifier.FILTER_MMU_OFF)
-            elif Modifier.FILTER_MMU_OFF in self._active_filters:
-                self._active_filters.remove(Modifier.FILTER_MMU_OFF)
+                active_filters.add(Modifier.FILTER_MMU_OFF)
+            self._filter_mask = modifier_mask(active_filters)
 
             # Update the telemetry to reflect new filters
-            self.set_telemetry(self._latest_full)
+            self.apply(self._table.full_values())
 
     def activity_observed(self):
         """Call if any activity that constitutes waking up from sleep occurs"""
@@ -406,12 +266,12 @@ class TelemetryPasser(metaclass=MCSingleton):
         fresh telemetry values"""
         with self.lock:
             self.model.latest_telemetry = Telemetry()
-            self._last_sent = {}
-            self._to_send = {}
+            self._table.wipe()
+            self.model.generation.bump()
 
     def resend_latest_telemetry(self):
         """Move the latest telemetry, so it gets sent next time.
         Great for reconnections and other telemetry forgetting situations"""
         with self.lock:
-            self._to_send = self.model.latest_telemetry.dict(exclude_none=True)
+            self._table.resend()
         self.pass_telemetry()
@@ -3,8 +3,9 @@
 from logging import getLogger
 from pathlib import Path
 from time import sleep
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
+from blinker import Signal  # type: ignore
 from gcode_metadata import FDMMetaData
 from prusa.connect.printer import Printer as SDKPrinter
 from prusa.connect.printer import const
@@ -34,6 +35,12 @@ class MyPrinter(SDKPrinter, metaclass=MCSingleton):
     """
 
     def __init__(self, *args, **kwargs):
+        # For the files and folders inotify found gone or moved away,
+        # and the ones that appeared or got written, no matter who did it.
+        # Before the SDK init, which reports the file changes through
+        # event_cb
+        self.file_removed_signal = Signal()  # kwargs: path: str
+        self.file_added_signal = Signal()  # kwargs: path: str
         super().__init__(*args, **kwargs)
         self.lcd_printer = LCDPrinter.get_instance()
         self.keepalive = Keepalive.get_instance()
@@ -170,15 +177,53 @@ class MyPrinter(SDKPrinter, metaclass=MCSingleton):
         super().loop()
 
     def inotify_loop(self):
-        """Inotify_handler in loop."""
+        """Inotify_handler in loop.
+
+        Bumps the model generation when a storage got updated, so the web
+        API does not serve the old free space and file info."""
         prctl_name()
         while self.__inotify_running:
             try:
+                last_updated = self.storage_last_updated()
                 self.inotify_handler()
+                if self.storage_last_updated() != last_updated:
+                    self.model.generation.bump()
                 sleep(0.2)
             except Exception:  # pylint: disable=broad-except
                 log.exception('Unhandled exception')
 
+    def event_cb(self, event: const.Event, source: const.Source,
+                 *args, **kwargs) -> None:
+        """Passes the removals and additions of local files on before
+        sending the event"""
+        if event == const.Event.FILE_CHANGED:
+            old_path = kwargs.get("old_path")
+            new_path = kwargs.get("new_path")
+            if old_path and old_path != new_path:
+                os_path = self.local_os_path(old_path)
+                if os_path is not None:
+                    self.file_removed_signal.send(path=os_path)
+            if new_path and old_path != new_path:
+                os_path = self.local_os_path(new_path)
+                if os_path is not None:
+                    self.file_added_signal.send(path=os_path)
+        super().event_cb(event, source, *args, **kwargs)
+
+    def local_os_path(self, path: str) -> Optional[str]:
+        """Returns the OS path for a Connect path in a local storage,
+        None for the SD card or an unknown storage"""
+        storage_name = path.strip(self.fs.sep).split(self.fs.sep)[0]
+        storage = self.fs.storage_dict.get(storage_name)
+        if storage is None or not storage.use_inotify:
+            return None
+        return self.inotify_handler.get_abs_os_path(path)
+
+    def storage_last_updated(self) -> float:
+        """Returns when was any of the storages updated last"""
+        return max((storage.last_updated
+                    for storage in self.fs.storage_dict.values()),
+                   default=0.0)
+
     def download_loop(self):
         """Handler for download loop"""
         prctl_name()
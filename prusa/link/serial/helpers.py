@@ -1,7 +1,7 @@
 """Contains helper functions, for instruction enqueuing"""
 import re
 from threading import Event
-from typing import Callable, List, Union
+from typing import Callable, List, Optional, Union
 
 from ..const import QUIT_INTERVAL
 from ..serial.instruction import (
@@ -33,7 +33,8 @@ def wait_for_instruction(instruction,
 def enqueue_instruction(queue: SerialQueue,
                         message: str,
                         to_front=False,
-                        to_checksum=False) -> Instruction:
+                        to_checksum=False,
+                        traffic_class: Optional[str] = None) -> Instruction:
     """
     Creates an instruction, which it enqueues right away
     :param queue: the queue to enqueue into
@@ -41,9 +42,11 @@ def enqueue_instruction(queue: SerialQueue,
     :param to_front: Whether the instruction has a higher priority
     :param to_checksum: Whether to number and checksum the instruction (use
     only for print instructions!)
+    :param traffic_class: The scheduler traffic class to send it in
     :return the enqueued instruction
     """
-    instruction = Instruction(message, to_checksum=to_checksum)
+    instruction = Instruction(message, to_checksum=to_checksum,
+                              traffic_class=traffic_class)
     queue.enqueue_one(instruction, to_front=to_front)
     return instruction
 
@@ -54,7 +57,9 @@ def enqueue_matchable(queue: SerialQueue,
                       regexp: re.Pattern,
                       to_front=False,
                       to_checksum=False,
-                      has_to_match=True) -> Union[
+                      has_to_match=True,
+                      traffic_class: Optional[str] = None,
+                      coalesce=False) -> Union[
                                                 MandatoryMatchableInstruction,
                                                 MatchableInstruction]:
     """
@@ -66,17 +71,22 @@ def enqueue_matchable(queue: SerialQueue,
     :param to_front: Whether the instruction has a higher priority
     :param to_checksum: Whether to number and checksum the instruction (use
     only for print instructions!)
+    :param has_to_match: Whether the instruction refuses confirmation
+    without capturing the regexp match
+    :param traffic_class: The scheduler traffic class to send it in
+    :param coalesce: Whether an identical pending instruction can be sent
+    instead (use only for queries!)
     :return the enqueued instruction
     """
     instruction: Union[MandatoryMatchableInstruction, MatchableInstruction]
     if has_to_match:
-        instruction = MandatoryMatchableInstruction(message,
-                                                    capture_matching=regexp,
-                                                    to_checksum=to_checksum)
+        instruction = MandatoryMatchableInstruction(
+            message, capture_matching=regexp, to_checksum=to_checksum,
+            traffic_class=traffic_class, coalesce=coalesce)
     else:
-        instruction = MatchableInstruction(message,
-                                           capture_matching=regexp,
-                                           to_checksum=to_checksum)
+        instruction = MatchableInstruction(
+            message, capture_matching=regexp, to_checksum=to_checksum,
+            traffic_class=traffic_class, coalesce=coalesce)
     queue.enqueue_one(instruction, to_front=to_front)
     return instruction
 
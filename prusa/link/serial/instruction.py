@@ -18,6 +18,8 @@ class Instruction:
                  to_checksum: bool = False,
                  data: Optional[bytes] = None,
                  number: Optional[int] = None,
+                 traffic_class: Optional[str] = None,
+                 coalesce: bool = False,
                  ):
         if message.count("\n") != 0:
             raise RuntimeError("Instructions cannot contain newlines.")
@@ -35,6 +37,16 @@ class Instruction:
         # If we know our number, it is saved here (used by message history)
         self.number = number
 
+        # Which traffic class of the serial queue scheduler to send it in
+        # None lets the scheduler decide
+        self.traffic_class = traffic_class
+
+        # Only queries can be coalesced, an identical pending instruction
+        # gets sent instead of this one. Its output is then shared
+        self.coalesce = coalesce
+        # The instructions coalesced into this one
+        self.followers: List[Instruction] = []
+
         # Event set when the write has been _confirmed by the printer
         self.confirmed_event = Event()
 
@@ -47,6 +59,8 @@ class Instruction:
         # Measuring the time between sending and confirmation will hopefully
         # enable me to determine if the motion planner buffer is full
         self.sent_at: Optional[float] = None
+        # For the enqueue to send latency metric
+        self.enqueued_at: Optional[float] = None
         self.time_to_confirm: Optional[float] = None
 
     def __str__(self):
@@ -64,8 +78,31 @@ class Instruction:
         assert self.sent_at is not None
         self.time_to_confirm = time() - self.sent_at
         self.confirmed_event.set()
+        self._confirm_followers(force)
         return True
 
+    def attach(self, follower: "Instruction"):
+        """
+        Coalesces the follower into this instruction. It gets the output
+        and the confirmation of this one instead of being sent
+        """
+        self.followers.append(follower)
+
+    def _confirm_followers(self, force):
+        """Confirms the coalesced instructions, sharing the output"""
+        for follower in self.followers:
+            follower.share_output(self)
+            follower.sent()
+            follower.confirm(force=force)
+        self.followers.clear()
+
+    def share_output(self, leader: "Instruction"):
+        """
+        Takes the captured output of the instruction this one got coalesced
+        into, this type does not capture anything though
+        """
+        assert leader is not None
+
     def sent(self):
         """
         Sets the instruction sent Event and writes the timestamp,
@@ -167,6 +204,11 @@ class MatchableInstruction(Instruction):
         """Returns the list of all _captured matches"""
         return self._captured
 
+    def share_output(self, leader: "Instruction"):
+        """Shares the list of _captured matches with the leader"""
+        assert isinstance(leader, MatchableInstruction)
+        self._captured = leader.get_matches()
+
 
 class MandatoryMatchableInstruction(MatchableInstruction):
     """
@@ -180,4 +222,4 @@ class MandatoryMatchableInstruction(MatchableInstruction):
                 "Instruction %s did not capture its expected output, "
                 "so it REFUSES to be confirmed!", self.message)
             return False
-        return super().confirm()
+        return super().confirm(force=force)
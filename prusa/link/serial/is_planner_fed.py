@@ -1,6 +1,7 @@
 """
-Contains implementation of the IsPlannerFed class, with HeapName and TimeValue
-classes. Tries to guess, whether the printer planner is full
+Contains implementation of the IsPlannerFed class, with HeapName, TimeValue
+and PercentileEngine classes. Tries to guess, whether the printer planner
+is full
 """
 import logging
 import os
@@ -16,6 +17,7 @@ from ..const import (
     USE_DYNAMIC_THRESHOLD,
 )
 from ..printer_adapter.structures.heap import HeapItem, MaxHeap, MinHeap
+from ..printer_adapter.structures.percentile import BinnedPercentile
 from ..util import ensure_directory, get_clean_path
 
 log = logging.getLogger(__name__)
@@ -27,6 +29,12 @@ class HeapName(Enum):
     LONG_TIMES = "LONG_TIMES"
 
 
+class PercentileEngine(Enum):
+    """Which structure computes the percentile"""
+    HEAPS = "HEAPS"
+    BINS = "BINS"
+
+
 class TimeValue(HeapItem):
     """Time value with info in which queue it currently resides"""
 
@@ -61,9 +69,21 @@ class IsPlannerFed:
     To get rid of the inaccuracies caused by an initially low number of
     measured values, let's use a threshold from a previous run, or a default
     one until the values accumulate.
+
+    The BINS engine computes the percentile with a BinnedPercentile instead.
+    Its resolution is limited to a thousandth of IGNORE_ABOVE, but it does
+    not allocate an object for each value.
     """
 
-    def __init__(self, threshold_path):
+    def __init__(self, threshold_path,
+                 engine: PercentileEngine = PercentileEngine.HEAPS):
+        self.engine = engine
+        self.binned: Optional[BinnedPercentile] = None
+        if engine == PercentileEngine.BINS:
+            self.binned = BinnedPercentile(size=QUEUE_SIZE,
+                                           ratio=HEAP_RATIO,
+                                           max_value=IGNORE_ABOVE)
+
         self.times_queue: Deque[TimeValue] = deque(maxlen=QUEUE_SIZE)
 
         self.threshold_path = get_clean_path(threshold_path)
@@ -87,6 +107,8 @@ class IsPlannerFed:
     @property
     def item_count(self):
         """Return how many time values are contributing to the percentile"""
+        if self.binned is not None:
+            return len(self.binned)
         return len(self.times_queue)
 
     @property
@@ -95,13 +117,14 @@ class IsPlannerFed:
         Depending on the internal state and settings, it returns
         the percentile threshold or the default
         """
-        if self.item_count < self.times_queue.maxlen or \
-                not USE_DYNAMIC_THRESHOLD:
+        if self.item_count < QUEUE_SIZE or not USE_DYNAMIC_THRESHOLD:
             return self.default_threshold
         return self.get_dynamic_threshold()
 
     def get_dynamic_threshold(self):
         """Returns the Nth percentile value. N is fixed in constants"""
+        if self.binned is not None:
+            return self.binned.get()
         if not self.short_times and not self.long_times:
             return float("inf")
         if not self.long_times and self.short_times:
@@ -124,9 +147,12 @@ class IsPlannerFed:
         if value > IGNORE_ABOVE:
             return
 
-        if self.item_count >= self.times_queue.maxlen:
-            self._remove_last()
-        self._add(value)
+        if self.binned is not None:
+            self.binned.add(value)
+        else:
+            if self.item_count >= QUEUE_SIZE:
+                self._remove_last()
+            self._add(value)
 
         self.is_fed = value > self.threshold
 
@@ -209,7 +235,7 @@ class IsPlannerFed:
         Saves the threshold, so when the prusa-link starts up again,
         it doesn't rely on the default threshold anymore
         """
-        if self.item_count >= self.times_queue.maxlen:
+        if self.item_count >= QUEUE_SIZE:
             with open(self.threshold_path, "w",
                       encoding='utf-8') as threshold_file:
                 threshold_file.write(str(self.get_dynamic_threshold()))
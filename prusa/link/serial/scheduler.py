@@ -0,0 +1,234 @@
+"""
+Contains implementation of the Scheduler and the TrafficClass classes
+
+The scheduler decides which of the enqueued instructions gets sent next.
+Every instruction belongs to a named traffic class. The classes with the
+lowest priority number go first, classes with the same priority share the
+order in which their instructions got enqueued, so print gcodes and the
+commands enqueued in between them keep their order.
+
+The lower priority classes get a chance only when there is nothing more
+important, when the planner is fed, or when their oldest instruction waits
+past its deadline. Going ahead of more important traffic because of
+a deadline is limited by the class budget, so polling or LCD messages
+cannot starve the printer planner.
+
+Queries marked to be coalesced are not enqueued again, when an identical
+one is still pending in their class. They get attached to it instead
+and share its output.
+"""
+from collections import deque
+from time import time
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from ..metrics import gauge, histogram
+from .instruction import Instruction
+
+# The traffic class names
+PRINT = "print"
+INTERACTIVE = "interactive"
+POLLING = "polling"
+COSMETIC = "cosmetic"
+
+
+class TrafficClass:
+    """A named queue of instructions with its scheduling rules"""
+
+    def __init__(self, name: str, priority: int,
+                 deadline: Optional[float] = None,
+                 budget: float = 0.0) -> None:
+        """
+        :param name: used to classify instructions and in the metrics
+        :param priority: lower goes first
+        :param deadline: after how many seconds of waiting can the oldest
+            instruction go ahead of the more important traffic
+        :param budget: how many instructions per second can go ahead of
+            the more important traffic because of the deadline
+        """
+        self.name = name
+        self.priority = priority
+        self.deadline = deadline
+        self.budget = budget
+
+        # Instructions with their enqueue sequence numbers, oldest first
+        self.queue: Deque[Tuple[int, Instruction]] = deque()
+        self.tokens = 1.0
+        self.refilled_at = time()
+        self.wait_histogram = histogram(f"serial_wait_{name}")
+
+    def __len__(self) -> int:
+        return len(self.queue)
+
+    def __repr__(self) -> str:
+        return f"TrafficClass {self.name} with {len(self.queue)} waiting"
+
+    def is_overdue(self, now: float) -> bool:
+        """Whether the oldest instruction can go ahead of the others"""
+        if self.deadline is None or not self.queue:
+            return False
+        enqueued_at = self.queue[0][1].enqueued_at
+        if enqueued_at is None or now - enqueued_at < self.deadline:
+            return False
+        # Refill the budget, allowing a burst of at most one
+        self.tokens = min(1.0, self.tokens +
+                          (now - self.refilled_at) * self.budget)
+        self.refilled_at = now
+        return self.tokens >= 1
+
+    def spend(self) -> None:
+        """Takes from the budget for going ahead of the others"""
+        self.tokens -= 1
+
+
+def default_traffic_classes() -> List[TrafficClass]:
+    """Returns new instances of the default traffic classes"""
+    return [
+        TrafficClass(PRINT, priority=0),
+        # User actions and the time critical commands
+        TrafficClass(INTERACTIVE, priority=0),
+        # Telemetry and state queries
+        TrafficClass(POLLING, priority=1, deadline=5, budget=1),
+        # LCD messages and beeps
+        TrafficClass(COSMETIC, priority=2, deadline=10, budget=0.2),
+    ]
+
+
+class Scheduler:
+    """
+    Keeps the enqueued instructions sorted into traffic classes
+    and picks which one to send next
+    """
+
+    def __init__(self, may_yield: Callable[[], bool],
+                 yielded: Callable[[], None],
+                 traffic_classes: Optional[List[TrafficClass]] = None):
+        """
+        :param may_yield: returns True if the most important traffic can
+            let one less important instruction through
+        :param yielded: called after it did that
+        :param traffic_classes: the classes to schedule, need to include
+            the ones with the default names
+        """
+        self.may_yield = may_yield
+        self.yielded = yielded
+        if traffic_classes is None:
+            traffic_classes = default_traffic_classes()
+        self.traffic_classes: Dict[str, TrafficClass] = {
+            traffic_class.name: traffic_class
+            for traffic_class in traffic_classes}
+        # Stable sort, the class order breaks priority ties
+        self.ordered = sorted(traffic_classes,
+                              key=lambda traffic_class: traffic_class.priority)
+        self.sequence = 0
+        # How many instructions got attached to identical pending ones
+        self.coalesced = 0
+        # The peeked choice, so the pop takes the same instruction
+        self.chosen: Optional[Tuple[TrafficClass, str]] = None
+
+        for traffic_class in traffic_classes:
+            gauge(f"serial_queued_{traffic_class.name}",
+                  traffic_class.__len__)
+        gauge("serial_coalesced_instructions", lambda: self.coalesced)
+
+    def __len__(self) -> int:
+        return sum(len(traffic_class) for traffic_class in self.ordered)
+
+    def classify(self, instruction: Instruction,
+                 to_front: bool = False) -> TrafficClass:
+        """
+        Returns the traffic class of the instruction, if it does not have
+        one set, the old style to_front flag decides
+        """
+        name = instruction.traffic_class
+        if name is None:
+            if to_front:
+                name = PRINT if instruction.to_checksum else INTERACTIVE
+            else:
+                name = POLLING
+        try:
+            return self.traffic_classes[name]
+        except KeyError as exception:
+            raise ValueError(f"Unknown traffic class {name}") from exception
+
+    def add(self, instruction: Instruction, to_front: bool = False) -> None:
+        """Puts the instruction into its traffic class"""
+        traffic_class = self.classify(instruction, to_front)
+        if self._coalesce(instruction, traffic_class):
+            return
+        self.sequence += 1
+        traffic_class.queue.append((self.sequence, instruction))
+        self.chosen = None
+
+    def _coalesce(self, instruction: Instruction,
+                  traffic_class: TrafficClass) -> bool:
+        """Attaches the instruction to an identical pending one, if any
+        :return: whether it got attached"""
+        if not instruction.coalesce:
+            return False
+        for _, pending in traffic_class.queue:
+            if (pending.coalesce
+                    and type(pending) is type(instruction)
+                    and pending.message == instruction.message
+                    and pending.capturing_regexps ==
+                    instruction.capturing_regexps):
+                pending.attach(instruction)
+                self.coalesced += 1
+                return True
+        return False
+
+    def remove(self, predicate: Callable[[Instruction], bool]) -> None:
+        """Removes all instructions for which the predicate is True"""
+        for traffic_class in self.ordered:
+            traffic_class.queue = deque(
+                item for item in traffic_class.queue
+                if not predicate(item[1]))
+        self.chosen = None
+
+    def _choose(self) -> Optional[Tuple[TrafficClass, str]]:
+        """
+        Picks the class to send from and the reason for it
+        :return: the class and one of "deadline", "yield" or "order"
+        """
+        waiting = [traffic_class for traffic_class in self.ordered
+                   if traffic_class.queue]
+        if not waiting:
+            return None
+        top = waiting[0].priority
+        less_important = [traffic_class for traffic_class in waiting
+                          if traffic_class.priority > top]
+        if less_important:
+            now = time()
+            for traffic_class in less_important:
+                if traffic_class.is_overdue(now):
+                    return traffic_class, "deadline"
+            if self.may_yield():
+                return less_important[0], "yield"
+        oldest = min((traffic_class for traffic_class in waiting
+                      if traffic_class.priority == top),
+                     key=lambda traffic_class: traffic_class.queue[0][0])
+        return oldest, "order"
+
+    def peek(self) -> Optional[Instruction]:
+        """Returns the instruction that is going to be popped next"""
+        if self.chosen is None:
+            self.chosen = self._choose()
+        if self.chosen is None:
+            return None
+        return self.chosen[0].queue[0][1]
+
+    def pop(self) -> Optional[Instruction]:
+        """Takes the next instruction to send, None if there is none"""
+        if self.peek() is None:
+            return None
+        traffic_class, reason = self.chosen
+        self.chosen = None
+        if reason == "deadline":
+            traffic_class.spend()
+        elif reason == "yield":
+            self.yielded()
+
+        _, instruction = traffic_class.queue.popleft()
+        if instruction.enqueued_at is not None:
+            traffic_class.wait_histogram.record(
+                time() - instruction.enqueued_at)
+        return instruction
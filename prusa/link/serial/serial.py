@@ -8,10 +8,15 @@ import termios
 from select import select
 from time import time
 from types import MappingProxyType
+from typing import List, Optional
 
 TIOCM_DTR_str = struct.pack('I', termios.TIOCM_DTR)
 TIOCM_RTS_str = struct.pack('I', termios.TIOCM_RTS)
 
+READ_SIZE = 4096
+# Consumed bytes at the buffer start get discarded once there's this many
+COMPACT_THRESHOLD = 16384
+
 
 class SerialException(RuntimeError):
     """Own exception type."""
@@ -89,7 +94,11 @@ class Serial:
             else:
                 raise
 
-        self.__buffer = b''
+        # Received data, lines get consumed from the start index
+        # the part up to the scanned index is known to contain no newline
+        self.__buffer = bytearray()
+        self.__start = 0
+        self.__scanned = 0
 
         self.__dtr = False
 
@@ -109,7 +118,7 @@ class Serial:
         try:
             ready = select([self.fd], [], [], timeout)
             if ready[0] and self.fd:
-                read_bytes = os.read(self.fd, 1024)
+                read_bytes = os.read(self.fd, READ_SIZE)
                 if not read_bytes:
                     raise SerialException("The serial became disconnected.")
                 self.__buffer += read_bytes
@@ -117,26 +126,51 @@ class Serial:
             self.close()
             raise SerialException(f"read failed: {err}") from err
 
-    def readline(self):
-        """Return next line from local buffer or from serial port."""
+    def __pop_lines(self, limit: Optional[int] = None) -> List[bytes]:
+        """Takes up to limit complete lines out of the local buffer"""
+        buffer = self.__buffer
+        lines: List[bytes] = []
+        with memoryview(buffer) as view:
+            while limit is None or len(lines) < limit:
+                pos = buffer.find(b'\n', self.__scanned)
+                if pos < 0:
+                    self.__scanned = len(buffer)
+                    break
+                lines.append(bytes(view[self.__start:pos + 1]))
+                self.__start = self.__scanned = pos + 1
+
+        if self.__start == len(buffer):
+            buffer.clear()
+            self.__start = self.__scanned = 0
+        elif self.__start >= COMPACT_THRESHOLD:
+            del buffer[:self.__start]
+            self.__scanned -= self.__start
+            self.__start = 0
+        return lines
+
+    def __wait_for_lines(self, limit: Optional[int] = None) -> List[bytes]:
+        """Reads until there is at least one complete line or until
+        the timeout runs out"""
         times_out_at = time() + self.timeout
-        start_at = 0
 
         while True:
             current_time = time()
-            pos = self.__buffer.find(b'\n', start_at)
-            if pos >= 0:
-                line = self.__buffer[:pos + 1]
-                self.__buffer = self.__buffer[pos + 1:]
-                return line
-
-            start_at = max(0, len(self.__buffer) - 1)
-            if current_time >= times_out_at:
-                break
+            lines = self.__pop_lines(limit)
+            if lines or current_time >= times_out_at:
+                return lines
 
             self.__read(times_out_at - current_time)
 
-        return b''
+    def readline(self):
+        """Return next line from local buffer or from serial port."""
+        lines = self.__wait_for_lines(limit=1)
+        return lines[0] if lines else b''
+
+    def readlines(self) -> List[bytes]:
+        """Return all complete lines from local buffer, if there are none,
+        waits for them to come from the serial port.
+        Returns an empty list on timeout"""
+        return self.__wait_for_lines()
 
     def write(self, data: bytes):
         """Write data to serial port."""
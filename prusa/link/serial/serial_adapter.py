@@ -21,6 +21,7 @@ from ..const import (
     RESET_PIN,
     SERIAL_REOPEN_TIMEOUT,
 )
+from ..metrics import READ_TO_DISPATCH
 from ..printer_adapter.model import Model
 from ..printer_adapter.structures.mc_singleton import MCSingleton
 from ..printer_adapter.structures.module_data_classes import (
@@ -300,32 +301,43 @@ class SerialAdapter(metaclass=MCSingleton):
         self._renew_serial_connection(starting=True)
 
         while self.running:
-            raw_line = "[No data] - This is a fallback value, " \
-                       "so stuff doesn't break"
             try:
                 if not self._work_around_power_panic.is_set():
                     raise SerialException(
                         "Need to re-connect serial after power panic")
-                raw_line = self.serial.readline()
-                line = decode_line(raw_line)
+                # Everything that came in one read gets handled in one go
+                raw_lines = self.serial.readlines()
+                read_at = time()
             except (SerialException, OSError):
+                if not self.running:
+                    # Stopping closed the port under the read
+                    break
                 log.exception("Failed when reading from the printer. "
                               "Trying to re-open")
                 self.close()
                 self._renew_serial_connection()
-            except UnicodeDecodeError:
-                log.error("Failed decoding a message %s", raw_line)
             else:
-                # with self.write_read_lock:
-                # Why would I not want to write and handle reads
-                # at the same time? IDK, but if something weird starts
-                # happening, i'll re-enable this
-                if line == "":
-                    log.debug("Printer has most likely sent something, "
-                              "which is not human readable")
-                else:
-                    log.debug("Recv: %s", line)
-                self.serial_parser.decide(line)
+                for raw_line in raw_lines:
+                    self._dispatch(raw_line, read_at)
+
+    def _dispatch(self, raw_line: bytes, read_at: float):
+        """Decodes a received line and hands it over to the parser"""
+        try:
+            line = decode_line(raw_line)
+        except UnicodeDecodeError:
+            log.error("Failed decoding a message %s", raw_line)
+            return
+        # with self.write_read_lock:
+        # Why would I not want to write and handle reads
+        # at the same time? IDK, but if something weird starts
+        # happening, i'll re-enable this
+        if line == "":
+            log.debug("Printer has most likely sent something, "
+                      "which is not human readable")
+        else:
+            log.debug("Recv: %s", line)
+        self.serial_parser.decide(line)
+        READ_TO_DISPATCH.record(time() - read_at)
 
     def write(self, message: bytes):
         """
@@ -6,21 +6,142 @@ have which handlers
 As of writing this doc, the "ok" has infinite priority, then every instruction
 handler has the current time as the priority, meaning later added handlers are
 evaluated first.
+
+To not try every regexp on every line, the pairings are also sorted into
+buckets by the first character their regexps can match. Looking up the first
+character of a line then gives only the pairings that can possibly match it,
+still ordered by their priorities.
 """
 import logging
 import re
-from functools import partial
+from functools import lru_cache, partial
 from queue import Queue
 from threading import Lock, Thread
-from typing import Any, Callable, Dict, Match, Optional, Union
+from time import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    List,
+    Match,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 from blinker import Signal  # type: ignore
 from sortedcontainers import SortedKeyList  # type: ignore
 
+from ..const import DECOUPLED_WORKERS
+from ..metrics import DECOUPLED_WAIT, gauge
 from ..printer_adapter.structures.mc_singleton import MCSingleton
 
+try:
+    from re import _parser as sre_parse  # type: ignore
+except ImportError:  # Python < 3.11
+    import sre_parse  # type: ignore # pylint: disable=deprecated-module
+
 log = logging.getLogger(__name__)
 
+# Character classes with more characters than this are not worth bucketing
+MAX_CLASS_SIZE = 64
+# Decoupled handlers without their own key share this one
+DEFAULT_DECOUPLED_KEY = "default"
+
+
+def _class_chars(items) -> Optional[Set[str]]:
+    """Returns the characters of a parsed [character class] or None if
+    there are too many, or they are not known"""
+    chars = set()
+    for opcode, argument in items:
+        if opcode.name == "LITERAL":
+            chars.add(chr(argument))
+        elif opcode.name == "RANGE":
+            low, high = argument
+            if high - low > MAX_CLASS_SIZE:
+                return None
+            chars.update(chr(code) for code in range(low, high + 1))
+        else:
+            return None
+    return chars
+
+
+def _first_chars(parsed) -> Tuple[Optional[Set[str]], bool]:
+    """
+    Walks a parsed regexp looking for the characters it can start with
+    :return: A set of the characters or None if any character can be first
+    and whether the walked part can match an empty string
+    """
+    chars: Set[str] = set()
+    for opcode, argument in parsed:
+        name = opcode.name
+        if name == "AT":
+            continue
+        if name == "LITERAL":
+            chars.add(chr(argument))
+            return chars, False
+        if name == "IN":
+            class_chars = _class_chars(argument)
+            if class_chars is None:
+                return None, False
+            return chars | class_chars, False
+
+        if name == "SUBPATTERN":
+            _, add_flags, del_flags, sub_parsed = argument
+            if add_flags or del_flags:
+                return None, False
+            sub_chars, nullable = _first_chars(sub_parsed)
+        elif name == "ATOMIC_GROUP":
+            sub_chars, nullable = _first_chars(argument)
+        elif name == "BRANCH":
+            sub_chars, nullable = set(), False
+            for branch in argument[1]:
+                branch_chars, branch_nullable = _first_chars(branch)
+                if branch_chars is None:
+                    return None, False
+                sub_chars |= branch_chars
+                nullable = nullable or branch_nullable
+        elif name in {"MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT"}:
+            minimum, _, sub_parsed = argument
+            sub_chars, nullable = _first_chars(sub_parsed)
+            nullable = nullable or minimum == 0
+        else:
+            return None, False
+
+        if sub_chars is None:
+            return None, False
+        chars |= sub_chars
+        if not nullable:
+            return chars, False
+    return chars, True
+
+
+@lru_cache(maxsize=256)
+def first_chars(regexp: re.Pattern) -> Optional[FrozenSet[str]]:
+    """
+    Figures out which characters can a string matched by the regexp start
+    with. Returns None if it's any character, or it cannot be figured out.
+    """
+    if not isinstance(regexp.pattern, str) or regexp.flags & re.IGNORECASE:
+        return None
+    try:
+        chars, nullable = _first_chars(
+            sre_parse.parse(regexp.pattern, regexp.flags))
+    except Exception:  # pylint: disable=broad-except
+        log.debug("Could not analyze %s, it will be tried on every line",
+                  regexp.pattern)
+        return None
+    if chars is None or nullable:
+        return None
+    return frozenset(chars)
+
+
+def _pairing_key(pairing):
+    """Sorts the pairings from the highest priority"""
+    return -pairing.priority
+
 
 class RegexPairing:
     """
@@ -57,6 +178,51 @@ class RegexPairing:
                           "Caught to stay alive.")
 
 
+class DispatchTable:
+    """
+    Keeps the pairings sorted by priority in buckets by the first character
+    their regexps can match. Pairings, for which the first character cannot
+    be determined, are in every bucket. Kept up to date on every change
+    instead of being rebuilt.
+    """
+
+    def __init__(self) -> None:
+        self.wildcard = SortedKeyList(key=_pairing_key)
+        self.buckets: Dict[str, SortedKeyList] = {}
+        self.pairing_chars: Dict[RegexPairing, Optional[FrozenSet[str]]] = {}
+
+    def candidates(self, line: str) -> SortedKeyList:
+        """Returns the pairings that can match the line, by priority"""
+        return self.buckets.get(line[:1], self.wildcard)
+
+    def add(self, pairing: RegexPairing) -> None:
+        """Puts the pairing into all buckets it can match in"""
+        chars = first_chars(pairing.regexp)
+        self.pairing_chars[pairing] = chars
+        if chars is None:
+            self.wildcard.add(pairing)
+            for bucket in self.buckets.values():
+                bucket.add(pairing)
+            return
+        for char in chars:
+            if char not in self.buckets:
+                # A stable sort, so the equal priority order is kept
+                self.buckets[char] = SortedKeyList(self.wildcard,
+                                                   key=_pairing_key)
+            self.buckets[char].add(pairing)
+
+    def remove(self, pairing: RegexPairing) -> None:
+        """Removes the pairing from all the buckets it's in"""
+        chars = self.pairing_chars.pop(pairing)
+        if chars is None:
+            self.wildcard.remove(pairing)
+            for bucket in self.buckets.values():
+                bucket.remove(pairing)
+            return
+        for char in chars:
+            self.buckets[char].remove(pairing)
+
+
 class SerialParser(metaclass=MCSingleton):
     """
     Its job is to try and find an appropriate handler for every line that
@@ -65,8 +231,19 @@ class SerialParser(metaclass=MCSingleton):
 
     def __init__(self) -> None:
         self.lock = Lock()
-        self.pattern_list = SortedKeyList(key=lambda item: -item.priority)
+        self.pattern_list = SortedKeyList(key=_pairing_key)
         self.pairing_dict: Dict[re.Pattern, RegexPairing] = {}
+        self.dispatch_table = DispatchTable()
+
+    def _add_pairing(self, pairing: RegexPairing) -> None:
+        """Adds the pairing to the list and the dispatch table"""
+        self.pattern_list.add(pairing)
+        self.dispatch_table.add(pairing)
+
+    def _remove_pairing(self, pairing: RegexPairing) -> None:
+        """Removes the pairing from the list and the dispatch table"""
+        self.pattern_list.remove(pairing)
+        self.dispatch_table.remove(pairing)
 
     def decide(self, line: str) -> None:
         """
@@ -76,7 +253,7 @@ class SerialParser(metaclass=MCSingleton):
         chosen_pairing = None
 
         with self.lock:
-            for pairing in self.pattern_list:
+            for pairing in self.dispatch_table.candidates(line):
                 match = pairing.regexp.match(line)
                 if match:
                     chosen_pairing = pairing
@@ -109,9 +286,9 @@ class SerialParser(metaclass=MCSingleton):
                     log.debug("%s is not in %s. What?!", existing_pairing,
                               self.pattern_list)
                 if priority > existing_pairing.priority:
-                    self.pattern_list.remove(existing_pairing)
+                    self._remove_pairing(existing_pairing)
                     existing_pairing.priority = priority
-                    self.pattern_list.add(existing_pairing)
+                    self._add_pairing(existing_pairing)
                     log.debug("Priority updated from %s to %s",
                               existing_pairing.priority, priority)
                 existing_pairing.signal.connect(handler, weak=False)
@@ -121,7 +298,7 @@ class SerialParser(metaclass=MCSingleton):
                 new_pairing.signal.connect(handler, weak=False)
 
                 self.pairing_dict[regexp] = new_pairing
-                self.pattern_list.add(new_pairing)
+                self._add_pairing(new_pairing)
 
     def remove_handler(self, regexp, handler) -> None:
         """
@@ -135,53 +312,149 @@ class SerialParser(metaclass=MCSingleton):
                 pairing.signal.disconnect(handler)
                 if not pairing.signal.receivers:
                     del self.pairing_dict[regexp]
-                    self.pattern_list.remove(pairing)
+                    self._remove_pairing(pairing)
             else:
                 raise RuntimeError(f"There is no handler registered for "
                                    f"{regexp.pattern}")
 
 
+class CoalescingMailbox:
+    """
+    Holds just the newest match for a decoupled handler. Only the first
+    match is put into the handler queue, the ones coming in before it gets
+    handled replace the pending one. A backlog of frequent reports then
+    collapses into a single handler call with the latest values.
+    """
+
+    def __init__(self, handler: Callable[[Any, re.Match], None],
+                 handler_queue: Queue) -> None:
+        self.handler = handler
+        self.handler_queue = handler_queue
+        self.lock = Lock()
+        self.pending: Optional[Tuple[Any, re.Match]] = None
+        self.coalesced = 0
+
+    def __call__(self, sender, match):
+        """Replaces the pending match, enqueues only if there was none"""
+        with self.lock:
+            scheduled = self.pending is not None
+            self.pending = (sender, match)
+            if scheduled:
+                self.coalesced += 1
+        if not scheduled:
+            self.handler_queue.put((time(), self.run))
+
+    def run(self):
+        """Calls the handler with the newest match"""
+        with self.lock:
+            if self.pending is None:
+                return
+            sender, match = self.pending
+            self.pending = None
+        self.handler(sender, match=match)
+
+
 class ThreadedSerialParser(SerialParser):
     """Implements a way to de-couple serial reader from the rest
-    of the app while allowing serial queue to remain coupled"""
+    of the app while allowing serial queue to remain coupled
+
+    The decoupled handlers run on a small pool of worker threads.
+    Each handler has an ordering key, handlers with the same key always
+    run on the same worker in the order their lines came in. Handlers
+    with different keys can run in parallel
 
-    def __init__(self):
+    Coalescing handlers get only the newest of their matches waiting
+    to be handled, the older ones are dropped"""
+
+    def __init__(self, workers: int = DECOUPLED_WORKERS):
         super().__init__()
-        self.handler_queue = Queue()
+        self.handler_queues: List[Queue] = [Queue() for _ in range(workers)]
+        # Keys get spread over the workers in the order they show up
+        self.key_queues: Dict[str, Queue] = {}
+        self.mailboxes: List[CoalescingMailbox] = []
         self.running = False
-        self.thread = Thread(target=self.process,
-                             name="serial_decoupler",
-                             daemon=True)
+        self.threads = [
+            Thread(target=self.process,
+                   args=(handler_queue,),
+                   name="serial_decoupler" + (str(number) if number else ""),
+                   daemon=True)
+            for number, handler_queue in enumerate(self.handler_queues)]
         self.running = True
-        self.thread.start()
+        for thread in self.threads:
+            thread.start()
+
+        gauge("serial_decoupled_queue_depth", lambda: self.queue_depth)
+        gauge("serial_coalesced_lines", lambda: self.coalesced_lines)
 
-    def decoupled(self, handler):
+    def _queue_for(self, key: str) -> Queue:
+        """Returns the handler queue of the worker assigned to the key"""
+        with self.lock:
+            if key not in self.key_queues:
+                self.key_queues[key] = self.handler_queues[
+                    len(self.key_queues) % len(self.handler_queues)]
+            return self.key_queues[key]
+
+    def decoupled(self, handler, key: str = DEFAULT_DECOUPLED_KEY):
         """A function generator decoupling the caller thread by enqueuing
         instead of calling the provided handler with its call arguments"""
+        handler_queue = self._queue_for(key)
+
         def inner(sender, match):
-            self.handler_queue.put(partial(handler, sender, match=match))
+            handler_queue.put(
+                (time(), partial(handler, sender, match=match)))
         return inner
 
-    def process(self):
-        """Processes the handler as a new thread"""
+    def coalescing(self, handler, key: str = DEFAULT_DECOUPLED_KEY):
+        """Like decoupled, but keeps only the newest match pending"""
+        mailbox = CoalescingMailbox(handler, self._queue_for(key))
+        with self.lock:
+            self.mailboxes.append(mailbox)
+        return mailbox
+
+    def process(self, handler_queue: Queue):
+        """Processes the handlers as a new thread"""
         while self.running:
-            handler = self.handler_queue.get(block=True)
+            enqueued_at, handler = handler_queue.get(block=True)
+            DECOUPLED_WAIT.record(time() - enqueued_at)
             if handler is not None:
                 handler()
 
+    @property
+    def queue_depth(self) -> int:
+        """How many decoupled handlers are waiting to be run"""
+        return sum(handler_queue.qsize()
+                   for handler_queue in self.handler_queues)
+
+    @property
+    def coalesced_lines(self) -> int:
+        """How many matches got replaced by newer ones before handling"""
+        return sum(mailbox.coalesced for mailbox in self.mailboxes)
+
     def add_decoupled_handler(self,
                               regexp: re.Pattern,
                               handler: Callable[[Any, re.Match], None],
-                              priority: float = 0) -> None:
-        """Converts given handler, so it does not block the caller"""
-        self.add_handler(regexp, self.decoupled(handler), priority)
+                              priority: float = 0,
+                              key: str = DEFAULT_DECOUPLED_KEY,
+                              coalesce: bool = False) -> None:
+        """Converts given handler, so it does not block the caller
+        :param key: handlers sharing the key are run one after another,
+        in the order of their lines
+        :param coalesce: if the handler is behind, call it only with
+        the newest match. For reports, where only the latest value matters
+        """
+        if coalesce:
+            wrapped = self.coalescing(handler, key)
+        else:
+            wrapped = self.decoupled(handler, key)
+        self.add_handler(regexp, wrapped, priority)
 
     def stop(self):
         """Signals a stop to the decoupler"""
         self.running = False
-        self.handler_queue.put(lambda: None)
+        for handler_queue in self.handler_queues:
+            handler_queue.put((time(), lambda: None))
 
     def wait_stopped(self):
         """Waits until the decoupler is fully stopped"""
-        if self.thread:
-            self.thread.join()
+        for thread in self.threads:
+            thread.join()
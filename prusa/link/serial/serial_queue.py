@@ -10,7 +10,7 @@ import re
 from collections import deque
 from threading import Event, Lock
 from time import time
-from typing import Deque, List, Optional
+from typing import Callable, Deque, List, Optional, Sequence
 
 from blinker import Signal  # type: ignore
 from prusa.connect.printer.conditions import CondState
@@ -25,6 +25,7 @@ from ..const import (
     SERIAL_QUEUE_TIMEOUT,
 )
 from ..interesting_logger import InterestingLogRotator
+from ..metrics import ENQUEUE_TO_SEND, SEND_TO_OK
 from ..printer_adapter.structures.mc_singleton import MCSingleton
 from ..printer_adapter.structures.regular_expressions import (
     ATTENTION_REGEX,
@@ -37,8 +38,9 @@ from ..printer_adapter.structures.regular_expressions import (
 )
 from ..printer_adapter.updatable import Thread
 from ..util import loop_until, prctl_name
-from .instruction import Instruction, MatchableInstruction
+from .instruction import Instruction
 from .is_planner_fed import IsPlannerFed
+from .scheduler import Scheduler, TrafficClass
 from .serial import SerialException
 from .serial_adapter import SerialAdapter
 from .serial_parser import ThreadedSerialParser
@@ -60,7 +62,9 @@ class SerialQueue(metaclass=MCSingleton):
                  serial_adapter: SerialAdapter,
                  serial_parser: ThreadedSerialParser,
                  threshold_path: str,
-                 rx_size=RX_SIZE):
+                 rx_size=RX_SIZE,
+                 pipeline_depth=1,
+                 traffic_classes: Optional[List[TrafficClass]] = None):
         self.serial_adapter = serial_adapter
         self.serial_parser = serial_parser
 
@@ -70,18 +74,26 @@ class SerialQueue(metaclass=MCSingleton):
         self.instruction_confirmed_signal = Signal()
         self.message_number_changed = Signal()
 
-        # A queue of instructions for the printer
-        self.queue: Deque[Instruction] = deque()
-
-        # This one shall contain time critical instructions
-        self.priority_queue: Deque[Instruction] = deque()
-
         # Instruction that is currently being handled
         self.current_instruction: Optional[Instruction] = None
 
         # Maximum bytes we'll write
         self.rx_max = rx_size
 
+        # How many print instructions can be sent without waiting for
+        # their confirmation. One disables the pipelining
+        self.pipeline_depth = max(1, pipeline_depth)
+        # Sent print instructions waiting to be confirmed, oldest first
+        self.in_flight: Deque[Instruction] = deque()
+        self.in_flight_size = 0
+        self.last_confirmed_at = time()
+
+        # After a resend request, the pipelined instructions sent before
+        # it get rejected too. Ignore those requests and their oks
+        self.stray_oks = 0
+        self.stray_resends = 0
+        self.resend_from: Optional[int] = None
+
         # Make it possible to enqueue multiple consecutive instructions
         self.write_lock = Lock()
 
@@ -119,6 +131,11 @@ class SerialQueue(metaclass=MCSingleton):
 
         self.is_planner_fed = IsPlannerFed(threshold_path)
 
+        # The queued instructions for the printer sorted by traffic class
+        self.scheduler = Scheduler(self.is_planner_fed,
+                                   self._planner_fed_used,
+                                   traffic_classes)
+
         self.quit_evt = Event()
         self.send_event = Event()
         self.sender_thread = Thread(name="sq_sender",
@@ -128,20 +145,18 @@ class SerialQueue(metaclass=MCSingleton):
         self.sender_thread.start()
 
     def _keep_sending(self):
-        """Send the most important instruction when asked nicely"""
+        """Send the most important instructions when asked nicely,
+        as many as the pipeline allows, so one nudge fills it"""
         prctl_name()
         while True:
             self.send_event.wait()
             if self.quit_evt.is_set():
                 break
             self.send_event.clear()
-            if self._block_sending:
-                continue
             with self.write_lock:
-                if not self.can_write():
-                    continue
                 try:
-                    self._send()
+                    while not self._block_sending and self.can_write():
+                        self._send()
                 except (SerialException, OSError):
                     log.info("A serial write has failed, expecting serial "
                              "reader to fix the problem. In the meantime "
@@ -183,13 +198,34 @@ class SerialQueue(metaclass=MCSingleton):
             return self.rx_yeet_slot
         if self.recovery_list:
             return self.recovery_list[-1]
-        if self.priority_queue:
-            if self.is_planner_fed() and self.queue:
-                return self.queue[-1]
-            return self.priority_queue[-1]
-        if self.queue:
-            return self.queue[-1]
-        return None
+        return self.scheduler.peek()
+
+    def _planner_fed_used(self):
+        """Invalidate, so the unimportant traffic doesn't go all at once"""
+        self.is_planner_fed.is_fed = False
+        log.debug("Allowing a non-important instruction through")
+
+    def _is_pipelinable(self, instruction: Instruction):
+        """Only check-summed instructions not capturing output can be sent
+        without waiting for the previous ones to be confirmed"""
+        return (self.pipeline_depth > 1 and instruction.to_checksum
+                and not instruction.capturing_regexps)
+
+    def _fits_pipeline(self, instruction: Instruction):
+        """Determines whether the instruction can be sent while the
+        in flight ones are not confirmed yet, so the printer RX buffer
+        cannot overflow"""
+        if not self._is_pipelinable(instruction):
+            return False
+        if len(self.in_flight) >= self.pipeline_depth:
+            return False
+        if instruction.data is not None:
+            size = len(instruction.data)
+        else:
+            # "N<number> <message> *<checksum>\n"
+            size = len(instruction.message) + \
+                   len(str(self.message_number + 1)) + 8
+        return self.in_flight_size + size <= self.rx_max
 
     def _next_instruction(self):
         """
@@ -208,28 +244,21 @@ class SerialQueue(metaclass=MCSingleton):
             self.rx_yeet_slot = None
         elif self.recovery_list:
             self.current_instruction = self.recovery_list.pop()
-        elif self.priority_queue:
-            if self.is_planner_fed() and self.queue:
-                # Invalidate, so the unimportant queue doesn't go all at once
-                self.is_planner_fed.is_fed = False
-                log.debug("Allowing a non-important instruction through")
-                self.current_instruction = self.queue.pop()
-            else:
-                self.current_instruction = self.priority_queue.pop()
-        elif self.queue:
-            self.current_instruction = self.queue.pop()
+        else:
+            self.current_instruction = self.scheduler.pop()
 
     # --- If statements in methods ---
     def can_write(self):
         """Determines whether we're in a state suitable for writing"""
-        return self.current_instruction is None and not self.is_empty() and \
-            not self.closed
+        if self.current_instruction is not None or self.is_empty() or \
+                self.closed:
+            return False
+        return not self.in_flight or self._fits_pipeline(self.peek_next())
 
     def is_empty(self):
         """Determines whether all queues and slots for writing are empty"""
-        return not self.queue and not self.priority_queue and \
-            not self.recovery_list and self.rx_yeet_slot is None\
-            and self.m110_workaround_slot is None
+        return not self.scheduler and not self.recovery_list and \
+            self.rx_yeet_slot is None and self.m110_workaround_slot is None
 
     # --- Actual methods ---
 
@@ -298,13 +327,23 @@ class SerialQueue(metaclass=MCSingleton):
                 instruction.data.decode('ASCII'), size, self.rx_max)
 
         self._hookup_output_capture()
-        self.current_instruction.sent()
+        instruction.sent()
+        if instruction.enqueued_at is not None:
+            ENQUEUE_TO_SEND.record(instruction.sent_at -
+                                   instruction.enqueued_at)
+            # Do not count the re-sends
+            instruction.enqueued_at = None
+
+        if self._is_pipelinable(instruction):
+            self.in_flight.append(instruction)
+            self.in_flight_size += len(instruction.data)
+            self.current_instruction = None
 
         # Send the message number only after the instruction is sent
         if m110_match:
             self.message_number_changed.send(self.message_number)
 
-        self.serial_adapter.write(self.current_instruction.data)
+        self.serial_adapter.write(instruction.data)
 
     def set_message_number(self, number):
         """Sets the message number to the given value
@@ -324,10 +363,8 @@ class SerialQueue(metaclass=MCSingleton):
 
     def _enqueue(self, instruction: Instruction, to_front=False):
         """Internal method for enqueuing when already locked"""
-        if to_front:
-            self.priority_queue.appendleft(instruction)
-        else:
-            self.queue.appendleft(instruction)
+        instruction.enqueued_at = time()
+        self.scheduler.add(instruction, to_front)
 
     def enqueue_one(self, instruction: Instruction, to_front=False):
         """
@@ -346,11 +383,12 @@ class SerialQueue(metaclass=MCSingleton):
         self._try_writing()
 
     def enqueue_list(self,
-                     instruction_list: List[MatchableInstruction],
+                     instruction_list: Sequence[Instruction],
                      to_front=False):
         """
         Enqueue list of instructions
         Don't interrupt, if anyone else is enqueueing instructions
+        The sender gets woken up just once for the whole list
         :param instruction_list: the list to enqueue
         :param to_front: whether to enqueue to front of the queue
         """
@@ -364,12 +402,39 @@ class SerialQueue(metaclass=MCSingleton):
 
         self._try_writing()
 
+    @staticmethod
+    def wait_for_confirmations(pending: Deque[Instruction],
+                               depth: int,
+                               should_wait: Callable[[], bool]) -> bool:
+        """
+        Backpressure for the producers of many instructions
+        Drops the confirmed instructions off the start of pending
+        and waits until less than depth of them stay unconfirmed
+        :param pending: the producer's instructions, oldest first
+        :param depth: how many unconfirmed instructions are allowed
+        :param should_wait: returns False if the waiting should stop
+        :return: whether there is room for more instructions
+        """
+        while True:
+            while pending and pending[0].is_confirmed():
+                pending.popleft()
+            if len(pending) < depth:
+                return True
+            if not should_wait():
+                return False
+            pending[0].wait_for_confirmation(timeout=QUIT_INTERVAL)
+
     # --- Static capture handlers ---
 
     def _confirmation_handler(self, sender, match: re.Match):
         """Used to do M105 parsing, but that is not supported anymore."""
         assert sender is not None
         assert match is not None
+        if self.stray_oks:
+            self.stray_oks -= 1
+            log.debug("Ignoring an ok belonging to a resend request")
+            self._try_writing()
+            return
         self._confirmed()
 
     def _resend_handler(self, sender, match: re.Match):
@@ -377,52 +442,90 @@ class SerialQueue(metaclass=MCSingleton):
         The printer can ask for re-sends of past numbered instructions.
         This method just parses the received match, does a bunch of checks and
         calls the actual handler resend()
+
+        Everything happens under the write lock, so no new instruction
+        can get sent between the in flight ones getting thrown out and
+        the recovery list getting filled
         """
         assert sender is not None
         number = int(match.group("cmd_number"))
-        log.info("Resend of %s requested. Current is %s", number,
-                 self.message_number)
-        if self.message_number >= number:
-            if (self.current_instruction is None
+        lost: List[Instruction] = []
+        with self.write_lock:
+            log.info("Resend of %s requested. Current is %s", number,
+                     self.message_number)
+            if self.stray_resends and number == self.resend_from:
+                log.debug("Ignoring a resend request for an instruction "
+                          "sent before the previous resend request")
+                self.stray_resends -= 1
+                self.stray_oks += 1
+                return
+            if self.message_number < number:
+                log.warning("We haven't sent anything with that number yet. "
+                            "The communication shouldn't fail after this.")
+                return
+            if self.in_flight:
+                lost = self._pipeline_failed(number)
+            elif (self.current_instruction is None
                     or not self.current_instruction.to_checksum):
                 log.warning("Re-send requested for a non-numbered message")
                 # If that happened, the non-numbered message got yeeted from
                 # the buffer, so let's solve that first
-                self._rx_got_yeeted()
-            self._resend((self.message_number - number) + 1)
-        else:
-            log.warning("We haven't sent anything with that number yet. "
-                        "The communication shouldn't fail after this.")
+                self._recover_rx()
+            possible = self._resend((self.message_number - number) + 1)
+        for instruction in lost:
+            instruction.confirm(force=True)
+        if not possible:
+            log.error("Impossible re-send request! Aborting...")
+            self._worst_case_scenario()
 
     # ---
 
-    def _resend(self, count):
+    def _pipeline_failed(self, number) -> List[Instruction]:
+        """
+        The printer flushes its RX buffer when asking for a resend. The in
+        flight instructions are going to be re-sent from history. The
+        ones that were not flushed are going to be rejected with the same
+        resend request followed by an ok.
+        Expects the write lock to be held, returns the thrown out
+        instructions, to be confirmed after the lock gets released
+        """
+        lost = list(self.in_flight)
+        self.in_flight.clear()
+        self.in_flight_size = 0
+        self.stray_oks += 1
+        self.stray_resends = len(lost) - 1
+        self.resend_from = number
+        return lost
+
+    def _resend(self, count) -> bool:
         """If possible, enqueue already sent instruction starting from the one
-        requested back into the recovery list/queue, to be re-sent"""
+        requested back into the recovery list/queue, to be re-sent
+        Expects the write lock to be held, returns False if the instructions
+        are not in the history anymore"""
         if not 0 < count < len(self.send_history):
-            log.error("Impossible re-send request! Aborting...")
-            self._worst_case_scenario()
-        else:
-            with self.write_lock:
-                # get the instructions newest first, they are going to reverse
-                # in the list
-                history = list(reversed(self.send_history))
-
-                self.recovery_list.clear()
-                for instruction_from_history in history[:count]:
-                    instruction = Instruction(
-                        instruction_from_history.message,
-                        to_checksum=True,
-                        data=instruction_from_history.data,
-                        number=instruction_from_history.number)
-                    self.recovery_list.append(instruction)
+            return False
+        # get the instructions newest first, they are going to reverse
+        # in the list
+        history = list(reversed(self.send_history))
+
+        self.recovery_list.clear()
+        for instruction_from_history in history[:count]:
+            instruction = Instruction(
+                instruction_from_history.message,
+                to_checksum=True,
+                data=instruction_from_history.data,
+                number=instruction_from_history.number)
+            self.recovery_list.append(instruction)
+        return True
 
     def _confirmed(self, force=False):
         """
         Printer confirmed an instruction. Tears down the instruction
         and prepares the module for processing of a new one
         """
-        if self.current_instruction is None or \
+        if self.in_flight:
+            self._confirmed_in_flight(force=force)
+        elif self.current_instruction is None or \
                 not self.current_instruction.is_sent():
             log.error("Unexpected message confirmation. Ignoring")
         elif self.current_instruction.confirm(force=force):
@@ -430,6 +533,7 @@ class SerialQueue(metaclass=MCSingleton):
                 # If a message was successfully confirmed, the rpi port
                 # had to be ok imo
                 RPI_ENABLED.state = CondState.OK
+                SEND_TO_OK.record(self.current_instruction.time_to_confirm)
             self.instruction_confirmed_signal.send(self)
             with self.write_lock:
                 instruction = self.current_instruction
@@ -454,22 +558,61 @@ class SerialQueue(metaclass=MCSingleton):
 
         self._try_writing()
 
+    def _confirmed_in_flight(self, force=False):
+        """The printer confirms pipelined instructions in order"""
+        with self.write_lock:
+            instruction = self.in_flight.popleft()
+            self.in_flight_size -= len(instruction.data)
+            # A genuine ok means no more rejections of old instructions
+            self.stray_resends = 0
+            # Measure from the previous confirmation, the instruction
+            # had to wait for the ones in front of it
+            confirmed_at = time()
+            waited_since = max(instruction.sent_at, self.last_confirmed_at)
+            self.last_confirmed_at = confirmed_at
+        instruction.confirm(force=force)
+        if not force:
+            RPI_ENABLED.state = CondState.OK
+            SEND_TO_OK.record(instruction.time_to_confirm)
+        self.instruction_confirmed_signal.send(self)
+        log.debug("%s confirmed", instruction)
+        self.is_planner_fed.process_value(confirmed_at - waited_since)
+
+    def _throw_out_in_flight(self):
+        """Confirms all in flight instructions without waiting"""
+        for instruction in self.in_flight:
+            instruction.confirm(force=True)
+        self.in_flight.clear()
+        self.in_flight_size = 0
+
     def _rx_got_yeeted(self):
         """
         Something caused the RX buffer to get thrown out, let's re-send
         everything supposed to be in it.
         """
+        with self.write_lock:
+            self._recover_rx()
+        self._try_writing()
+
+    def _recover_rx(self):
+        """The _rx_got_yeeted body, expects the write lock to be held"""
         log.debug("Think that RX Buffer got yeeted, sending instruction again")
+        if self.in_flight:
+            for instruction in self.in_flight:
+                instruction.reset()
+            # The recovery list is sent from its end
+            self.recovery_list.extend(reversed(self.in_flight))
+            self.in_flight.clear()
+            self.in_flight_size = 0
         # Let's bypass the check and write if we can.
-        if self.current_instruction is not None:
+        elif self.current_instruction is not None:
             instruction = self.current_instruction
             # These two types have to be recovered in their own ways
-            with self.write_lock:
-                self.rx_yeet_slot = instruction
-                self._teardown_output_capture()
-                instruction.reset()
-                self.current_instruction = None
-                self._send()
+            self.rx_yeet_slot = instruction
+            self._teardown_output_capture()
+            instruction.reset()
+            self.current_instruction = None
+            self._send()
 
     def reset_message_number(self):
         """
@@ -494,12 +637,12 @@ class SerialQueue(metaclass=MCSingleton):
         """
         with self.write_lock:
             InterestingLogRotator.trigger("flushing of the serial queue.")
-            new_queue = deque()
-            for instruction in self.priority_queue:
-                if not instruction.to_checksum:
-                    new_queue.append(instruction)
-            self.priority_queue = new_queue
+            self.scheduler.remove(
+                lambda instruction: instruction.to_checksum)
             self.recovery_list.clear()
+            # The printer is still going to confirm these
+            self.stray_oks += len(self.in_flight)
+            self._throw_out_in_flight()
             self._throw_out_current_instruction()
 
     def _flush_queues(self):
@@ -508,6 +651,9 @@ class SerialQueue(metaclass=MCSingleton):
         instructions, to keep the serial queue consistent for example after
         a reboot.
         """
+        self._throw_out_in_flight()
+        self.stray_oks = 0
+        self.stray_resends = 0
         if self.current_instruction is not None:
             # To flush the one instruction, that has not yet been confirmed
             # but has been sent, use the usual way
@@ -590,9 +736,12 @@ class MonitoredSerialQueue(SerialQueue):
                  serial_adapter: SerialAdapter,
                  serial_parser: ThreadedSerialParser,
                  threshold_path: str,
-                 rx_size=128):
+                 rx_size=128,
+                 pipeline_depth=1,
+                 traffic_classes: Optional[List[TrafficClass]] = None):
         super().__init__(serial_adapter, serial_parser,
-                         threshold_path, rx_size)
+                         threshold_path, rx_size, pipeline_depth,
+                         traffic_classes)
 
         self.stuck_counter = 0
 
@@ -620,7 +769,8 @@ class MonitoredSerialQueue(SerialQueue):
         If we are waiting on an instruction to be confirmed, returns the
         time we've been waiting
         """
-        if self.is_empty() and self.current_instruction is None:
+        if self.is_empty() and self.current_instruction is None and \
+                not self.in_flight:
             return 0
         return time() - self.last_event_on
 
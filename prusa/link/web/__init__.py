@@ -4,10 +4,12 @@ from threading import Thread
 from time import sleep
 from wsgiref.simple_server import make_server
 
+from ..const import THUMBNAIL_CACHE_SIZE
 from ..util import prctl_name
 from .lib.auth import REALM
 from .lib.classes import RequestHandler, ThreadingServer
 from .lib.core import app
+from .lib.thumbnails import ThumbnailCache
 from .lib.wizard import Wizard
 from .link_info import link_info
 
@@ -31,6 +33,8 @@ def init_web_app(daemon):
     app.debug = daemon.cfg.debug
 
     app.daemon = daemon
+    app.thumbnails = ThumbnailCache(THUMBNAIL_CACHE_SIZE,
+                                    daemon.cfg.daemon.thumbnail_dir or None)
 
     service_local = app.settings.service_local
     if service_local.username and service_local.digest:
@@ -15,6 +15,7 @@ from ..conditions import (
 )
 from ..const import LimitsMK3
 from ..serial.helpers import enqueue_instruction
+from ..serial.scheduler import INTERACTIVE
 from .lib.auth import check_api_digest
 from .lib.core import app
 
@@ -78,14 +79,14 @@ def jog(req, serial_queue):
 
     if absolute:
         # G90 - absolute movement
-        enqueue_instruction(serial_queue, 'G90')
+        enqueue_instruction(serial_queue, 'G90', traffic_class=INTERACTIVE)
     else:
         # G91 - relative movement
-        enqueue_instruction(serial_queue, 'G91')
+        enqueue_instruction(serial_queue, 'G91', traffic_class=INTERACTIVE)
 
     # G1 - linear movement in given axes
     gcode = f'G1 F{feedrate} {axes}'
-    enqueue_instruction(serial_queue, gcode)
+    enqueue_instruction(serial_queue, gcode, traffic_class=INTERACTIVE)
 
 
 def home(req, serial_queue):
@@ -96,7 +97,7 @@ def home(req, serial_queue):
     else:
         axes = ['X', 'Y', 'Z']
     gcode = f'G28 {axes}'
-    enqueue_instruction(serial_queue, gcode)
+    enqueue_instruction(serial_queue, gcode, traffic_class=INTERACTIVE)
 
 
 def set_speed(req, serial_queue):
@@ -106,13 +107,13 @@ def set_speed(req, serial_queue):
                        LimitsMK3.print_speed_min, LimitsMK3.print_speed_max)
 
     gcode = f'M220 S{factor}'
-    enqueue_instruction(serial_queue, gcode)
+    enqueue_instruction(serial_queue, gcode, traffic_class=INTERACTIVE)
 
 
 def disable_steppers(serial_queue):
     """Disable steppers command"""
     gcode = 'M84'
-    enqueue_instruction(serial_queue, gcode)
+    enqueue_instruction(serial_queue, gcode, traffic_class=INTERACTIVE)
 
 
 def extrude(req, serial_queue):
@@ -127,10 +128,10 @@ def extrude(req, serial_queue):
                        LimitsMK3.feedrate_e_min, LimitsMK3.feedrate_e_max)
 
     # M83 - relative movement for axis E
-    enqueue_instruction(serial_queue, 'M83')
+    enqueue_instruction(serial_queue, 'M83', traffic_class=INTERACTIVE)
 
     gcode = f'G1 F{feedrate} E{amount}'
-    enqueue_instruction(serial_queue, gcode)
+    enqueue_instruction(serial_queue, gcode, traffic_class=INTERACTIVE)
 
 
 @app.route('/api/printer/printhead', method=state.METHOD_POST)
@@ -193,7 +194,7 @@ def api_tool(req):
                                  LimitsMK3.temp_nozzle_max)
 
         gcode = f'M104 S{tool}'
-        enqueue_instruction(serial_queue, gcode)
+        enqueue_instruction(serial_queue, gcode, traffic_class=INTERACTIVE)
 
     if command == 'extrude':
         if tel.temp_nozzle < LimitsMK3.min_temp_nozzle_e:
@@ -210,7 +211,7 @@ def api_tool(req):
                            LimitsMK3.print_flow_min, LimitsMK3.print_flow_max)
 
         gcode = f'M221 S{factor}'
-        enqueue_instruction(serial_queue, gcode)
+        enqueue_instruction(serial_queue, gcode, traffic_class=INTERACTIVE)
 
     return JSONResponse(status_code=status)
 
@@ -230,6 +231,6 @@ def api_bed(req):
                                  LimitsMK3.temp_bed_max)
 
         gcode = f'M140 S{target}'
-        enqueue_instruction(serial_queue, gcode)
+        enqueue_instruction(serial_queue, gcode, traffic_class=INTERACTIVE)
 
     return JSONResponse(status_code=state.HTTP_NO_CONTENT)
@@ -265,6 +265,18 @@ def value_too_low(req):
     return response_error(req, conditions.ValueTooLow())
 
 
+@app.route('/error/unknown-metric')
+def unknown_metric(req):
+    """Error handler for 400 Unknown metric"""
+    return response_error(req, conditions.UnknownMetric())
+
+
+@app.route('/error/invalid-timestamp')
+def invalid_timestamp(req):
+    """Error handler for 400 Invalid timestamp"""
+    return response_error(req, conditions.InvalidTimestamp())
+
+
 @app.http_state(410)
 def gone(req):
     """Error handler for 410 Gone.
@@ -21,6 +21,10 @@ from prusa.connect.printer.const import (
 from .. import conditions
 from ..printer_adapter.command import FileNotFound, NotStateToPrint
 from ..printer_adapter.command_handlers import StartPrint
+from ..printer_adapter.gcode_stream import (
+    build_stream_in_background,
+    remove_stream,
+)
 from ..printer_adapter.job import Job
 from .lib.auth import check_api_digest
 from .lib.core import app
@@ -280,6 +284,7 @@ def file_upload(req, storage, path):
                 raise conditions.FileAlreadyExists()
 
         replace(part_path, abs_path)
+        app.daemon.prusa_link.metadata_index.enqueue(abs_path)
 
         if print_after_upload:
             tries = 0
@@ -296,6 +301,9 @@ def file_upload(req, storage, path):
                     StartPrint(print_path, source=Source.WUI))
             except NotStateToPrint as exception:
                 raise conditions.NotStateToPrint() from exception
+        else:
+            # Printing creates the gcode stream on its own
+            build_stream_in_background(abs_path)
 
     return Response(status_code=state.HTTP_CREATED)
 
@@ -323,6 +331,8 @@ def file_delete(req, storage, path):
                 raise conditions.DirectoryNotEmpty()
     else:
         unlink(os_path)
+        remove_stream(os_path)
+    app.daemon.prusa_link.metadata_index.forget(os_path)
 
     return Response(status_code=state.HTTP_NO_CONTENT)
 
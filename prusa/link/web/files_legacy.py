@@ -2,7 +2,6 @@
 This is a deprecated legacy code"""
 
 import logging
-from base64 import decodebytes
 from os import makedirs, replace, unlink
 from os.path import (
     abspath,
@@ -17,7 +16,7 @@ from os.path import (
 from shutil import move, rmtree
 
 import validators  # type: ignore
-from gcode_metadata import FDMMetaData, get_metadata, get_preview
+from gcode_metadata import FDMMetaData
 from poorwsgi import state
 from poorwsgi.request import FieldStorage
 from poorwsgi.response import FileResponse, JSONResponse, Response
@@ -29,6 +28,7 @@ from prusa.connect.printer.download import forbidden_characters
 from .. import conditions
 from ..const import PATH_WAIT_TIMEOUT
 from ..printer_adapter.command_handlers import StartPrint
+from ..printer_adapter.gcode_stream import remove_stream
 from ..printer_adapter.job import Job, JobState
 from ..printer_adapter.prusa_link import TransferCallbackState
 from .lib.auth import check_api_digest
@@ -46,6 +46,7 @@ from .lib.files import (
     gcode_analysis,
     get_last_modified,
     get_os_path,
+    local_metadata,
     local_refs,
     make_cache_headers,
     make_headers,
@@ -54,6 +55,7 @@ from .lib.files import (
     sort_files,
     storage_display_path,
 )
+from .lib.response_cache import etag_matches
 
 log = logging.getLogger(__name__)
 
@@ -296,11 +298,10 @@ def api_file_info(req, storage, path):
         if isdir(os_path):
             meta = FDMMetaData(os_path)
             meta.load_from_path(path)
+            data, img_format = meta.data, None
         else:
-            meta = get_metadata(os_path)
-        result['refs'] = local_refs(path, meta)
-        if not meta.thumbnails:
-            result['refs']['thumbnail'] = None
+            data, img_format = local_metadata(os_path)
+        result['refs'] = local_refs(path, img_format)
 
         result['size'] = getsize(os_path)
         result['date'] = int(getctime(os_path))
@@ -310,12 +311,13 @@ def api_file_info(req, storage, path):
             raise conditions.FileNotFound()
         meta = FDMMetaData(path)
         meta.load_from_path(path)
+        data = meta.data
         result['refs'] = sdcard_refs()
         result['read_only'] = True
 
     headers = make_headers(storage, path)
 
-    result['gcodeAnalysis'] = gcode_analysis(meta)
+    result['gcodeAnalysis'] = gcode_analysis(data)
     return JSONResponse(**result, headers=headers)
 
 
@@ -330,6 +332,8 @@ def api_delete(req, storage, path):
     os_path = check_os_path(get_os_path(path))
     check_job(Job.get_instance(), path)
     unlink(os_path)
+    remove_stream(os_path)
+    app.daemon.prusa_link.metadata_index.forget(os_path)
 
     return Response(status_code=state.HTTP_NO_CONTENT)
 
@@ -442,6 +446,7 @@ def api_delete_folder(req, storage, path):
         raise conditions.FolderNotFound()
 
     rmtree(path)
+    app.daemon.prusa_link.metadata_index.forget(path)
     return Response(status_code=state.HTTP_OK)
 
 
@@ -476,6 +481,9 @@ def api_modify(req, storage):
         try:
             makedirs(path)
             move(source, destination)
+            remove_stream(source)
+            app.daemon.prusa_link.metadata_index.forget(source)
+            app.daemon.prusa_link.metadata_index.enqueue(destination)
         except PermissionError as error:
             raise error
 
@@ -496,23 +504,27 @@ def api_download_abort(req):
 @check_api_digest
 def api_thumbnails(req, path, wanted_format):
     """Returns preview from cache file."""
-    # pylint: disable=unused-argument
-    headers = {'Cache-Control': 'private, max-age=604800'}
     os_path = check_os_path(get_os_path('/' + path))
 
-    meta = FDMMetaData(os_path)
-    if not meta.is_cache_fresh():
+    entry = app.daemon.prusa_link.metadata_index.lookup(os_path)
+    if entry is None:
         raise conditions.FileNotFound()
-
-    meta.load_cache()
-    if not meta.thumbnails:
+    if entry.preview is None or \
+            wanted_format.lower() != entry.preview_format:
         raise conditions.ThumbnailUnavailable()
 
-    info = get_preview(meta.thumbnails)
-    img_format = info.format.lower()
-    if wanted_format.lower() != img_format:
+    thumbnail = app.thumbnails.get(os_path, entry)
+    if thumbnail is None:
         raise conditions.ThumbnailUnavailable()
 
-    data = meta.thumbnails[info.to_thumbnail_info()]
-    return Response(decodebytes(data), headers=headers,
-                    content_type=f"image/{img_format}")
+    headers = {'Cache-Control': 'private, max-age=604800',
+               'ETag': thumbnail.etag}
+    if etag_matches(req.headers, thumbnail.etag):
+        return Response(status_code=state.HTTP_NOT_MODIFIED, headers=headers)
+
+    content_type = f"image/{thumbnail.img_format}"
+    if thumbnail.path is not None:
+        return FileResponse(thumbnail.path, content_type=content_type,
+                            headers=headers)
+    return Response(thumbnail.data, headers=headers,
+                    content_type=content_type)
@@ -2,6 +2,7 @@
 
 Main server classes for handling request.
 """
+import io
 import logging
 from socketserver import ThreadingMixIn
 from wsgiref.simple_server import ServerHandler, WSGIRequestHandler, WSGIServer
@@ -34,6 +35,22 @@ class LinkHandler(ServerHandler):
         """Just skip old stderr functionality."""
         log.exception("Error handling")
 
+    def sendfile(self):
+        """Sends the file responses by sendfile, the file does not have to
+        go through the user space then"""
+        try:
+            filelike = self.result.filelike
+            offset = filelike.tell()
+            filelike.fileno()
+            connection = self.request_handler.connection
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            return False
+        if not self.headers_sent:
+            self.send_headers()
+        self._flush()
+        self.bytes_sent += connection.sendfile(filelike, offset)
+        return True
+
 
 class RequestHandler(WSGIRequestHandler):
     """For custom handle, log_message and log_error methods."""
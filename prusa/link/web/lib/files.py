@@ -7,13 +7,9 @@ from io import FileIO
 from os import fsync, statvfs
 from os.path import abspath, dirname, exists, join
 from time import sleep, time
+from typing import Any, Dict, Optional, Tuple
 
-from gcode_metadata import (
-    FDMMetaData,
-    estimated_to_seconds,
-    get_metadata,
-    get_preview,
-)
+from gcode_metadata import FDMMetaData, estimated_to_seconds, get_preview
 from poorwsgi.request import Headers, Request
 from prusa.connect.printer import Filesystem
 from prusa.connect.printer.const import (
@@ -72,14 +68,12 @@ def sdcard_simple_refs():
     }
 
 
-def local_refs(path: str, meta: FDMMetaData):
-    """Make refs structure for print file on local storage."""
+def local_refs(path: str, img_format: Optional[str]):
+    """Make refs structure for print file on local storage.
+    :param img_format: format of the preview, None if there is none"""
     thumbnail = None
 
-    info = get_preview(meta.thumbnails)
-
-    if info is not None:
-        img_format = info.format.lower()
+    if img_format is not None:
         thumbnail = f"/api/thumbnails{path}.orig.{img_format}"
     return {
         'download': f"/api/files/local{path}/raw",
@@ -97,6 +91,26 @@ def sdcard_refs():
     }
 
 
+def local_metadata(os_path: str) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Returns the metadata and the preview format of a local print file
+    from the metadata index. A file, which is not indexed yet, gets queued
+    for indexing and only the gcode-metadata cache or its name are used
+    for now. The gcode never gets parsed on the request thread
+    """
+    entry = app.daemon.prusa_link.metadata_index.lookup(os_path)
+    if entry is not None:
+        return dict(entry.data), entry.preview_format
+
+    meta = FDMMetaData(os_path)
+    if meta.is_cache_fresh():
+        meta.load_cache()
+    else:
+        meta.load_from_path(os_path)
+    info = get_preview(meta.thumbnails)
+    return meta.data, info.format.lower() if info else None
+
+
 def gcode_analysis(meta):
     """Make gcodeAnalysis structure from metadata."""
     estimated = estimated_to_seconds(
@@ -136,18 +150,10 @@ def fill_printfile_data(path: str, os_path: str, storage: str,
 
     # local
     if storage == "local":
-        meta = FDMMetaData(os_path or path)
-
-        if os_path and meta.is_cache_fresh():
-            meta.load_cache()
-        result['refs'] = local_refs(path, meta)
+        data, img_format = local_metadata(os_path)
+        result['refs'] = local_refs(path, img_format)
         if simple:
             return result
-        meta = FDMMetaData(os_path)
-        meta.load_from_path(path)
-        meta = get_metadata(os_path)
-        if not meta.thumbnails:
-            result['refs']['thumbnail'] = None
 
     # sdcard
     else:
@@ -156,10 +162,11 @@ def fill_printfile_data(path: str, os_path: str, storage: str,
             return result
         meta = FDMMetaData(path)
         meta.load_from_path(path)
+        data = meta.data
 
-    result['meta'] = meta.data
+    result['meta'] = data
     result['meta']['estimated_print_time'] = estimated_to_seconds(
-        meta.data.get('estimated printing time (normal mode)', ''))
+        data.get('estimated printing time (normal mode)', ''))
     return result
 
 
@@ -249,23 +256,21 @@ def file_to_api(node, origin: str = 'local', path: str = '/',
         result['hash'] = None
 
         os_path = get_os_path(path)
-        meta = FDMMetaData(os_path or path)
 
         if origin != "sdcard":
-            # get metadata only for files with cache
-            os_path = get_os_path(path)
-            if os_path and meta.is_cache_fresh():
-                meta.load_cache()
-            result['refs'] = local_refs(path, meta)
-            if not meta.thumbnails:
-                result['refs']['thumbnail'] = None
+            data, img_format = {}, None
+            if os_path:
+                data, img_format = local_metadata(os_path)
+            result['refs'] = local_refs(path, img_format)
 
         else:
+            meta = FDMMetaData(path)
             meta.load_from_path(path)
+            data = meta.data
             result['refs'] = sdcard_refs()
             result['read_only'] = True
 
-        result['gcodeAnalysis'] = gcode_analysis(meta.data)
+        result['gcodeAnalysis'] = gcode_analysis(data)
 
     else:
         return {}  # not folder or allowed extension
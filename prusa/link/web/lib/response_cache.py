@@ -0,0 +1,71 @@
+"""Caching of the responses built from the model
+
+The snapshots get rebuilt only when the model generation moves on, the
+clients polling them get 304 Not Modified until that happens.
+"""
+import json
+from hashlib import md5
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+
+from poorwsgi.headers import Headers
+
+from ...const import instance_id
+
+
+class SnapshotCache:
+    """Builds a snapshot once per model generation and shares it"""
+
+    def __init__(self, build: Callable[[], Dict[str, Any]]) -> None:
+        self.build = build
+        self.lock = Lock()
+        self.generation: Optional[int] = None
+        self.snapshot: Dict[str, Any] = {}
+
+    def get(self, generation: int) -> Dict[str, Any]:
+        """Returns the snapshot of the supplied generation, building
+        it if the cached one is older"""
+        with self.lock:
+            if generation != self.generation:
+                self.snapshot = self.build()
+                self.generation = generation
+            return self.snapshot
+
+
+def generation_etag(generation: int,
+                    live: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Returns a weak ETag of the model generation
+    :param generation: the generation the response got built from
+    :param live: the parts of the response, which change without bumping
+        the generation, they get hashed into the tag
+    """
+    # The generation starts from zero with every run, the instance id
+    # keeps the tags from before a restart from matching
+    tag = f"{instance_id.hex[:8]}-{generation}"
+    if live:
+        digest = md5(json.dumps(live, sort_keys=True).encode())
+        tag += f"-{digest.hexdigest()[:10]}"
+    return f'W/"{tag}"'
+
+
+def make_etag_headers(etag: str) -> dict:
+    """Make the headers for the responses the clients should revalidate
+    every time"""
+    return {
+        'ETag': etag,
+        'Cache-Control': 'no-cache',
+    }
+
+
+def etag_matches(req_headers: Headers, etag: str) -> bool:
+    """Returns True if the If-None-Match header lists the ETag"""
+    if_none_match = req_headers.get('If-None-Match')
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, the W/ prefix does not matter
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque
+               for tag in if_none_match.split(","))
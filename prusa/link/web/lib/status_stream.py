@@ -0,0 +1,78 @@
+"""Server-Sent Events stream of the printer status
+
+The clients get the whole status first, then just JSON merge patches
+(RFC 7386) of what has changed. A stream waits for the model generation
+to move on, so an open stream costs nothing while nothing changes.
+"""
+import json
+from time import monotonic, sleep
+from typing import Any, Callable, Dict, Iterator
+
+from ...printer_adapter.structures.generation import Generation
+
+# Send at most this often, telemetry can change many times a second
+MIN_INTERVAL = 0.25
+# Send a comment at least this often, so dead clients get noticed
+KEEPALIVE_INTERVAL = 15
+# How often to look at the parts of the status not covered by generations
+LIVE_INTERVAL = 1
+
+
+def merge_patch(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the JSON merge patch turning old into new,
+    removed keys are set to None"""
+    patch: Dict[str, Any] = {}
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    for key, value in new.items():
+        old_value = old.get(key)
+        if isinstance(value, dict) and isinstance(old_value, dict):
+            sub_patch = merge_patch(old_value, value)
+            if sub_patch:
+                patch[key] = sub_patch
+        elif key not in old or value != old_value:
+            patch[key] = value
+    return patch
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> bytes:
+    """Formats one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+def status_events(generation: Generation,
+                  status: Callable[[int], Dict[str, Any]],
+                  live_active: Callable[[], bool]) -> Iterator[bytes]:
+    """
+    Yields the status event followed by the patch events
+    :param generation: the model generation to wait on
+    :param status: returns the status of the supplied generation
+    :param live_active: whether the parts of the status, which change
+        without bumping the generation, like the transfer progress,
+        are changing right now. These get looked at more often then
+    """
+    seen = generation.value
+    sent = status(seen)
+    yield sse_event("status", sent)
+    sent_at = monotonic()
+
+    while True:
+        timeout = LIVE_INTERVAL if live_active() else KEEPALIVE_INTERVAL
+        current = generation.wait_past(seen, timeout)
+        # Let the quick successions of changes add up
+        since_sent = monotonic() - sent_at
+        if since_sent < MIN_INTERVAL:
+            sleep(MIN_INTERVAL - since_sent)
+            current = generation.value
+        seen = current
+
+        current_status = status(current)
+        patch = merge_patch(sent, current_status)
+        if patch:
+            yield sse_event("patch", patch)
+            sent = current_status
+            sent_at = monotonic()
+        elif monotonic() - sent_at >= KEEPALIVE_INTERVAL:
+            yield b": keepalive\n\n"
+            sent_at = monotonic()
@@ -0,0 +1,200 @@
+"""Decoded thumbnail cache
+
+The thumbnails are kept base64 encoded in the gcode-metadata cache files,
+which are JSON with all the metadata. Decoding them for every request made
+the file browser slow, so the decoded ones are kept in a byte bounded LRU.
+Optionally, they are also kept in a directory as image files. These get sent
+by sendfile straight from the page cache and survive a restart. Each print
+file has a subdirectory for its image, so replacing or removing it does not
+need to look at the others.
+"""
+import logging
+import os
+from base64 import decodebytes
+from collections import OrderedDict
+from hashlib import md5
+from shutil import rmtree
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+from gcode_metadata import FDMMetaData
+
+from ...printer_adapter.metadata_index import IndexEntry, MetadataIndex
+
+log = logging.getLogger(__name__)
+
+# os path, mtime in ns, size
+Key = Tuple[str, int, int]
+
+# What a thumbnail kept on disk costs in memory, roughly
+RECORD_SIZE = 256
+
+
+class Thumbnail(NamedTuple):
+    """A decoded thumbnail, either in memory or in an image file"""
+    etag: str
+    img_format: str
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+
+    @property
+    def cost(self) -> int:
+        """How many bytes it takes in the LRU"""
+        if self.data is None:
+            return RECORD_SIZE
+        return len(self.data) + RECORD_SIZE
+
+
+def content_etag(data: bytes) -> str:
+    """Returns a strong ETag from the image content"""
+    return f'"{md5(data).hexdigest()}"'
+
+
+class ThumbnailCache:
+    """
+    Decodes the preview thumbnails of the indexed print files once
+    :param max_bytes: how much the decoded thumbnails can take in memory
+    :param store_dir: the directory to keep the image files in,
+        None keeps them just in memory
+    """
+
+    def __init__(self, max_bytes: int,
+                 store_dir: Optional[str] = None) -> None:
+        self.max_bytes = max_bytes
+        self.store_dir = store_dir
+        self.lock = Lock()
+        self.thumbnails: OrderedDict[Key, Thumbnail] = OrderedDict()
+        self.size = 0
+        if store_dir is not None:
+            os.makedirs(store_dir, exist_ok=True)
+
+    def get(self, os_path: str, entry: IndexEntry) -> Optional[Thumbnail]:
+        """Returns the decoded preview of a print file, None if it
+        cannot be read from the gcode-metadata cache"""
+        if entry.preview is None or entry.preview_format is None:
+            return None
+        key = (os_path, entry.mtime_ns, entry.size)
+        with self.lock:
+            thumbnail = self.thumbnails.get(key)
+            if thumbnail is not None:
+                self.thumbnails.move_to_end(key)
+                return thumbnail
+
+        thumbnail = self._load_stored(key, entry.preview_format)
+        if thumbnail is None:
+            data = self._decode(os_path, entry.preview)
+            if data is None:
+                return None
+            thumbnail = self._store(key, entry.preview_format, data)
+        self._remember(key, thumbnail)
+        return thumbnail
+
+    @staticmethod
+    def _decode(os_path: str, preview: str) -> Optional[bytes]:
+        """Decodes the preview from the gcode-metadata cache"""
+        meta = FDMMetaData(os_path)
+        try:
+            meta.load_cache()
+        except ValueError:
+            return None
+        encoded = meta.thumbnails.get(preview)
+        if encoded is None:
+            return None
+        return decodebytes(encoded)
+
+    def _remember(self, key: Key, thumbnail: Thumbnail) -> None:
+        """Puts the thumbnail into the LRU, the least recently used
+        ones get dropped to make room for it"""
+        with self.lock:
+            old = self.thumbnails.pop(key, None)
+            if old is not None:
+                self.size -= old.cost
+            self.thumbnails[key] = thumbnail
+            self.size += thumbnail.cost
+            while self.size > self.max_bytes and len(self.thumbnails) > 1:
+                _, dropped = self.thumbnails.popitem(last=False)
+                self.size -= dropped.cost
+
+    def follow(self, index: MetadataIndex) -> None:
+        """Removes the image files of the print files the index does not
+        know, and of the ones it forgets from now on"""
+        index.forgotten_signal.connect(self._forgotten)
+        self.prune(index.paths())
+
+    def _forgotten(self, _, path: str) -> None:
+        """The index forgot a print file"""
+        self.forget(path)
+
+    def forget(self, os_path: str) -> None:
+        """Drops the thumbnail of a deleted or moved print file"""
+        with self.lock:
+            for key in [key for key in self.thumbnails if key[0] == os_path]:
+                self.size -= self.thumbnails.pop(key).cost
+        if self.store_dir is not None:
+            rmtree(self._stored_dir(os_path), ignore_errors=True)
+
+    def prune(self, os_paths: Iterable[str]) -> None:
+        """Removes the image files of all but the supplied print files"""
+        if self.store_dir is None:
+            return
+        keep = {self._stored_name(os_path) for os_path in os_paths}
+        for name in os.listdir(self.store_dir):
+            path = os.path.join(self.store_dir, name)
+            if name not in keep and os.path.isdir(path):
+                rmtree(path, ignore_errors=True)
+
+    @staticmethod
+    def _stored_name(os_path: str) -> str:
+        """The name of the directory for the image of a print file"""
+        return md5(os_path.encode()).hexdigest()
+
+    def _stored_dir(self, os_path: str) -> str:
+        """The directory for the image of a print file"""
+        assert self.store_dir is not None
+        return os.path.join(self.store_dir, self._stored_name(os_path))
+
+    def _stored_path(self, key: Key, img_format: str) -> str:
+        """Returns the image file path for the key"""
+        os_path, mtime_ns, size = key
+        return os.path.join(self._stored_dir(os_path),
+                            f"{mtime_ns}-{size}.{img_format}")
+
+    def _load_stored(self, key: Key,
+                     img_format: str) -> Optional[Thumbnail]:
+        """Returns the thumbnail from its image file, if there is one"""
+        if self.store_dir is None:
+            return None
+        path = self._stored_path(key, img_format)
+        try:
+            with open(path, "rb") as image_file:
+                data = image_file.read()
+        except OSError:
+            return None
+        return Thumbnail(etag=content_etag(data), img_format=img_format,
+                         path=path)
+
+    def _store(self, key: Key, img_format: str, data: bytes) -> Thumbnail:
+        """Writes the image file, if there is a directory for them,
+        removes the ones of the previous versions of the print file"""
+        thumbnail = Thumbnail(etag=content_etag(data), img_format=img_format,
+                              data=data)
+        if self.store_dir is None:
+            return thumbnail
+
+        path = self._stored_path(key, img_format)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with NamedTemporaryFile(dir=directory, suffix=".part",
+                                    delete=False) as image_file:
+                image_file.write(data)
+            os.replace(image_file.name, path)
+            for name in os.listdir(directory):
+                if not name.endswith(".part") and \
+                        os.path.join(directory, name) != path:
+                    os.unlink(os.path.join(directory, name))
+        except OSError:
+            log.exception("Cannot store the thumbnail %s", path)
+            return thumbnail
+        return thumbnail._replace(data=None, path=path)
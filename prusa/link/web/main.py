@@ -5,6 +5,7 @@ import logging
 import shlex
 import subprocess
 import time
+from math import isfinite
 from os import listdir
 from os.path import basename, getmtime, getsize, join
 from socket import gethostname
@@ -12,7 +13,6 @@ from subprocess import CalledProcessError
 from sys import version
 from typing import BinaryIO, cast
 
-from gcode_metadata import get_metadata
 from pkg_resources import working_set  # type: ignore
 from poorwsgi import state
 from poorwsgi.digest import check_digest
@@ -29,6 +29,7 @@ from prusa.connect.printer.models import filter_null
 
 from .. import __version__, conditions
 from ..const import GZ_SUFFIX, LOGS_FILES, LOGS_PATH, LimitsMK3S, instance_id
+from ..metrics import gauges_dict, histograms_dict
 from ..printer_adapter.command import CommandFailed
 from ..printer_adapter.command_handlers import (
     PausePrint,
@@ -42,7 +43,19 @@ from ..printer_adapter.command_handlers import (
 from ..printer_adapter.job import Job, JobState
 from .lib.auth import REALM, check_api_digest, check_config
 from .lib.core import app
-from .lib.files import fill_printfile_data, gcode_analysis, get_os_path
+from .lib.files import (
+    fill_printfile_data,
+    gcode_analysis,
+    get_os_path,
+    local_metadata,
+)
+from .lib.response_cache import (
+    SnapshotCache,
+    etag_matches,
+    generation_etag,
+    make_etag_headers,
+)
+from .lib.status_stream import status_events
 from .lib.view import package_to_api
 
 log = logging.getLogger(__name__)
@@ -88,7 +101,8 @@ def index(req):
 
 @app.route('/sockjs/websocket')
 def websocket(req):
-    """No websocket support yet."""
+    """No websocket support, the status gets pushed by
+    /api/v1/status/stream instead"""
     # pylint: disable=unused-argument
     return EmptyResponse()
 
@@ -187,17 +201,13 @@ def api_info(req):
     return JSONResponse(**info)
 
 
-@app.route('/api/v1/status')
-@check_api_digest
-def api_status(req):
-    """Returns telemetric data about printer, job and transfer"""
-    # pylint: disable=unused-argument
+def status_snapshot():
+    """Builds the status of the storage, printer and job,
+    which only changes with the model generation"""
     # pylint: disable=too-many-locals
     job = app.daemon.prusa_link.model.job
     tel = app.daemon.prusa_link.model.latest_telemetry
-    transfer = app.daemon.prusa_link.printer.transfer
     printer = app.daemon.prusa_link.printer
-    camera_configurator = app.daemon.prusa_link.camera_configurator
     storage_dict = app.daemon.prusa_link.printer.fs.storage_dict
     status = {}
 
@@ -232,8 +242,6 @@ def api_status(req):
         "speed": tel.speed,
         "fan_hotend": tel.fan_hotend,
         "fan_print": tel.fan_print,
-        "status_connect": conditions.connect_status(),
-        "status_printer": conditions.printer_status(),
         "target_nozzle": tel.target_nozzle,
         "target_bed": tel.target_bed,
     }
@@ -244,10 +252,6 @@ def api_status(req):
         status_printer["axis_y"] = tel.axis_y
     status["printer"] = status_printer
 
-    # --- Camera ---
-    status["camera"] = {"id": camera_configurator.order[0]} \
-        if camera_configurator.order else None
-
     # --- Job ---
     if job.job_state is not JobState.IDLE:
         progress = float(tel.progress or 0)
@@ -262,7 +266,24 @@ def api_status(req):
         }
         status["job"] = status_job
 
+    return filter_null(status)
+
+
+def live_status():
+    """Returns the conditions, the camera and the transfer, these change
+    on their own without bumping the model generation"""
+    live = {
+        "status_connect": conditions.connect_status(),
+        "status_printer": conditions.printer_status(),
+    }
+
+    # --- Camera ---
+    camera_configurator = app.daemon.prusa_link.camera_configurator
+    if camera_configurator.order:
+        live["camera"] = {"id": camera_configurator.order[0]}
+
     # --- Transfer ---
+    transfer = app.daemon.prusa_link.printer.transfer
     if transfer.in_progress:
         status_transfer = {
             "id": transfer.transfer_id,
@@ -270,9 +291,89 @@ def api_status(req):
             "progress": round(transfer.progress, 2),
             "data_transferred": transfer.transferred,
         }
-        status["transfer"] = status_transfer
+        live["transfer"] = filter_null(status_transfer)
+    return live
+
+
+def add_live_status(snapshot, live):
+    """Adds the live parts to the status snapshot"""
+    status = dict(snapshot)
+    status["printer"] = {
+        **snapshot["printer"],
+        "status_connect": live["status_connect"],
+        "status_printer": live["status_printer"],
+    }
+    for key in ("camera", "transfer"):
+        if key in live:
+            status[key] = live[key]
+    return status
+
 
-    return JSONResponse(**filter_null(status))
+STATUS_CACHE = SnapshotCache(status_snapshot)
+
+
+@app.route('/api/v1/status')
+@check_api_digest
+def api_status(req):
+    """Returns telemetric data about printer, job and transfer"""
+    generation = app.daemon.prusa_link.model.generation.value
+    live = live_status()
+    headers = make_etag_headers(generation_etag(generation, live))
+    if etag_matches(req.headers, headers['ETag']):
+        return Response(status_code=state.HTTP_NOT_MODIFIED, headers=headers)
+    return JSONResponse(
+        headers=headers,
+        **add_live_status(STATUS_CACHE.get(generation), live))
+
+
+@app.route('/api/v1/status/stream')
+@check_api_digest
+def api_status_stream(req):
+    """Streams the status as Server-Sent Events, the whole status first,
+    then merge patches of the changes"""
+    # pylint: disable=unused-argument
+    transfer = app.daemon.prusa_link.printer.transfer
+    events = status_events(
+        app.daemon.prusa_link.model.generation,
+        status=lambda generation: add_live_status(
+            STATUS_CACHE.get(generation), live_status()),
+        live_active=lambda: transfer.in_progress)
+    return GeneratorResponse(events,
+                             content_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache",
+                                      "X-Accel-Buffering": "no"})
+
+
+@app.route('/api/v1/telemetry/history')
+@check_api_digest
+def api_telemetry_history(req):
+    """Returns the recent history of the telemetry metrics, the metric
+    argument can list more of them separated by commas"""
+    history = app.daemon.prusa_link.telemetry_passer.history
+    metric = req.args.get('metric')
+    metrics = metric.split(",") if metric else history.metrics
+    for name in metrics:
+        if name not in history.metrics:
+            raise conditions.UnknownMetric()
+
+    since = req.args.get('since')
+    if since is not None:
+        try:
+            since = float(since)
+        except ValueError as exception:
+            raise conditions.InvalidTimestamp() from exception
+        if not isfinite(since):
+            raise conditions.InvalidTimestamp()
+
+    return JSONResponse(**history.query(metrics, since))
+
+
+@app.route('/api/v1/debug/metrics')
+@check_api_digest
+def api_debug_metrics(req):
+    """Returns the serial pipeline latency histograms and gauges"""
+    # pylint: disable=unused-argument
+    return JSONResponse(latency=histograms_dict(), gauges=gauges_dict())
 
 
 @app.route('/api/version')
@@ -327,11 +428,8 @@ def api_login(req):
                         name='_api')
 
 
-@app.route('/api/printer')
-@check_api_digest
-def api_printer(req):
-    """Returns printer telemetry info"""
-    # pylint: disable=unused-argument
+def printer_snapshot():
+    """Builds the printer telemetry info"""
     prusa_link = app.daemon.prusa_link
     tel = prusa_link.model.latest_telemetry
     sd_ready = prusa_link.sd_ready
@@ -343,58 +441,71 @@ def api_printer(req):
     space_info = storage_dict[app.cfg.printer.directory_name].get_space_info()
     free_space = space_info["free_space"]
     total_space = space_info["total_space"]
-    return JSONResponse(
-        **{
-            "temperature": {
-                "tool0": {
-                    "actual": tel.temp_nozzle,
-                    "target": tel.target_nozzle,
-                },
-                "bed": {
-                    "actual": tel.temp_bed,
-                    "target": tel.target_bed,
-                },
+    return {
+        "temperature": {
+            "tool0": {
+                "actual": tel.temp_nozzle,
+                "target": tel.target_nozzle,
             },
-            "sd": {
-                "ready": sd_ready,
+            "bed": {
+                "actual": tel.temp_bed,
+                "target": tel.target_bed,
             },
-            "state": {
-                "text": PRINTER_STATES[printer.state],
-                "flags": {
-                    "operational": operational,
-                    "paused": printer.state == State.PAUSED,
-                    "printing": printer.state == State.PRINTING,
-                    "cancelling": printer.state == State.STOPPED,
-                    "pausing": printer.state == State.PAUSED,
-                    "sdReady": sd_ready,
-                    "error": printer.state == State.ERROR,
-                    # Compatibility, READY will be changed to IDLE
-                    "ready": printer.state == State.IDLE,
-                    "closedOrError": False,
-                    "finished": printer.state == State.FINISHED,
-                    # Compatibility, PREPARED will be changed to READY
-                    "prepared": printer.ready,
-                    "link_state": link_state,
-                },
-            },
-            "telemetry": {
-                "temp-bed": tel.temp_bed,
-                "temp-nozzle": tel.temp_nozzle,
-                "material": " - ",
-                "z-height": tel.axis_z,
-                "print-speed": tel.speed,
-                "axis_x": tel.axis_x,
-                "axis_y": tel.axis_y,
-                "axis_z": tel.axis_z,
+        },
+        "sd": {
+            "ready": sd_ready,
+        },
+        "state": {
+            "text": PRINTER_STATES[printer.state],
+            "flags": {
+                "operational": operational,
+                "paused": printer.state == State.PAUSED,
+                "printing": printer.state == State.PRINTING,
+                "cancelling": printer.state == State.STOPPED,
+                "pausing": printer.state == State.PAUSED,
+                "sdReady": sd_ready,
+                "error": printer.state == State.ERROR,
+                # Compatibility, READY will be changed to IDLE
+                "ready": printer.state == State.IDLE,
+                "closedOrError": False,
+                "finished": printer.state == State.FINISHED,
+                # Compatibility, PREPARED will be changed to READY
+                "prepared": printer.ready,
+                "link_state": link_state,
             },
-            "storage": {
-                "local": {
-                    "free_space": free_space,
-                    "total_space": total_space,
-                },
-                "sd_card": None,
+        },
+        "telemetry": {
+            "temp-bed": tel.temp_bed,
+            "temp-nozzle": tel.temp_nozzle,
+            "material": " - ",
+            "z-height": tel.axis_z,
+            "print-speed": tel.speed,
+            "axis_x": tel.axis_x,
+            "axis_y": tel.axis_y,
+            "axis_z": tel.axis_z,
+        },
+        "storage": {
+            "local": {
+                "free_space": free_space,
+                "total_space": total_space,
             },
-        })
+            "sd_card": None,
+        },
+    }
+
+
+PRINTER_CACHE = SnapshotCache(printer_snapshot)
+
+
+@app.route('/api/printer')
+@check_api_digest
+def api_printer(req):
+    """Returns printer telemetry info"""
+    generation = app.daemon.prusa_link.model.generation.value
+    headers = make_etag_headers(generation_etag(generation))
+    if etag_matches(req.headers, headers['ETag']):
+        return Response(status_code=state.HTTP_NOT_MODIFIED, headers=headers)
+    return JSONResponse(headers=headers, **PRINTER_CACHE.get(generation))
 
 
 @app.route('/api/printer/sd')
@@ -441,11 +552,8 @@ def api_timelapse(req):
                         unrendered=[])
 
 
-@app.route('/api/job')
-@check_api_digest
-def api_job(req):
-    """Returns info about actual printing job"""
-    # pylint: disable=unused-argument
+def legacy_job_snapshot():
+    """Builds the info about actual printing job"""
     tel = app.daemon.prusa_link.model.latest_telemetry
     job = app.daemon.prusa_link.model.job
     printer = app.daemon.prusa_link.printer
@@ -461,8 +569,8 @@ def api_job(req):
         }
 
         if file_['origin'] == 'local':
-            meta = get_metadata(get_os_path(job.selected_file_path))
-            analysis = gcode_analysis(meta.data)
+            data, _ = local_metadata(get_os_path(job.selected_file_path))
+            analysis = gcode_analysis(data)
         else:
             meta = printer.from_path(job.selected_file_path)
             analysis = gcode_analysis(meta)
@@ -490,28 +598,41 @@ def api_job(req):
     estimated = int(time_remaining + time_printing) \
         if is_printing and time_remaining is not None else time_remaining
 
-    return JSONResponse(
-        **{
-            "job": {
-                "estimatedPrintTime": estimated,
-                "averagePrintTime": None,
-                "lastPrintTime": None,
-                "filament": None,
-                "file": file_,
-                "user": "_api",
-            },
-            "progress": {
-                "completion": progress,
-                "filepos": 0,
-                "printTime": time_printing if is_printing else None,
-                "printTimeLeft": time_remaining if is_printing else None,
-                "printTimeLeftOrigin": "estimate",
-                "pos_z_mm": tel.axis_z,
-                "printSpeed": tel.speed,
-                "flow_factor": tel.flow,
-            },
-            "state": PRINTER_STATES[printer.state],
-        })
+    return {
+        "job": {
+            "estimatedPrintTime": estimated,
+            "averagePrintTime": None,
+            "lastPrintTime": None,
+            "filament": None,
+            "file": file_,
+            "user": "_api",
+        },
+        "progress": {
+            "completion": progress,
+            "filepos": 0,
+            "printTime": time_printing if is_printing else None,
+            "printTimeLeft": time_remaining if is_printing else None,
+            "printTimeLeftOrigin": "estimate",
+            "pos_z_mm": tel.axis_z,
+            "printSpeed": tel.speed,
+            "flow_factor": tel.flow,
+        },
+        "state": PRINTER_STATES[printer.state],
+    }
+
+
+LEGACY_JOB_CACHE = SnapshotCache(legacy_job_snapshot)
+
+
+@app.route('/api/job')
+@check_api_digest
+def api_job(req):
+    """Returns info about actual printing job"""
+    generation = app.daemon.prusa_link.model.generation.value
+    headers = make_etag_headers(generation_etag(generation))
+    if etag_matches(req.headers, headers['ETag']):
+        return Response(status_code=state.HTTP_NOT_MODIFIED, headers=headers)
+    return JSONResponse(headers=headers, **LEGACY_JOB_CACHE.get(generation))
 
 
 @app.route("/api/job", method=state.METHOD_POST)
@@ -565,11 +686,8 @@ def api_job_command(req):
     return Response(status_code=state.HTTP_NO_CONTENT)
 
 
-@app.route("/api/v1/job")
-@check_api_digest
-def job_info(req):
-    """Returns info about current job"""
-    # pylint: disable=unused-argument
+def job_snapshot():
+    """Builds the info about current job, empty if there is none"""
     job = app.daemon.prusa_link.model.job
     tel = app.daemon.prusa_link.model.latest_telemetry
     printer = app.daemon.prusa_link.printer
@@ -598,9 +716,26 @@ def job_info(req):
         }
         status_job["file"].update(fill_printfile_data(
             path=path, os_path=os_path, storage=storage))
+        return status_job
+    return {}
 
-        return JSONResponse(**status_job)
-    return Response(status_code=state.HTTP_NO_CONTENT)
+
+JOB_CACHE = SnapshotCache(job_snapshot)
+
+
+@app.route("/api/v1/job")
+@check_api_digest
+def job_info(req):
+    """Returns info about current job"""
+    generation = app.daemon.prusa_link.model.generation.value
+    status_job = JOB_CACHE.get(generation)
+    if not status_job:
+        return Response(status_code=state.HTTP_NO_CONTENT)
+
+    headers = make_etag_headers(generation_etag(generation))
+    if etag_matches(req.headers, headers['ETag']):
+        return Response(status_code=state.HTTP_NOT_MODIFIED, headers=headers)
+    return JSONResponse(headers=headers, **status_job)
 
 
 @app.route("/api/v1/job/<job_id:int>", method=state.METHOD_DELETE)
@@ -0,0 +1,71 @@
+"""
+Compares the IsPlannerFed percentile engines
+
+Feeds both with the same confirmation times, reports the time spent
+per process_value call and the memory held by the tracked values.
+
+Run from the repository root:
+    python -m tests.benchmark_percentile --count 50000
+"""
+import argparse
+import gc
+import os
+import random
+import tracemalloc
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from prusa.link.serial.is_planner_fed import IsPlannerFed, PercentileEngine
+
+
+def measure(engine: PercentileEngine, values):
+    """
+    Runs the values through an IsPlannerFed with the given engine
+    :return: dict of measured metrics
+    """
+    with TemporaryDirectory() as temp_dir:
+        gc.collect()
+        tracemalloc.start()
+        is_planner_fed = IsPlannerFed(
+            os.path.join(temp_dir, "threshold.data"), engine=engine)
+        for value in values:
+            is_planner_fed.process_value(value)
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        # Time it separately, tracemalloc slows everything down
+        is_planner_fed = IsPlannerFed(
+            os.path.join(temp_dir, "threshold.data"), engine=engine)
+        started_at = perf_counter()
+        for value in values:
+            is_planner_fed.process_value(value)
+        duration = perf_counter() - started_at
+
+    return {
+        "us_per_value": duration / len(values) * 1000 * 1000,
+        "memory_kib": memory / 1024,
+        "threshold_ms": is_planner_fed.get_dynamic_threshold() * 1000,
+    }
+
+
+def main():
+    """Parses the arguments, runs the benchmark and reports the results"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--count", type=int, default=50000,
+                        help="how many confirmation times to process")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # Mostly quick confirmations with a tail of the planner being full
+    values = [rng.lognormvariate(-4, 0.8) for _ in range(args.count)]
+
+    for engine in PercentileEngine:
+        results = measure(engine, values)
+        print(f"{engine.value}:")
+        for name, value in results.items():
+            print(f"{name:>20}: {value:.3f}")
+
+
+if __name__ == "__main__":
+    main()
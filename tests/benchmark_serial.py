@@ -0,0 +1,240 @@
+"""
+Replay based throughput benchmark of the serial hot path
+
+Drives the SerialQueue, SerialAdapter and ThreadedSerialParser against a
+simulated firmware on a pseudo terminal, the same way the FilePrinter does
+when printing from a file. Reports gcodes per second, send to confirmation
+latency percentiles and the CPU time spent per a thousand instructions.
+
+Run from the repository root:
+    python -m tests.benchmark_serial --count 5000 --resend-rate 0.001
+
+Pass --gcode to replay a real gcode file instead of the synthetic moves,
+--pipeline-depth to send print instructions without waiting for every ok.
+Use --save and --baseline to catch regressions between runs.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from collections import deque
+from tempfile import TemporaryDirectory
+from time import monotonic, process_time, sleep
+from typing import Deque, Iterator, List
+
+from prusa.link.const import PRINT_BATCH_SIZE, PRINT_QUEUE_SIZE, RX_SIZE
+from prusa.link.printer_adapter.model import Model
+from prusa.link.printer_adapter.structures.module_data_classes import Port
+from prusa.link.serial.helpers import wait_for_instruction
+from prusa.link.serial.instruction import Instruction
+from prusa.link.serial.serial import Serial
+from prusa.link.serial.serial_adapter import SerialAdapter
+from prusa.link.serial.serial_parser import ThreadedSerialParser
+from prusa.link.serial.serial_queue import MonitoredSerialQueue
+from prusa.link.util import get_gcode
+
+from .fake_printer import FakePrinter, FakePrinterConfig
+
+log = logging.getLogger(__name__)
+
+# Metrics where a higher number is better, for baseline comparisons
+HIGHER_IS_BETTER = {"gcodes_per_second"}
+
+
+class BenchSerialAdapter(SerialAdapter):
+    """Skips the port scanning and printer detection, uses the given port"""
+
+    def _reopen(self) -> bool:
+        with self.write_lock:
+            self.close()
+            self.serial = Serial(port=self.configured_port,
+                                 baudrate=self.baudrate,
+                                 timeout=self.timeout)
+            self.data.using_port = Port(path=self.configured_port,
+                                        checked=True,
+                                        usable=True,
+                                        selected=True)
+            return True
+
+
+def synthetic_gcodes(count: int) -> Iterator[str]:
+    """Short segments of a circle-ish move, like a dense curved print"""
+    for i in range(count):
+        yield f"G1 X{100 + (i % 360) / 10:.3f} Y{100 - (i % 180) / 10:.3f} " \
+              f"E{0.01 * (i % 7):.5f}"
+
+
+def file_gcodes(path: str, count: int) -> Iterator[str]:
+    """Gcodes from a real file, limited to count"""
+    sent = 0
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if sent >= count:
+                return
+            gcode = get_gcode(line)
+            if gcode:
+                sent += 1
+                yield gcode
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest rank percentile of already sorted values"""
+    if not values:
+        return float("nan")
+    index = min(len(values) - 1, max(0, round(fraction * len(values)) - 1))
+    return values[index]
+
+
+def run(gcodes: Iterator[str], config: FakePrinterConfig,
+        pipeline_depth: int = 1):
+    """
+    Prints the supplied gcodes through the serial stack into a fake printer
+    :return: dict of measured metrics
+    """
+    printer = FakePrinter(config)
+    printer.start()
+
+    with TemporaryDirectory() as temp_dir:
+        serial_parser = ThreadedSerialParser()
+        serial_adapter = BenchSerialAdapter(serial_parser,
+                                            Model(),
+                                            configured_port=printer.port)
+        serial_queue = MonitoredSerialQueue(
+            serial_adapter=serial_adapter,
+            serial_parser=serial_parser,
+            threshold_path=os.path.join(temp_dir, "threshold.data"),
+            rx_size=RX_SIZE,
+            pipeline_depth=pipeline_depth)
+        # The adapter opens the port in its own thread, possibly before
+        # anyone could connect to its renewed signal
+        open_deadline = monotonic() + 10
+        while not SerialAdapter.is_open(serial_adapter.serial):
+            if monotonic() > open_deadline:
+                raise RuntimeError("The serial did not open in time")
+            sleep(0.01)
+
+        sent: List[Instruction] = []
+        enqueued: Deque[Instruction] = deque()
+        serial_queue.reset_message_number()
+
+        started_at = monotonic()
+        cpu_started_at = process_time()
+        batch: List[Instruction] = []
+        for gcode in gcodes:
+            instruction = Instruction(gcode, to_checksum=True)
+            batch.append(instruction)
+            enqueued.append(instruction)
+            sent.append(instruction)
+            if len(batch) < PRINT_BATCH_SIZE:
+                continue
+            serial_queue.enqueue_list(batch, to_front=True)
+            batch = []
+            serial_queue.wait_for_confirmations(
+                enqueued, PRINT_QUEUE_SIZE + pipeline_depth - 1,
+                lambda: True)
+        serial_queue.enqueue_list(batch, to_front=True)
+        for instruction in enqueued:
+            wait_for_instruction(instruction)
+        cpu_time = process_time() - cpu_started_at
+        duration = monotonic() - started_at
+
+        serial_queue.stop()
+        serial_adapter.stop()
+        serial_parser.stop()
+        serial_queue.wait_stopped()
+        serial_adapter.wait_stopped()
+        serial_parser.wait_stopped()
+    printer.stop()
+
+    latencies = sorted(instruction.time_to_confirm for instruction in sent)
+    count = len(sent)
+    return {
+        "count": count,
+        "duration": duration,
+        "gcodes_per_second": count / duration if duration else 0,
+        "latency_p50_ms": percentile(latencies, 0.5) * 1000,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000,
+        "cpu_ms_per_1k": cpu_time / count * 1000 * 1000 if count else 0,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares the results with a baseline
+    :return: list of metric names which regressed more than tolerated
+    """
+    regressed = []
+    for name, value in results.items():
+        if name in {"count", "duration"} or name not in baseline:
+            continue
+        reference = baseline[name]
+        if name in HIGHER_IS_BETTER:
+            worse = value < reference * (1 - tolerance)
+        else:
+            worse = value > reference * (1 + tolerance)
+        if worse:
+            regressed.append(name)
+    return regressed
+
+
+def main():
+    """Parses the arguments, runs the benchmark and reports the results"""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--count", type=int, default=2000,
+                        help="how many gcodes to print")
+    parser.add_argument("--gcode", help="replay gcodes from this file")
+    parser.add_argument("--ok-latency", type=float, default=0.002,
+                        help="firmware processing time per instruction [s]")
+    parser.add_argument("--jitter", type=float, default=0.001,
+                        help="random addition to the processing time [s]")
+    parser.add_argument("--autoreport", type=float, default=1.0,
+                        help="temperature autoreport interval [s], 0 = off")
+    parser.add_argument("--busy-every", type=int, default=0,
+                        help="every Nth instruction reports busy")
+    parser.add_argument("--busy-time", type=float, default=0.0,
+                        help="how long the busy instructions take [s]")
+    parser.add_argument("--resend-rate", type=float, default=0.0,
+                        help="probability of a line getting corrupted")
+    parser.add_argument("--pipeline-depth", type=int, default=1,
+                        help="print instructions in flight at once")
+    parser.add_argument("--save", help="save the results as json")
+    parser.add_argument("--baseline", help="compare with saved results")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="allowed relative regression from baseline")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+    # A pseudo terminal has no modem lines, that is expected here
+    logging.getLogger("prusa.link.serial.serial").setLevel(logging.ERROR)
+
+    config = FakePrinterConfig(ok_latency=args.ok_latency,
+                               jitter=args.jitter,
+                               autoreport_interval=args.autoreport,
+                               busy_every=args.busy_every,
+                               busy_time=args.busy_time,
+                               resend_rate=args.resend_rate)
+    if args.gcode:
+        gcodes = file_gcodes(args.gcode, args.count)
+    else:
+        gcodes = synthetic_gcodes(args.count)
+
+    results = run(gcodes, config, args.pipeline_depth)
+    for name, value in results.items():
+        print(f"{name:>20}: {value:.3f}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            regressed = compare(results, json.load(file), args.tolerance)
+        if regressed:
+            print(f"Regressed: {', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+A simulated Einsy firmware living on the master side of a pseudo terminal
+
+Used by the serial benchmarks, it speaks just enough of the Prusa firmware
+serial protocol to keep the SerialQueue busy - numbered and checksummed
+lines, M110 message number resets, ok confirmations, busy messages,
+temperature autoreports and Error:/Resend: pairs for corrupted lines.
+"""
+import heapq
+import os
+import random
+import re
+import tty
+from multiprocessing import get_context
+from select import select
+from time import monotonic
+
+NUMBERED_REGEX = re.compile(r"^N(?P<number>\d+) (?P<gcode>.*)\*(?P<sum>\d+)$")
+M110_REGEX = re.compile(r"^M110 ?N(?P<number>-?\d*)$")
+
+TEMPERATURE_LINE = (b"T:215.0 /215.0 B:60.0 /60.0 T0:215.0 /215.0 @:42 "
+                    b"B@:31 P:36.1 A:38.6\n")
+BUSY_LINE = b"echo:busy: processing\n"
+
+
+class FakePrinterConfig:
+    """Knobs for the simulated firmware behaviour"""
+
+    # pylint: disable=too-many-arguments
+    def __init__(self,
+                 ok_latency: float = 0.002,
+                 jitter: float = 0.001,
+                 autoreport_interval: float = 1.0,
+                 busy_every: int = 0,
+                 busy_time: float = 0.0,
+                 resend_rate: float = 0.0,
+                 rx_size: int = 128,
+                 seed: int = 42):
+        """
+        :param ok_latency: how long it takes to process one instruction
+        :param jitter: uniformly distributed addition to the ok_latency
+        :param autoreport_interval: temperature autoreport period,
+            zero disables autoreporting
+        :param busy_every: every Nth instruction gets stuck in processing,
+            reporting busy until done. Zero means never
+        :param busy_time: how long the busy instructions take
+        :param resend_rate: probability of a numbered line being treated
+            as corrupted in transit
+        :param rx_size: size of the simulated firmware RX buffer,
+            lines that do not fit get corrupted
+        :param seed: random seed, so the runs are repeatable
+        """
+        self.ok_latency = ok_latency
+        self.jitter = jitter
+        self.autoreport_interval = autoreport_interval
+        self.busy_every = busy_every
+        self.busy_time = busy_time
+        self.resend_rate = resend_rate
+        self.rx_size = rx_size
+        self.seed = seed
+
+
+class FakePrinter:
+    """
+    Runs the simulated firmware in a separate process, so it does not
+    influence the CPU time measured in the process under test
+    """
+
+    def __init__(self, config: FakePrinterConfig) -> None:
+        self.config = config
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.master_fd)
+        self.port = os.ttyname(self.slave_fd)
+        self.process = get_context("fork").Process(target=self._run,
+                                                   name="fake_printer",
+                                                   daemon=True)
+
+        self.last_number = 0
+        self.processed = 0
+        # Times at which the firmware finishes the accepted lines
+        self.done_at = 0.0
+        # (start time, length) of lines sitting in the RX buffer
+        self.rx_buffer = []
+        # Scheduled output as (time, sequence, data)
+        self.output = []
+        self.sequence = 0
+        self.random = random.Random(config.seed)
+
+    def start(self):
+        """Starts the firmware process"""
+        self.process.start()
+
+    def stop(self):
+        """Kills the firmware process and closes the terminal"""
+        self.process.terminate()
+        self.process.join()
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+    def _schedule(self, at: float, data: bytes):
+        """Schedules data to be written at the specified time"""
+        self.sequence += 1
+        heapq.heappush(self.output, (at, self.sequence, data))
+
+    def _rx_fits(self, now, length):
+        """Returns whether a line of the given length fits the RX buffer"""
+        self.rx_buffer = [(start, size) for start, size in self.rx_buffer
+                          if start > now]
+        used = sum(size for _, size in self.rx_buffer)
+        return used + length <= self.config.rx_size
+
+    def _request_resend(self, at):
+        """Emits what the firmware does after receiving a broken line"""
+        self._schedule(at, f"Error:checksum mismatch, Last Line: "
+                           f"{self.last_number}\n".encode("ascii"))
+        self._schedule(at, f"Resend: {self.last_number + 1}\n"
+                           .encode("ascii"))
+        self._schedule(at, b"ok\n")
+
+    def _handle_line(self, now, raw_line: bytes):
+        """Parses and schedules a response to a line received from host"""
+        config = self.config
+        start = max(now, self.done_at)
+        fits = self._rx_fits(now, len(raw_line))
+        self.rx_buffer.append((start, len(raw_line)))
+
+        line = raw_line.decode("ascii", errors="replace").strip()
+        if not line:
+            return
+
+        gcode = line
+        if match := NUMBERED_REGEX.match(line):
+            checksum = 0
+            for byte in line[:line.rindex("*")].encode("ascii"):
+                checksum ^= byte
+            corrupted = (not fits
+                         or checksum != int(match.group("sum"))
+                         or self.random.random() < config.resend_rate)
+            if corrupted or \
+                    int(match.group("number")) != self.last_number + 1:
+                self._request_resend(start)
+                return
+            self.last_number = int(match.group("number"))
+            gcode = match.group("gcode").strip()
+
+        if m110_match := M110_REGEX.match(gcode):
+            number = m110_match.group("number")
+            self.last_number = int(number) if number else 0
+
+        duration = config.ok_latency + self.random.uniform(0, config.jitter)
+        self.processed += 1
+        if config.busy_every and self.processed % config.busy_every == 0:
+            self._schedule(start, BUSY_LINE)
+            duration += config.busy_time
+        self.done_at = start + duration
+        self._schedule(self.done_at, b"ok\n")
+
+    def _run(self):
+        """The firmware main loop"""
+        os.close(self.slave_fd)
+        config = self.config
+        buffer = bytearray()
+        next_report = monotonic() + config.autoreport_interval
+        while True:
+            now = monotonic()
+            while self.output and self.output[0][0] <= now:
+                os.write(self.master_fd, heapq.heappop(self.output)[2])
+            if config.autoreport_interval and next_report <= now:
+                os.write(self.master_fd, TEMPERATURE_LINE)
+                next_report = now + config.autoreport_interval
+
+            wake_at = [next_report] if config.autoreport_interval else []
+            if self.output:
+                wake_at.append(self.output[0][0])
+            timeout = max(0.0, min(wake_at) - now) if wake_at else None
+
+            readable, _, _ = select([self.master_fd], [], [], timeout)
+            if not readable:
+                continue
+            buffer += os.read(self.master_fd, 4096)
+            now = monotonic()
+            while (pos := buffer.find(b"\n")) >= 0:
+                raw_line = bytes(buffer[:pos + 1])
+                del buffer[:pos + 1]
+                self._handle_line(now, raw_line)
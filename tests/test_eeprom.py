@@ -0,0 +1,116 @@
+"""Tests for the merged EEPROM reads"""
+import struct
+
+import pytest
+
+from prusa.link.printer_adapter.eeprom import (  # type:ignore
+    EEPROMReader,
+    merge_ranges,
+)
+from prusa.link.printer_adapter.structures.model_classes import (  # type:ignore
+    EEPROMParams,
+)
+from prusa.link.printer_adapter.structures.regular_expressions import (  # type:ignore
+    D3_OUTPUT_REGEX,
+)
+
+EEPROM = bytearray(range(256)) * 16
+
+
+class FakePrinter:
+    """Answers D3 reads with hex dumps of the EEPROM above"""
+
+    def __init__(self):
+        self.gcodes = []
+
+    def do_multimatch(self, gcode, regex, to_front=False):
+        """Dumps 16 bytes per line, like the firmware does"""
+        assert to_front
+        self.gcodes.append(gcode)
+        address_part, count_part = gcode.split()[1:]
+        address = int(address_part[2:], 16)
+        count = int(count_part[1:])
+        matches = []
+        for line_address in range(address, address + count, 16):
+            line_count = min(16, address + count - line_address)
+            data = EEPROM[line_address:line_address + line_count]
+            line = f"{line_address:06x}  {data.hex(' ')}"
+            matches.append(regex.match(line))
+        return matches
+
+
+def test_merge_ranges():
+    """Ranges close enough get merged, overlapping ones too"""
+    assert merge_ranges([(100, 4), (0, 10), (10, 5), (12, 1)], 10) == \
+        [(0, 15), (100, 4)]
+    assert merge_ranges([(100, 4), (0, 10), (20, 1)], 10) == \
+        [(0, 21), (100, 4)]
+
+
+def test_lone_read():
+    """Nothing else waiting to be read means reading just the variable"""
+    printer = FakePrinter()
+    reader = EEPROMReader(printer.do_multimatch, lambda: [])
+    assert reader.read_param(EEPROMParams.PRINT_MODE) == EEPROM[0xFFF:0x1000]
+    reader.read_param(EEPROMParams.ACTIVE_SHEET)
+    reader.read_param(EEPROMParams.JOB_ID)
+    assert printer.gcodes == ["D3 AxFFF C1", "D3 AxDA1 C1", "D3 AxD05 C4"]
+
+    printer = FakePrinter()
+    EEPROMReader(printer.do_multimatch).read_param(EEPROMParams.JOB_ID)
+    assert printer.gcodes == ["D3 AxD05 C4"]
+
+
+def test_pending_reads_merge():
+    """The variables waiting to be read together take just two reads"""
+    printer = FakePrinter()
+    pending = {param.value for param in EEPROMParams}
+    reader = EEPROMReader(printer.do_multimatch, lambda: pending)
+    for param in EEPROMParams:
+        pending.discard(param.value)
+        address, count = param.value
+        assert reader.read_param(param) == EEPROM[address:address + count]
+    assert printer.gcodes == ["D3 AxD05 C157", "D3 AxF91 C111"]
+
+    total_print_time = reader.read_param(EEPROMParams.TOTAL_PRINT_TIME)
+    assert struct.unpack("<I", total_print_time)[0] == 0xF0EFEEED
+    assert len(printer.gcodes) == 2
+
+
+def test_merge_only_close():
+    """Pending variables too far away do not get merged"""
+    printer = FakePrinter()
+    reader = EEPROMReader(
+        printer.do_multimatch,
+        lambda: [EEPROMParams.ACTIVE_SHEET.value,
+                 EEPROMParams.PRINT_MODE.value])
+    reader.read_param(EEPROMParams.JOB_ID)
+    assert printer.gcodes == ["D3 AxD05 C4"]
+
+    reader = EEPROMReader(
+        printer.do_multimatch,
+        lambda: [EEPROMParams.ACTIVE_SHEET.value,
+                 EEPROMParams.SHEET_SETTINGS.value])
+    reader.read_param(EEPROMParams.JOB_ID)
+    assert printer.gcodes[-1] == "D3 AxD05 C157"
+
+
+def test_expiry():
+    """Old reads do not get served"""
+    printer = FakePrinter()
+    pending = [EEPROMParams.ACTIVE_SHEET.value]
+    reader = EEPROMReader(printer.do_multimatch, lambda: pending,
+                          max_age=-1)
+    reader.read_param(EEPROMParams.JOB_ID)
+    reader.read_param(EEPROMParams.ACTIVE_SHEET)
+    assert len(printer.gcodes) == 2
+    assert list(reader.cache) == [EEPROMParams.ACTIVE_SHEET.value]
+
+
+def test_short_output():
+    """Missing output gets refused"""
+    reader = EEPROMReader(
+        lambda gcode, regex, to_front: [regex.match("0d05  00 01")])
+    with pytest.raises(RuntimeError):
+        reader.read_param(EEPROMParams.JOB_ID)
+    assert D3_OUTPUT_REGEX.match("0d05  00 01")
@@ -0,0 +1,43 @@
+"""Tests for the serial printing of files"""
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+
+from prusa.link.printer_adapter.file_printer import (  # type:ignore
+    FilePrinter,
+)
+from prusa.link.serial.serial_queue import SerialQueue  # type:ignore
+
+from .util import FakeAdapter, FakeParser, wait_for
+
+
+@pytest.fixture(name="file_printer")
+def fixture_file_printer(tmp_path):
+    """A file printer sending into a pipelining serial queue"""
+    queue = SerialQueue(FakeAdapter(), FakeParser(),
+                        str(tmp_path / "threshold.data"),
+                        rx_size=1024, pipeline_depth=4)
+    cfg = Mock()
+    cfg.daemon.power_panic_file = str(tmp_path / "power_panic")
+    file_printer = FilePrinter(queue, FakeParser(), SimpleNamespace(), cfg)
+    file_printer.model.print_stats.has_inbuilt_stats = True
+    yield file_printer
+    queue.stop()
+    queue.wait_stopped()
+    # pylint: disable=protected-access
+    SerialQueue._MCSingleton__instance = None
+    FilePrinter._MCSingleton__instance = None
+
+
+def test_batch_fills_pipeline(file_printer):
+    """A flushed batch fills the serial pipeline without waiting
+    for the oks"""
+    for number in range(6):
+        file_printer.print_gcode(f"G1 X{number}")
+    file_printer.flush_batch()
+
+    queue = file_printer.serial_queue
+    wait_for(lambda: len(queue.in_flight) == queue.pipeline_depth)
+    assert list(queue.in_flight) == list(file_printer.data.enqueued)[:4]
+    assert len(queue.serial_adapter.written) == queue.pipeline_depth
@@ -0,0 +1,123 @@
+"""Tests for the pre-sanitized gcode stream sidecar"""
+import os
+
+from prusa.link.printer_adapter.gcode_stream import (  # type:ignore
+    CHECKPOINT_INTERVAL,
+    HEADER,
+    build_stream,
+    gcode_commands,
+    get_stream_path,
+    load_stream,
+    remove_stream,
+    text_commands,
+)
+
+LINES = 2 * CHECKPOINT_INTERVAL + 10
+
+
+def write_gcode(tmp_path):
+    """Writes a gcode with comments, empty lines and layer changes"""
+    path = str(tmp_path / "part.gcode")
+    with open(path, "w", encoding="utf-8") as gcode:
+        gcode.write("; generated by a test\n\n")
+        for number in range(LINES):
+            if number % 100 == 0:
+                gcode.write(";LAYER_CHANGE\n")
+            gcode.write(f"G1 X{number} ; move\n")
+        gcode.write("M73 P100\n")
+    return path
+
+
+def text_reference(path):
+    """The commands sanitized straight from the text"""
+    with open(path, "rb") as file:
+        return list(text_commands(file))
+
+
+def test_round_trip(tmp_path):
+    """The sidecar yields the same commands, positions and layer changes
+    as the text it got built from"""
+    path = write_gcode(tmp_path)
+    expected = text_reference(path)
+    build_stream(path)
+    assert os.path.exists(get_stream_path(path))
+
+    with load_stream(path) as stream:
+        assert stream.gcode_count == len(expected)
+        assert stream.has_inbuilt_stats
+        assert list(stream.commands()) == expected
+        assert len(stream.layers) == LINES // 100 + 1
+        assert len(stream.checkpoints) == \
+            len(expected) // CHECKPOINT_INTERVAL + 1
+
+
+def test_start(tmp_path):
+    """Starting from any gcode number, around the checkpoints too,
+    yields the rest of the commands"""
+    path = write_gcode(tmp_path)
+    expected = text_reference(path)
+    build_stream(path)
+    starts = [0, 1, CHECKPOINT_INTERVAL - 1, CHECKPOINT_INTERVAL,
+              CHECKPOINT_INTERVAL + 1, 2 * CHECKPOINT_INTERVAL + 5,
+              len(expected) - 1, len(expected), len(expected) + 1]
+    with load_stream(path) as stream:
+        for start in starts:
+            assert list(stream.commands(start)) == expected[start:]
+
+
+def test_text_fallback(tmp_path):
+    """Without a sidecar the text gets read and the sidecar written,
+    but only if all the commands went through"""
+    path = write_gcode(tmp_path)
+    expected = text_reference(path)
+
+    with gcode_commands(path) as commands:
+        assert next(commands) == expected[0]
+    assert not os.path.exists(get_stream_path(path))
+
+    with gcode_commands(path, start=5) as commands:
+        assert list(commands) == expected[5:]
+    assert os.path.exists(get_stream_path(path))
+
+    with gcode_commands(path, start=5) as commands:
+        assert list(commands) == expected[5:]
+
+
+def test_stale(tmp_path):
+    """A sidecar of a changed gcode does not get used"""
+    path = write_gcode(tmp_path)
+    build_stream(path)
+    with open(path, "a", encoding="utf-8") as gcode:
+        gcode.write("G28\n")
+    assert load_stream(path) is None
+
+    with gcode_commands(path) as commands:
+        assert list(commands) == text_reference(path)
+    assert load_stream(path) is not None
+
+
+def test_damaged(tmp_path):
+    """Truncated, foreign or missing sidecars do not get used"""
+    path = write_gcode(tmp_path)
+    assert load_stream(path) is None
+
+    build_stream(path)
+    stream_path = get_stream_path(path)
+    with open(stream_path, "rb") as file:
+        data = file.read()
+
+    with open(stream_path, "wb") as file:
+        file.write(data[:-1])
+    assert load_stream(path) is None
+
+    with open(stream_path, "wb") as file:
+        file.write(b"XXXX" + data[4:])
+    assert load_stream(path) is None
+
+    with open(stream_path, "wb") as file:
+        file.write(data[:HEADER.size - 1])
+    assert load_stream(path) is None
+
+    remove_stream(path)
+    assert not os.path.exists(stream_path)
+    remove_stream(path)
@@ -0,0 +1,32 @@
+"""Tests for the remembered printer identity"""
+from prusa.link.printer_adapter.identity_cache import (  # type:ignore
+    IdentityCache,
+)
+
+
+def test_identity_cache(tmp_path):
+    """Snapshots are kept per key, survive a new instance
+    and can be forgotten"""
+    path = str(tmp_path / "identity.json")
+    cache = IdentityCache(path)
+    assert cache.load("CZPX1234") is None
+
+    cache.save("CZPX1234", {"printer_type": 302, "sheet_settings": []})
+    cache.save("/dev/ttyAMA0", {"printer_type": 300})
+    cache = IdentityCache(path)
+    assert cache.load("CZPX1234") == {"printer_type": 302,
+                                      "sheet_settings": []}
+
+    cache.forget("CZPX1234")
+    assert cache.load("CZPX1234") is None
+    assert cache.load("/dev/ttyAMA0") == {"printer_type": 300}
+
+
+def test_broken_file(tmp_path):
+    """A broken file means nothing is remembered"""
+    path = tmp_path / "identity.json"
+    path.write_text("{not json", encoding="utf-8")
+    cache = IdentityCache(str(path))
+    assert cache.load("CZPX1234") is None
+    cache.save("CZPX1234", {"printer_type": 302})
+    assert cache.load("CZPX1234") == {"printer_type": 302}
@@ -11,6 +11,8 @@ from unittest.mock import Mock
 import pytest
 
 from prusa.link.printer_adapter.structures.item_updater import (  # type:ignore
+    LOCAL,
+    NETWORK,
     ItemUpdater,
     WatchedGroup,
     WatchedItem,
@@ -582,6 +584,143 @@ def test_disabling(updater_instance: ItemUpdater):
     assert item.invalidate_at == math.inf
 
 
+def test_seeding(updater_instance: ItemUpdater):
+    """
+    A seeded item is valid right away and keeps being valid, while its
+    value gets gathered again in the background. A disabled item gets
+    gathered once enabled
+    """
+    gather = WaitingMock(return_value=43)
+    write = EventSetMock()
+    invalidated = EventSetMock(spec={})
+    item = WatchedItem("item", gather_function=gather, write_function=write)
+    item.became_invalid_signal.connect(invalidated)
+    updater_instance.add_item(item, start_tracking=False)
+    updater_instance.disable(item)
+    group = WatchedGroup([item])
+
+    updater_instance.seed(item, 42)
+    assert item.valid and item.stale and group.valid
+    assert item.value == 42
+    write.assert_called_once_with(42)
+    write.reset_mock()
+
+    updater_instance.enable(item)
+    gather.event.set()
+    assert write.event.wait(THRESHOLD)
+    write.assert_called_once_with(43)
+    assert item.valid and not item.stale and group.valid
+    invalidated.assert_not_called()
+
+
+def test_seeding_failure(updater_instance: ItemUpdater):
+    """A seeded item that fails to gather becomes invalid"""
+    invalidated = EventSetMock(spec={})
+    item = WatchedItem("item",
+                       gather_function=Mock(side_effect=RuntimeError("Test")),
+                       on_fail_interval=None)
+    item.became_invalid_signal.connect(invalidated)
+    updater_instance.add_item(item, start_tracking=False)
+    group = WatchedGroup([item])
+
+    updater_instance.seed(item, 42)
+    assert invalidated.event.wait(THRESHOLD)
+    assert not item.valid and not item.stale and not group.valid
+
+
+def test_suspending(updater_instance: ItemUpdater):
+    """
+    A suspended item does not get invalidated, its scheduled invalidation
+    gets cancelled. The invalidation asked for meanwhile is done on resume
+    """
+    write = EventSetMock(spec={})
+    invalidated = EventSetMock(spec={})
+    item = WatchedItem("item",
+                       gather_function=Mock(return_value=42),
+                       write_function=write,
+                       interval=THRESHOLD)
+    item.became_invalid_signal.connect(invalidated)
+    updater_instance.add_item(item)
+    assert write.event.wait(THRESHOLD)
+
+    updater_instance.suspend(item)
+    assert not invalidated.event.wait(THRESHOLD * 2)
+    updater_instance.invalidate(item)
+    assert item.valid and item.deferred
+    invalidated.assert_not_called()
+
+    write.reset_mock()
+    updater_instance.resume(item)
+    assert invalidated.event.wait(THRESHOLD)
+    assert write.event.wait(THRESHOLD)
+    assert item.valid and not item.deferred
+
+
+def test_resource_classes(updater_instance: ItemUpdater):
+    """A slow serial gather does not hold up a local one"""
+    serial_gather = WaitingMock(return_value=42)
+    serial_item = WatchedItem("serial_item", gather_function=serial_gather)
+    local_write = EventSetMock(spec={})
+    local_item = WatchedItem("local_item",
+                             gather_function=Mock(return_value=42),
+                             write_function=local_write,
+                             resource=LOCAL)
+    updater_instance.add_item(serial_item)
+    updater_instance.add_item(local_item)
+
+    assert local_write.event.wait(THRESHOLD)
+    assert local_item.valid and not serial_item.valid
+    serial_gather.event.set()
+
+
+def test_unknown_resource(updater_instance: ItemUpdater):
+    """Items of unknown resource classes are refused"""
+    item = WatchedItem("item", resource="whatever")
+    with pytest.raises(ValueError):
+        updater_instance.add_item(item)
+
+
+def test_one_gather_at_a_time():
+    """Even with more refreshers, an item is gathered by one at a time"""
+    updater = ItemUpdater(concurrency={NETWORK: 2})
+    updater.start()
+    gather = WaitingMock(return_value=42)
+    write = EventSetMock(spec={})
+    item = WatchedItem("item", gather_function=gather,
+                       write_function=write, resource=NETWORK)
+    updater.add_item(item)
+    sleep(THRESHOLD)
+    updater.invalidate(item)
+    sleep(THRESHOLD)
+    gather.assert_called_once()
+
+    # The invalidation during the gather gets processed after it
+    gather.event.set()
+    assert write.event.wait(THRESHOLD)
+    sleep(THRESHOLD)
+    assert gather.call_count == 1
+    updater.stop()
+
+
+def test_lazy_refreshers():
+    """Resource classes without items do not get refresher threads,
+    the ones added after the start get them started right away"""
+    updater = ItemUpdater()
+    updater.add_item(WatchedItem("serial"))
+    updater.start()
+    assert list(updater.refresher_threads) == ["serial"]
+    assert updater.refresher_threads["serial"][0].name == "polling"
+
+    write = EventSetMock(spec={})
+    item = WatchedItem("local", gather_function=lambda: 42,
+                       write_function=write, resource=LOCAL)
+    updater.add_item(item)
+    assert write.event.wait(THRESHOLD)
+    assert NETWORK not in updater.refresher_threads
+    updater.stop()
+    updater.wait_stopped()
+
+
 def test_group_updating(updater_instance: ItemUpdater):
     """
     Test a bug, where if a became_valid handler invalidated the same item
@@ -0,0 +1,81 @@
+"""Tests for the sendfile of the web server handler"""
+# pylint:disable=redefined-outer-name
+
+from threading import Thread
+from urllib.request import urlopen
+from wsgiref.simple_server import make_server
+
+import pytest
+from poorwsgi import Application  # type:ignore
+from poorwsgi.response import FileResponse, Response  # type:ignore
+
+from prusa.link.web.lib.classes import (  # type:ignore
+    LinkHandler,
+    RequestHandler,
+    ThreadingServer,
+)
+
+IMAGE = bytes(range(256)) * 1000
+
+
+@pytest.fixture
+def server(request, tmp_path, monkeypatch):
+    """A server answering with a file and with bytes, recording what
+    the sendfile did"""
+    image_path = str(tmp_path / "image.png")
+    with open(image_path, "wb") as image_file:
+        image_file.write(IMAGE)
+
+    sent = []
+    sendfile = LinkHandler.sendfile
+
+    def recording_sendfile(handler):
+        result = sendfile(handler)
+        sent.append(result)
+        return result
+
+    monkeypatch.setattr(LinkHandler, "sendfile", recording_sendfile)
+
+    # The application names have to be unique
+    application = Application(request.node.name)
+
+    @application.route("/file")
+    def file(_):
+        return FileResponse(image_path, content_type="image/png",
+                            headers={"ETag": '"image"'})
+
+    @application.route("/bytes")
+    def data(_):
+        return Response(IMAGE, content_type="image/png")
+
+    httpd = make_server("127.0.0.1", 0, application,
+                        server_class=ThreadingServer,
+                        handler_class=RequestHandler)
+    thread = Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}", sent
+    httpd.shutdown()
+    thread.join()
+    httpd.server_close()
+
+
+def test_sendfile(server):
+    """Files go out by sendfile, with the headers of the response"""
+    url, sent = server
+    with urlopen(f"{url}/file") as response:
+        body = response.read()
+        headers = response.headers
+    assert sent == [True]
+    assert body == IMAGE
+    assert headers["Content-Length"] == str(len(IMAGE))
+    assert headers["Content-Type"] == "image/png"
+    assert headers["ETag"] == '"image"'
+
+
+def test_no_file(server):
+    """Other responses get written the usual way"""
+    url, sent = server
+    with urlopen(f"{url}/bytes") as response:
+        assert response.read() == IMAGE
+        assert response.headers["Content-Length"] == str(len(IMAGE))
+    assert True not in sent
@@ -0,0 +1,77 @@
+"""Tests for the metadata index"""
+import os
+
+from prusa.link.printer_adapter.metadata_index import (  # type:ignore
+    MetadataIndex,
+)
+
+from .util import wait_for
+
+GCODE = """; thumbnail begin 16x16 1
+; iVBORw0K
+; thumbnail end
+G28
+; filament_type = PETG
+; layer_height = 0.2
+"""
+
+
+def test_index(tmp_path):
+    """Files get indexed in the background and stay indexed until
+    they change, the index survives a restart"""
+    gcodes = tmp_path / "gcodes"
+    gcodes.mkdir()
+    gcode = gcodes / "part_0.2mm_PETG.gcode"
+    gcode.write_text(GCODE, encoding="utf-8")
+    index_path = str(tmp_path / "index.json")
+
+    index = MetadataIndex(index_path)
+    index.start()
+    try:
+        assert index.lookup(str(gcode)) is None
+        wait_for(lambda: index.get(str(gcode)) is not None)
+        entry = index.get(str(gcode))
+        assert entry.data["filament_type"] == "PETG"
+        assert entry.data["layer_height"] == 0.2
+        wait_for(lambda: os.path.exists(index_path))
+    finally:
+        index.stop()
+        index.wait_stopped()
+
+    index = MetadataIndex(index_path)
+    assert index.get(str(gcode)) == entry
+
+    with open(gcode, "a", encoding="utf-8") as file:
+        file.write("G1 X10\n")
+    assert index.get(str(gcode)) is None
+
+
+def test_scan(tmp_path):
+    """The scan indexes the print files, skips the hidden and other ones
+    and forgets the ones that are gone, telling about them"""
+    for name in ("a.gcode", "b.gco", ".hidden.gcode", "notes.txt"):
+        (tmp_path / name).write_text(GCODE, encoding="utf-8")
+    index = MetadataIndex(str(tmp_path / ".index.json"))
+    forgotten = []
+    index.forgotten_signal.connect(
+        lambda _, path: forgotten.append(os.path.basename(path)), weak=False)
+    index.start()
+    try:
+        index.scan(str(tmp_path))
+        wait_for(lambda: not index.pending)
+        assert sorted(os.path.basename(path) for path in index.entries) \
+            == ["a.gcode", "b.gco"]
+
+        os.unlink(tmp_path / "a.gcode")
+        index.scan(str(tmp_path))
+        wait_for(lambda: not index.pending)
+        assert [os.path.basename(path) for path in index.entries] \
+            == ["b.gco"]
+        assert forgotten == ["a.gcode"]
+
+        index.forget(str(tmp_path))
+        assert not index.entries
+        assert forgotten == ["a.gcode", "b.gco"]
+    finally:
+        index.stop()
+        index.wait_stopped()
@@ -0,0 +1,87 @@
+"""Tests for the latency histograms"""
+from prusa.link.metrics import (  # type:ignore
+    BUCKET_BOUNDS,
+    GAUGES,
+    HISTOGRAMS,
+    LatencyHistogram,
+    gauge,
+    gauges_dict,
+    histogram,
+)
+
+
+def test_bucket_boundaries():
+    """The bounds are inclusive upper bounds, anything above the last
+    one goes into the overflow bucket"""
+    latency = LatencyHistogram("test")
+    latency.record(0)
+    latency.record(BUCKET_BOUNDS[0])
+    latency.record(BUCKET_BOUNDS[3])
+    latency.record(BUCKET_BOUNDS[3] * 1.01)
+    latency.record(BUCKET_BOUNDS[-1] * 2)
+    assert latency.counts[0] == 2
+    assert latency.counts[3] == 1
+    assert latency.counts[4] == 1
+    assert latency.counts[-1] == 1
+    assert sum(latency.counts) == latency.count == 5
+
+
+def test_empty():
+    """An empty histogram has zeroes everywhere"""
+    assert LatencyHistogram("test").to_dict() == {
+        "count": 0,
+        "mean_ms": 0,
+        "max_ms": 0.0,
+        "p50_ms": 0.0,
+        "p90_ms": 0.0,
+        "p99_ms": 0.0,
+        "buckets": [],
+    }
+
+
+def test_single_sample():
+    """The percentiles of a single sample are capped by its value,
+    not reported as the bucket bound above it"""
+    latency = LatencyHistogram("test")
+    latency.record(0.003)
+    result = latency.to_dict()
+    assert result["count"] == 1
+    assert result["mean_ms"] == result["max_ms"] == 3.0
+    assert result["p50_ms"] == result["p99_ms"] == 3.0
+    assert result["buckets"] == [[4.096, 1]]
+
+
+def test_percentiles():
+    """The percentiles are the upper bounds of the buckets they fall in,
+    the overflow bucket reports the maximum"""
+    latency = LatencyHistogram("test")
+    for _ in range(90):
+        latency.record(0.0001)
+    for _ in range(9):
+        latency.record(0.01)
+    latency.record(100)
+    assert latency.percentile(0.5) == BUCKET_BOUNDS[7]
+    assert latency.percentile(0.9) == BUCKET_BOUNDS[7]
+    assert latency.percentile(0.95) == BUCKET_BOUNDS[14]
+    assert latency.percentile(0.99) == BUCKET_BOUNDS[14]
+    assert latency.percentile(1) == 100
+
+    result = latency.to_dict()
+    assert result["p50_ms"] == BUCKET_BOUNDS[7] * 1000
+    assert result["p99_ms"] == BUCKET_BOUNDS[14] * 1000
+    assert [count for _, count in result["buckets"]] == [90, 9, 1]
+    assert result["buckets"][-1][0] == float("inf")
+
+    latency.reset()
+    assert latency.to_dict()["count"] == 0
+
+
+def test_registries():
+    """Histograms get shared by name, gauges get read when asked for"""
+    try:
+        assert histogram("test_shared") is histogram("test_shared")
+        gauge("test_gauge", lambda: 42)
+        assert gauges_dict()["test_gauge"] == 42
+    finally:
+        HISTOGRAMS.pop("test_shared", None)
+        GAUGES.pop("test_gauge", None)
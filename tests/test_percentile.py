@@ -0,0 +1,42 @@
+"""Tests of the binned sliding window percentile"""
+import random
+
+from prusa.link.printer_adapter.structures.percentile import (  # type:ignore
+    BinnedPercentile,
+)
+
+
+def exact_percentile(values, ratio):
+    """The value at the same rank the BinnedPercentile uses"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+def test_empty():
+    """Without values, the percentile is infinite"""
+    assert BinnedPercentile(size=10, ratio=0.5, max_value=1).get() == \
+        float("inf")
+
+
+def test_sliding_window():
+    """The percentile follows the latest values within the bin width"""
+    rng = random.Random(42)
+    percentile = BinnedPercentile(size=500, ratio=0.95, max_value=1.0)
+    values = []
+    for i in range(3000):
+        # Shift the distribution half way through, so eviction matters
+        value = rng.uniform(0, 0.2) if i < 1500 else rng.uniform(0.3, 0.9)
+        values.append(value)
+        percentile.add(value)
+        window = values[-500:]
+        assert len(percentile) == len(window)
+        assert abs(percentile.get() - exact_percentile(window, 0.95)) <= \
+            percentile.bin_width
+
+
+def test_out_of_range():
+    """Values outside of the range end up in the edge bins"""
+    percentile = BinnedPercentile(size=4, ratio=0.5, max_value=1.0, bins=10)
+    for value in (-1, 5, 7, 9):
+        percentile.add(value)
+    assert 0.9 <= percentile.get() <= 1.0
@@ -0,0 +1,147 @@
+"""Tests for the printer polling"""
+
+# pylint:disable=redefined-outer-name
+
+import json
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+from prusa.connect.printer.const import State  # type:ignore
+
+from prusa.link.const import (  # type:ignore
+    FAST_POLL_INTERVAL,
+    SLOW_POLL_INTERVAL,
+)
+from prusa.link.printer_adapter.polling_profiles import (  # type:ignore
+    ERROR,
+    IDLE,
+    PAUSED,
+    SD_PRINTING,
+    SERIAL_PRINTING,
+    profile_for_state,
+)
+from prusa.link.printer_adapter.printer_polling import (  # type:ignore
+    PrinterPolling,
+)
+
+SNAPSHOT = {
+    "printer_type": 302,
+    "serial_number": "CZPX0000X000XC00000",
+    "mmu_connected": False,
+    "firmware_version": "3.14.0",
+    "nozzle_diameter": 0.4,
+    "sheet_settings": [],
+    "active_sheet": 0,
+}
+
+
+@pytest.fixture
+def polling(tmp_path):
+    """A printer polling not talking to anything, its items are not
+    gathered, as the item updater does not get started"""
+    identity_file = str(tmp_path / "identity.json")
+    printer = Mock(sn=None, fingerprint=None, type=None)
+    model = Mock()
+    model.serial_adapter.using_port = None
+    return PrinterPolling(Mock(), Mock(), printer, model, Mock(), Mock(),
+                          Mock(), identity_file=identity_file)
+
+
+def remember(polling, key):
+    """Puts the identity snapshot into the cache for the key"""
+    with open(polling.identity_cache.path, "w", encoding="utf-8") as file:
+        json.dump({key: SNAPSHOT}, file)
+
+
+def test_seed_identity(polling):
+    """The identity remembered for the USB serial number gets seeded
+    once the printer type is known, except the values written to the SDK
+    just once"""
+    remember(polling, "USB0001")
+    polling.model.serial_adapter.using_port = SimpleNamespace(
+        sn="USB0001", path="/dev/ttyACM0")
+    polling.invalidate_printer_info()
+    assert not any(item.valid for item in polling.identity)
+
+    polling.item_updater.set_value(polling.printer_type, 302)
+    assert polling.firmware_version.valid
+    assert polling.firmware_version.stale
+    assert polling.firmware_version.value == "3.14.0"
+    assert polling.nozzle_diameter.value == 0.4
+    assert not polling.serial_number.valid
+    assert polling.printer.sn is None
+    assert polling.printer.fingerprint is None
+
+
+def test_no_seed_for_port_path(polling):
+    """Another printer can get connected to the same port,
+    so nothing gets seeded without a USB serial number"""
+    remember(polling, "/dev/ttyAMA0")
+    polling.model.serial_adapter.using_port = SimpleNamespace(
+        sn=None, path="/dev/ttyAMA0")
+    polling.invalidate_printer_info()
+    polling.item_updater.set_value(polling.printer_type, 302)
+
+    assert not any(item.valid for item in polling.identity)
+
+
+@pytest.mark.parametrize("state, serial_printing, profile", [
+    (State.IDLE, False, IDLE),
+    (State.READY, False, IDLE),
+    (State.PRINTING, False, SD_PRINTING),
+    (State.PRINTING, True, SERIAL_PRINTING),
+    (State.PAUSED, True, PAUSED),
+    (State.ATTENTION, False, ERROR),
+    (State.ERROR, True, ERROR),
+])
+def test_profile_for_state(state, serial_printing, profile):
+    """Serial prints poll the print state less, the errors leave
+    the printer alone"""
+    assert profile_for_state(state, serial_printing) is profile
+
+
+def test_profiles():
+    """The printing profiles stop the identity reads and suspend
+    the statistics"""
+    for profile in (SD_PRINTING, SERIAL_PRINTING, ERROR):
+        assert profile.intervals["sheet_settings"] is None
+        assert "total_print_time" in profile.suspended
+    assert SERIAL_PRINTING.intervals["print_state"] == SLOW_POLL_INTERVAL
+    assert SD_PRINTING.intervals["print_state"] == FAST_POLL_INTERVAL
+    assert "mbl" in ERROR.suspended
+    assert not IDLE.suspended and not PAUSED.suspended
+
+
+def test_print_and_back(polling):
+    """Printing re-tunes the intervals and suspends the statistics,
+    the idle state restores the intervals and refreshes the statistics
+    invalidated meanwhile"""
+    assert polling.profile is IDLE
+    # The printer is known, the telemetry gets polled
+    for item in polling.telemetry:
+        polling.item_updater.enable(item)
+    items = {item.name: item for item in polling.item_updater.items}
+    idle_intervals = {name: items[name].interval
+                      for name in SD_PRINTING.intervals}
+
+    polling.state_changed(State.PRINTING, serial_printing=True)
+    assert polling.profile is SERIAL_PRINTING
+    assert polling.sheet_settings.interval is None
+    assert polling.print_state.interval == SLOW_POLL_INTERVAL
+    assert polling.total_filament.suspended
+    assert polling.total_print_time.suspended
+    assert not polling.mbl.suspended
+
+    polling.item_updater.invalidate(polling.total_print_time)
+    assert polling.total_print_time.deferred
+    polling.state_changed(State.PRINTING, serial_printing=True)
+
+    polling.state_changed(State.IDLE, serial_printing=False)
+    assert polling.profile is IDLE
+    assert {name: items[name].interval
+            for name in SD_PRINTING.intervals} == idle_intervals
+    assert not polling.total_filament.suspended
+    assert not polling.total_print_time.suspended
+    assert not polling.total_print_time.deferred
+    assert polling.total_print_time.scheduled
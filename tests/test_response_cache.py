@@ -0,0 +1,39 @@
+"""Tests for the generation stamped response cache"""
+from poorwsgi.headers import Headers  # type:ignore
+
+from prusa.link.web.lib.response_cache import (  # type:ignore
+    SnapshotCache,
+    etag_matches,
+    generation_etag,
+)
+
+
+def test_snapshot_cache():
+    """The snapshot gets built once per generation"""
+    calls = []
+    cache = SnapshotCache(lambda: {"built": len(calls.append(1) or calls)})
+    assert cache.get(0) == {"built": 1}
+    assert cache.get(0) == {"built": 1}
+    assert cache.get(1) == {"built": 2}
+
+
+def test_etag():
+    """The tag changes with the generation and with the live parts"""
+    etag = generation_etag(1, {"transfer": {"progress": 10}})
+    assert etag.startswith('W/"')
+    assert etag == generation_etag(1, {"transfer": {"progress": 10}})
+    assert etag != generation_etag(2, {"transfer": {"progress": 10}})
+    assert etag != generation_etag(1, {"transfer": {"progress": 20}})
+    assert generation_etag(1) != generation_etag(2)
+
+
+def test_etag_matches():
+    """If-None-Match can list more tags, the weak prefix is ignored"""
+    etag = generation_etag(3)
+    assert not etag_matches(Headers(), etag)
+    assert etag_matches(Headers({"If-None-Match": etag}), etag)
+    assert etag_matches(
+        Headers({"If-None-Match": f'"x", {etag.removeprefix("W/")}'}), etag)
+    assert etag_matches(Headers({"If-None-Match": "*"}), etag)
+    assert not etag_matches(
+        Headers({"If-None-Match": generation_etag(4)}), etag)
@@ -0,0 +1,149 @@
+"""Tests for the serial queue traffic class scheduler"""
+import re
+from time import time
+
+import pytest
+
+from prusa.link.serial.instruction import (  # type:ignore
+    Instruction,
+    MandatoryMatchableInstruction,
+)
+from prusa.link.serial.scheduler import (  # type:ignore
+    COSMETIC,
+    POLLING,
+    Scheduler,
+)
+
+
+def make_instruction(message, to_checksum=False, traffic_class=None):
+    """Creates an instruction as if enqueued right now"""
+    instruction = Instruction(message, to_checksum=to_checksum,
+                              traffic_class=traffic_class)
+    instruction.enqueued_at = time()
+    return instruction
+
+
+def pop_all(scheduler):
+    """Pops everything, returns the messages in the popped order"""
+    messages = []
+    while scheduler:
+        assert scheduler.peek() is not None
+        messages.append(scheduler.pop().message)
+    assert scheduler.pop() is None
+    return messages
+
+
+def test_order():
+    """Print and interactive traffic share their order, ahead of polling
+    and polling goes before the cosmetic traffic"""
+    scheduler = Scheduler(lambda: False, lambda: None)
+    scheduler.add(make_instruction("M117 Hi", traffic_class=COSMETIC))
+    scheduler.add(make_instruction("M27"))
+    scheduler.add(make_instruction("G1 X1", to_checksum=True), to_front=True)
+    scheduler.add(make_instruction("M601"), to_front=True)
+    scheduler.add(make_instruction("G1 X2", to_checksum=True), to_front=True)
+    assert pop_all(scheduler) == ["G1 X1", "M601", "G1 X2", "M27", "M117 Hi"]
+
+
+def test_yield():
+    """The planner being fed lets one less important instruction through"""
+    fed = [True]
+
+    def yielded():
+        fed[0] = False
+
+    scheduler = Scheduler(lambda: fed[0], yielded)
+    scheduler.add(make_instruction("M27"))
+    scheduler.add(make_instruction("D3"))
+    scheduler.add(make_instruction("G1 X1", to_checksum=True), to_front=True)
+    scheduler.add(make_instruction("G1 X2", to_checksum=True), to_front=True)
+    assert scheduler.peek().message == "M27"
+    assert scheduler.pop().message == "M27"
+    assert not fed[0]
+    assert pop_all(scheduler) == ["G1 X1", "G1 X2", "D3"]
+
+
+def test_deadline():
+    """Overdue polling goes ahead of printing, but only within its budget"""
+    scheduler = Scheduler(lambda: False, lambda: None)
+    polling = scheduler.traffic_classes[POLLING]
+    for message in ("M27", "D3"):
+        instruction = make_instruction(message)
+        instruction.enqueued_at -= polling.deadline + 1
+        scheduler.add(instruction)
+    for number in range(3):
+        scheduler.add(make_instruction(f"G1 X{number}", to_checksum=True),
+                      to_front=True)
+    assert pop_all(scheduler) == ["M27", "G1 X0", "G1 X1", "G1 X2", "D3"]
+
+
+def test_remove():
+    """Removal of print instructions keeps the rest in order"""
+    scheduler = Scheduler(lambda: False, lambda: None)
+    scheduler.add(make_instruction("G1 X1", to_checksum=True), to_front=True)
+    scheduler.add(make_instruction("M603"), to_front=True)
+    scheduler.add(make_instruction("G1 X2", to_checksum=True), to_front=True)
+    scheduler.add(make_instruction("M27"))
+    assert scheduler.peek().message == "G1 X1"
+    scheduler.remove(lambda instruction: instruction.to_checksum)
+    assert pop_all(scheduler) == ["M603", "M27"]
+
+
+def test_unknown_class():
+    """Unknown traffic classes are refused"""
+    scheduler = Scheduler(lambda: False, lambda: None)
+    with pytest.raises(ValueError):
+        scheduler.add(make_instruction("M27", traffic_class="whatever"))
+
+
+def make_query(message, coalesce=True):
+    """Creates a matchable query as if enqueued right now"""
+    instruction = MandatoryMatchableInstruction(
+        message, capture_matching=re.compile(r"(?P<value>\d+)"),
+        coalesce=coalesce)
+    instruction.enqueued_at = time()
+    return instruction
+
+
+def test_coalescing():
+    """Identical pending queries get sent once and share the output"""
+    scheduler = Scheduler(lambda: False, lambda: None)
+    first = make_query("M27 P")
+    second = make_query("M27 P")
+    other = make_query("M73")
+    scheduler.add(first)
+    scheduler.add(other)
+    scheduler.add(second)
+    assert len(scheduler) == 2
+    assert scheduler.coalesced == 1
+
+    sent = scheduler.pop()
+    assert sent is first
+    sent.sent()
+    sent.output_captured(scheduler, re.match(r"(?P<value>\d+)", "42"))
+    assert sent.confirm()
+    assert second.is_confirmed()
+    assert second.match().group("value") == "42"
+
+
+def test_coalescing_forced():
+    """A forced confirmation gets passed to the coalesced queries too"""
+    scheduler = Scheduler(lambda: False, lambda: None)
+    first = make_query("M27 P")
+    second = make_query("M27 P")
+    scheduler.add(first)
+    scheduler.add(second)
+    sent = scheduler.pop()
+    sent.sent()
+    assert sent.confirm(force=True)
+    assert second.is_confirmed()
+
+
+def test_not_coalescing():
+    """Instructions not allowed to be coalesced get sent every time"""
+    scheduler = Scheduler(lambda: False, lambda: None)
+    scheduler.add(make_query("G28", coalesce=False))
+    scheduler.add(make_query("G28", coalesce=False))
+    scheduler.add(make_instruction("M27"))
+    scheduler.add(make_instruction("M27"))
+    assert pop_all(scheduler) == ["G28", "G28", "M27", "M27"]
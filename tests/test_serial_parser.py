@@ -1,8 +1,13 @@
 """Tests for the serial parser component"""
 import re
+from threading import Event
 from unittest.mock import Mock
 
-from prusa.link.serial.serial_parser import SerialParser  # type:ignore
+from prusa.link.serial.serial_parser import (  # type:ignore
+    SerialParser,
+    ThreadedSerialParser,
+    first_chars,
+)
 
 # pylint: disable=protected-access
 
@@ -91,3 +96,142 @@ def test_bump_priority():
     assert handler3.call_args.kwargs["match"].group("a") == "Hello"
     assert handler1.call_args.kwargs["match"].group("a") == "Hello"
     SerialParser._MCSingleton__instance = None
+
+
+def test_first_chars():
+    """The dispatch table buckets regexps by the characters they start
+    with, those it cannot figure out go everywhere"""
+    assert first_chars(re.compile(r"^ok")) == {"o"}
+    assert first_chars(re.compile(r"^(ok.*)|(Done)$")) == {"o", "D"}
+    assert first_chars(re.compile(r"^(// ?)?action")) == {"/", "a"}
+    assert first_chars(re.compile(r"^[A-C]x")) == {"A", "B", "C"}
+    assert first_chars(re.compile(r"^(?P<code>\d{3,5})$")) is None
+    assert first_chars(re.compile(r"x?")) is None
+    assert first_chars(re.compile(r"(?i)ok")) is None
+
+
+def test_wildcard_priority():
+    """
+    A regexp which can match any line has to keep its place in the priority
+    order against the ones bucketed by their first character
+    """
+    any_regex = re.compile(r"(?P<a>.*)")
+    hello_regex = re.compile(r"(?P<a>Hello)")
+    any_handler = Mock()
+    hello_handler = Mock()
+    parser = SerialParser()
+
+    parser.add_handler(hello_regex, hello_handler, 1)
+    parser.add_handler(any_regex, any_handler, 2)
+    parser.decide("Hello")
+    any_handler.assert_called_once()
+    hello_handler.assert_not_called()
+
+    parser.remove_handler(any_regex, any_handler)
+    parser.decide("Hello")
+    hello_handler.assert_called_once()
+
+    parser.add_handler(any_regex, any_handler, 0)
+    parser.decide("Hello")
+    parser.decide("")
+    hello_handler.assert_called()
+    assert hello_handler.call_count == 2
+    assert any_handler.call_count == 2
+    assert any_handler.call_args.kwargs["match"].group("a") == ""
+    SerialParser._MCSingleton__instance = None
+
+
+def test_equal_priority_order():
+    """Pairings with the same priority keep their order in the buckets"""
+    wide_regex = re.compile(r"(?P<a>H.*)")
+    hello_regex = re.compile(r"(?P<a>Hello)")
+    wide_handler = Mock()
+    hello_handler = Mock()
+    parser = SerialParser()
+
+    parser.add_handler(hello_regex, hello_handler)
+    parser.add_handler(wide_regex, wide_handler)
+    parser.decide("Hello")
+    hello_handler.assert_called_once()
+    wide_handler.assert_not_called()
+    SerialParser._MCSingleton__instance = None
+
+
+def test_decoupled_keys():
+    """Handlers with different keys do not wait for each other,
+    the ones with the same key keep the order of their lines"""
+    slow_regex = re.compile(r"slow")
+    number_regex = re.compile(r"(?P<number>\d+)")
+    release = Event()
+    numbers_done = Event()
+    numbers = []
+
+    def number_handler(sender, match):
+        assert sender is not None
+        numbers.append(int(match.group("number")))
+        if len(numbers) == 100:
+            numbers_done.set()
+
+    parser = ThreadedSerialParser(workers=2)
+    parser.add_decoupled_handler(slow_regex,
+                                 lambda sender, match: release.wait(5),
+                                 key="slow")
+    parser.add_decoupled_handler(number_regex, number_handler, key="numbers")
+
+    parser.decide("slow")
+    for number in range(100):
+        parser.decide(str(number))
+    assert numbers_done.wait(5)
+    assert numbers == list(range(100))
+    assert parser.queue_depth == 0
+
+    release.set()
+    parser.stop()
+    parser.wait_stopped()
+    ThreadedSerialParser._MCSingleton__instance = None
+
+
+def test_coalescing():
+    """A coalescing handler gets called just with the newest match,
+    if the ones before could not get handled in time"""
+    slow_regex = re.compile(r"slow")
+    number_regex = re.compile(r"(?P<number>\d+)")
+    slow_started = Event()
+    release = Event()
+    number_done = Event()
+    numbers = []
+
+    def number_handler(sender, match):
+        assert sender is not None
+        numbers.append(int(match.group("number")))
+        number_done.set()
+
+    def slow_handler(sender, match):
+        assert sender is not None
+        slow_started.set()
+        release.wait(5)
+
+    parser = ThreadedSerialParser(workers=1)
+    parser.add_decoupled_handler(slow_regex, slow_handler)
+    parser.add_decoupled_handler(number_regex, number_handler,
+                                 coalesce=True)
+
+    parser.decide("slow")
+    assert slow_started.wait(5)
+    for number in range(100):
+        parser.decide(str(number))
+    assert parser.queue_depth == 1
+    assert parser.coalesced_lines == 99
+
+    release.set()
+    assert number_done.wait(5)
+    assert numbers == [99]
+
+    number_done.clear()
+    parser.decide("100")
+    assert number_done.wait(5)
+    assert numbers == [99, 100]
+
+    parser.stop()
+    parser.wait_stopped()
+    ThreadedSerialParser._MCSingleton__instance = None
@@ -0,0 +1,175 @@
+"""Tests for the pipelined sending of the serial queue"""
+import pytest
+
+from prusa.link.printer_adapter.structures.regular_expressions import (  # type:ignore
+    CONFIRMATION_REGEX,
+    RESEND_REGEX,
+)
+from prusa.link.serial.instruction import Instruction  # type:ignore
+from prusa.link.serial.serial_queue import SerialQueue  # type:ignore
+
+from .util import FakeAdapter, FakeParser, wait_for
+
+
+@pytest.fixture(name="queue")
+def fixture_queue(tmp_path):
+    """A pipelining serial queue, sending only when the test says so"""
+    queue = SerialQueue(FakeAdapter(), FakeParser(),
+                        str(tmp_path / "threshold.data"),
+                        rx_size=1024, pipeline_depth=4)
+    queue.block_sending()
+    yield queue
+    queue.stop()
+    queue.wait_stopped()
+    # pylint: disable=protected-access
+    SerialQueue._MCSingleton__instance = None
+
+
+def send_all(queue):
+    """Sends as much as the pipeline allows"""
+    # pylint: disable=protected-access
+    with queue.write_lock:
+        while queue.can_write():
+            queue._send()
+
+
+def ok(queue):
+    """The printer confirms"""
+    # pylint: disable=protected-access
+    queue._confirmation_handler(queue, CONFIRMATION_REGEX.match("ok"))
+
+
+def resend(queue, number):
+    """The printer asks for a resend"""
+    # pylint: disable=protected-access
+    queue._resend_handler(queue, RESEND_REGEX.match(f"Resend: {number}"))
+
+
+def gcodes(count):
+    """Print instructions"""
+    return [Instruction(f"G1 X{number}", to_checksum=True)
+            for number in range(count)]
+
+
+def test_pipelining(queue):
+    """Print instructions get sent without waiting for the oks,
+    the oks confirm them in order"""
+    instructions = gcodes(6)
+    queue.enqueue_list(instructions)
+    send_all(queue)
+    assert list(queue.in_flight) == instructions[:4]
+    assert [data.split()[0] for data in queue.serial_adapter.written] == \
+        [b"N1", b"N2", b"N3", b"N4"]
+
+    ok(queue)
+    assert instructions[0].is_confirmed()
+    assert not instructions[1].is_confirmed()
+    send_all(queue)
+    assert list(queue.in_flight) == instructions[1:5]
+
+
+def test_sender_fills_pipeline(queue):
+    """One nudge of the sender thread sends as many instructions
+    as the pipeline allows, every ok lets one more through"""
+    instructions = gcodes(6)
+    queue.enqueue_list(instructions)
+    queue.unblock_sending()
+    wait_for(lambda: len(queue.in_flight) == 4)
+    assert list(queue.in_flight) == instructions[:4]
+    assert len(queue.serial_adapter.written) == 4
+
+    ok(queue)
+    wait_for(lambda: len(queue.serial_adapter.written) == 5)
+    assert list(queue.in_flight) == instructions[1:5]
+
+
+def test_resend_in_flight(queue):
+    """A resend with instructions in flight re-sends them from history,
+    the rejections of the following ones get ignored"""
+    instructions = gcodes(5)
+    queue.enqueue_list(instructions)
+    send_all(queue)
+    ok(queue)
+    send_all(queue)
+    ok(queue)
+    assert [instruction.number for instruction in queue.in_flight] == \
+        [3, 4, 5]
+
+    # N3 got corrupted, the printer rejects it and the two after it
+    resend(queue, 3)
+    assert not queue.in_flight
+    assert all(instruction.is_confirmed() for instruction in instructions)
+    assert [instruction.number for instruction in
+            reversed(queue.recovery_list)] == [3, 4, 5]
+    assert (queue.stray_oks, queue.stray_resends) == (1, 2)
+
+    ok(queue)
+    for _ in range(2):
+        resend(queue, 3)
+        ok(queue)
+    assert (queue.stray_oks, queue.stray_resends) == (0, 0)
+    assert [instruction.number for instruction in
+            reversed(queue.recovery_list)] == [3, 4, 5]
+
+    written = len(queue.serial_adapter.written)
+    send_all(queue)
+    assert queue.serial_adapter.written[written:] == \
+        [instruction.data for instruction in instructions[2:]]
+    assert queue.message_number == 5
+    for _ in range(3):
+        ok(queue)
+    assert not queue.in_flight
+
+
+def test_genuine_ok_ends_strays(queue):
+    """After a genuine ok, a resend of the same number is a new one"""
+    instructions = gcodes(4)
+    queue.enqueue_list(instructions)
+    send_all(queue)
+    ok(queue)
+    resend(queue, 2)
+    assert queue.stray_resends == 2
+    ok(queue)
+    send_all(queue)
+    ok(queue)
+    assert queue.stray_resends == 0
+
+    resend(queue, 2)
+    assert [instruction.number for instruction in
+            reversed(queue.recovery_list)] == [2, 3, 4]
+
+
+def test_impossible_resend(queue):
+    """Asking for what is not in the history fails the communication"""
+    failed = []
+    queue.serial_queue_failed.connect(failed.append, weak=False)
+    queue.enqueue_list(gcodes(2))
+    send_all(queue)
+    resend(queue, 1)
+    assert failed == [queue]
+
+
+def test_rx_got_yeeted(queue):
+    """The in flight instructions get sent again, the same data in the
+    same order, a non-pipelined one gets re-sent right away"""
+    instructions = gcodes(3)
+    queue.enqueue_list(instructions)
+    send_all(queue)
+    sent = list(queue.serial_adapter.written)
+
+    queue._rx_got_yeeted()  # pylint: disable=protected-access
+    assert not queue.in_flight
+    assert not any(instruction.is_sent() for instruction in instructions)
+    send_all(queue)
+    assert queue.serial_adapter.written[3:] == sent
+    assert queue.message_number == 3
+
+    for _ in range(3):
+        ok(queue)
+    query = Instruction("M115")
+    queue.enqueue_one(query)
+    send_all(queue)
+    assert queue.current_instruction is query
+    queue._rx_got_yeeted()  # pylint: disable=protected-access
+    assert queue.serial_adapter.written[-2:] == [b"M115\n"] * 2
+    assert queue.current_instruction is query
@@ -0,0 +1,44 @@
+"""Tests for the status stream"""
+from threading import Thread
+from time import sleep
+
+from prusa.link.printer_adapter.structures.generation import (  # type:ignore
+    Generation,
+)
+from prusa.link.web.lib.status_stream import (  # type:ignore
+    merge_patch,
+    status_events,
+)
+
+
+def test_merge_patch():
+    """Only the changes get into the patch, removed keys become None"""
+    old = {"printer": {"temp_bed": 60, "temp_nozzle": 200},
+           "job": {"id": 1}, "storage": [1, 2]}
+    new = {"printer": {"temp_bed": 60, "temp_nozzle": 210},
+           "storage": [1, 2], "transfer": {"id": 3}}
+    assert merge_patch(old, new) == {
+        "printer": {"temp_nozzle": 210}, "job": None, "transfer": {"id": 3}}
+    assert merge_patch(new, new) == {}
+
+
+def test_events():
+    """The whole status comes first, then the patches once the
+    generation moves on"""
+    generation = Generation()
+    temps = {"value": 20}
+    events = status_events(
+        generation,
+        status=lambda _: {"printer": {"temp_bed": temps["value"]}},
+        live_active=lambda: False)
+    assert next(events) == \
+        b'event: status\ndata: {"printer": {"temp_bed": 20}}\n\n'
+
+    def change():
+        sleep(0.05)
+        temps["value"] = 21
+        generation.bump()
+
+    Thread(target=change, daemon=True).start()
+    assert next(events) == \
+        b'event: patch\ndata: {"printer": {"temp_bed": 21}}\n\n'
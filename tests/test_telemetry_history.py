@@ -0,0 +1,54 @@
+"""Tests for the telemetry history"""
+import pytest
+
+from prusa.link.printer_adapter.structures.telemetry_history import (  # type:ignore
+    TelemetryHistory,
+)
+
+START = 1_000_000
+
+
+def make_history():
+    """A history of two metrics with a short fine and a long coarse level"""
+    return TelemetryHistory(("temp_nozzle", "speed"), ((10, 3), (1, 5)))
+
+
+def test_rollups():
+    """Values get averaged into the buckets of every level"""
+    history = make_history()
+    for second in range(8):
+        history.record([(("temp_nozzle",), float(second)),
+                        (("axis_z",), 1.)], timestamp=START + second)
+
+    fine = history.query(["temp_nozzle"], since=START, now=START + 8)
+    assert fine["resolution"] == 10
+    assert fine["metrics"]["temp_nozzle"] == {
+        "timestamps": [START], "values": [3.5]}
+
+    fine = history.query(["temp_nozzle"], since=START + 4, now=START + 8)
+    assert fine["resolution"] == 1
+    # The ring holds just five, the unfinished bucket is included
+    assert fine["metrics"]["temp_nozzle"] == {
+        "timestamps": [START + 4, START + 5, START + 6, START + 7],
+        "values": [4., 5., 6., 7.]}
+
+
+def test_ring_overwrites():
+    """The oldest buckets get overwritten, the memory stays the same"""
+    history = make_history()
+    for second in range(20):
+        history.record([(("speed",), 100.)], timestamp=START + second)
+    series = history.series["speed"][0]
+    assert series.count == 5 and len(series.values) == 5
+
+    data = history.query(["speed"], now=START + 20)
+    assert data["metrics"]["speed"]["timestamps"] == list(
+        range(START + 15, START + 20))
+
+
+def test_unknown_metric():
+    """Only the tracked metrics can be asked for"""
+    history = make_history()
+    assert history.metrics == ["temp_nozzle", "speed"]
+    with pytest.raises(KeyError):
+        history.query(["axis_z"])
@@ -0,0 +1,107 @@
+"""Tests for the flattened telemetry table"""
+from prusa.link.printer_adapter.structures.model_classes import (  # type:ignore
+    IndividualSlot,
+    Slot,
+    Telemetry,
+)
+from prusa.link.printer_adapter.structures.telemetry_table import (
+    TelemetryTable,
+)
+
+FILTERED = 1
+JITTER = 2
+
+
+def make_table():
+    """A table with the temps jitter filtered and the progress filtered"""
+    return TelemetryTable(
+        Telemetry,
+        masks={("temp_nozzle",): JITTER,
+               ("slot", "1", "temp"): JITTER,
+               ("progress",): FILTERED,
+               ("slot",): FILTERED << 2},
+        jitter_bit=JITTER,
+        jitter_threshold=0.5)
+
+
+def test_diff():
+    """Only the values that differ from the sent ones get sent,
+    the temperatures only if they changed by more than the threshold"""
+    table = make_table()
+    model = Telemetry()
+    table.apply(table.flatten(Telemetry(temp_nozzle=20.0, speed=100)),
+                0, model)
+    assert table.take_pending() == {"temp_nozzle": 20.0, "speed": 100}
+    assert model.temp_nozzle == 20.0 and model.speed == 100
+
+    changed, model_changed = table.apply(
+        table.flatten(Telemetry(temp_nozzle=20.3, speed=100, flow=95)),
+        0, model)
+    assert [channel.path for channel in changed] == [("flow",)]
+    assert model_changed
+
+    _, model_changed = table.apply(
+        table.flatten(Telemetry(speed=100)), 0, model)
+    assert not model_changed
+    assert table.take_pending() == {"flow": 95}
+    # The model gets the precise value anyway
+    assert model.temp_nozzle == 20.3
+
+    # Going back to what was sent cancels the sending
+    table.apply(table.flatten(Telemetry(speed=50)), 0, model)
+    table.apply(table.flatten(Telemetry(speed=100)), 0, model)
+    assert table.take_pending() == {}
+
+
+def test_filter():
+    """Filtered values are removed from the model, and come back
+    when the filter is off"""
+    table = make_table()
+    model = Telemetry()
+    table.apply(table.flatten(Telemetry(progress=10)), 0, model)
+    table.take_pending()
+
+    table.apply(table.full_values(), FILTERED, model)
+    assert model.progress is None
+    table.apply(table.flatten(Telemetry(progress=20)), FILTERED, model)
+    assert model.progress is None and table.take_pending() == {}
+
+    table.apply(table.full_values(), 0, model)
+    assert model.progress == 20
+    assert table.take_pending() == {"progress": 20}
+
+
+def test_slots():
+    """The MMU slots are written into the model and sent merged
+    into the slot dict"""
+    table = make_table()
+    model = Telemetry()
+    telemetry = Telemetry(slot=Slot(
+        active=1, slots={"1": IndividualSlot(temp=30.0)}))
+    table.apply(table.flatten(telemetry), 0, model)
+    assert model.slot.active == 1
+    assert model.slot.slots["1"].temp == 30.0
+    assert table.take_pending() == {"slot": {"active": 1, "1": {"temp": 30.0}}}
+    assert table.get(("slot", "1", "temp")).jitter
+
+    # The whole slot subtree is filtered
+    table.apply(table.full_values(), FILTERED << 2, model)
+    assert model.slot.active is None
+    assert model.slot.slots["1"].temp is None
+
+
+def test_resend_and_wipe():
+    """Resending marks everything in the model, wiping forgets it all"""
+    table = make_table()
+    model = Telemetry()
+    table.apply(table.flatten(Telemetry(speed=100, flow=95)), 0, model)
+    table.take_pending()
+
+    table.resend()
+    assert table.take_pending() == {"speed": 100, "flow": 95}
+
+    table.wipe()
+    model = Telemetry()
+    table.apply(table.flatten(Telemetry(speed=100)), 0, model)
+    assert table.take_pending() == {"speed": 100}
+    assert model.speed == 100
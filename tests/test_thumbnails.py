@@ -0,0 +1,100 @@
+"""Tests for the decoded thumbnail cache"""
+import json
+import os
+from base64 import encodebytes
+
+from prusa.link.printer_adapter.metadata_index import (  # type:ignore
+    IndexEntry,
+    MetadataIndex,
+)
+from prusa.link.web.lib.thumbnails import (  # type:ignore
+    RECORD_SIZE,
+    ThumbnailCache,
+    content_etag,
+)
+
+IMAGE = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+
+
+def make_print_file(tmp_path, name, image=IMAGE):
+    """Writes a print file with a gcode-metadata cache holding its
+    preview, returns its path and index entry"""
+    os_path = str(tmp_path / name)
+    with open(os_path, "w", encoding="utf-8") as gcode:
+        gcode.write("G28\n")
+    cache = {"metadata": {},
+             "preview": {"resolution": "640x480",
+                         "format": "PNG",
+                         "data": encodebytes(image).decode()}}
+    cache_path = os.path.join(tmp_path, "." + name + ".cache")
+    with open(cache_path, "w", encoding="utf-8") as cache_file:
+        json.dump(cache, cache_file)
+    stat = os.stat(os_path)
+    entry = IndexEntry(size=stat.st_size, mtime_ns=stat.st_mtime_ns,
+                       data={}, preview="640x480_PNG")
+    return os_path, entry
+
+
+def test_memory(tmp_path):
+    """Decoded thumbnails are shared until they do not fit"""
+    os_path, entry = make_print_file(tmp_path, "a.gcode")
+    thumbnails = ThumbnailCache(2 * (len(IMAGE) + RECORD_SIZE))
+    thumbnail = thumbnails.get(os_path, entry)
+    assert thumbnail.data == IMAGE
+    assert thumbnail.path is None
+    assert thumbnail.img_format == "png"
+    assert thumbnail.etag == content_etag(IMAGE)
+    assert thumbnails.get(os_path, entry) is thumbnail
+
+    others = [make_print_file(tmp_path, name)
+              for name in ("b.gcode", "c.gcode")]
+    for other_path, other_entry in others:
+        thumbnails.get(other_path, other_entry)
+    assert thumbnails.size <= thumbnails.max_bytes
+    assert (os_path, entry.mtime_ns, entry.size) not in thumbnails.thumbnails
+
+    assert thumbnails.get(os_path, entry._replace(preview=None)) is None
+
+
+def test_store(tmp_path):
+    """The image files survive a restart, the old versions get removed"""
+    store_dir = str(tmp_path / "thumbnails")
+    os_path, entry = make_print_file(tmp_path, "a.gcode")
+    thumbnail = ThumbnailCache(1024, store_dir).get(os_path, entry)
+    assert thumbnail.data is None
+    with open(thumbnail.path, "rb") as image_file:
+        assert image_file.read() == IMAGE
+
+    # A new cache, the gcode-metadata cache is not needed anymore
+    os.unlink(os.path.join(tmp_path, ".a.gcode.cache"))
+    thumbnails = ThumbnailCache(1024, store_dir)
+    assert thumbnails.get(os_path, entry) == thumbnail
+
+    changed = IMAGE[::-1]
+    os_path, entry = make_print_file(tmp_path, "a.gcode", changed)
+    entry = entry._replace(mtime_ns=entry.mtime_ns + 1)
+    new_thumbnail = thumbnails.get(os_path, entry)
+    assert new_thumbnail.etag == content_etag(changed)
+    assert os.listdir(os.path.dirname(new_thumbnail.path)) == \
+        [os.path.basename(new_thumbnail.path)]
+
+
+def test_forget(tmp_path):
+    """The thumbnails of the files the index forgets get removed,
+    the ones the index does not know get pruned"""
+    store_dir = str(tmp_path / "thumbnails")
+    index = MetadataIndex(str(tmp_path / "index.json"), workers=0)
+    gone_path, gone_entry = make_print_file(tmp_path, "gone.gcode")
+    os_path, entry = make_print_file(tmp_path, "kept.gcode")
+    index.entries[os_path] = entry
+    gone = ThumbnailCache(1024, store_dir).get(gone_path, gone_entry)
+
+    thumbnails = ThumbnailCache(1024, store_dir)
+    thumbnails.follow(index)
+    assert not os.path.exists(os.path.dirname(gone.path))
+
+    thumbnail = thumbnails.get(os_path, entry)
+    assert os.path.exists(thumbnail.path)
+    index.forget(str(tmp_path))
+    assert not os.listdir(store_dir)
+    assert not thumbnails.thumbnails and not thumbnails.size
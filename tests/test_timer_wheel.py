@@ -0,0 +1,69 @@
+"""Tests for the timer wheel"""
+from threading import Event
+from time import sleep, time
+
+import pytest
+
+from prusa.link.printer_adapter.structures.timer_wheel import (  # type:ignore
+    TimerWheel,
+)
+
+THRESHOLD = 0.05
+
+
+@pytest.fixture
+def wheel():
+    """A running timer wheel with a short revolution"""
+    timer_wheel = TimerWheel(resolution=0.01, slots=16)
+    timer_wheel.start()
+    yield timer_wheel
+    timer_wheel.stop()
+    timer_wheel.join()
+
+
+def test_order(wheel):
+    """Timers fire in the order of their deadlines, never early"""
+    fired = []
+    done = Event()
+    start = time()
+    # The later ones are more than a revolution away
+    for number, delay in enumerate((0.3, 0.05, 0.2, 0.1)):
+        wheel.schedule(number, start + delay,
+                       lambda number, deadline: fired.append(
+                           (number, time() >= deadline)),
+                       number, start + delay)
+    wheel.schedule("done", start + 0.3, done.set)
+    assert done.wait(0.3 + THRESHOLD)
+    sleep(THRESHOLD)
+    assert fired == [(1, True), (3, True), (2, True), (0, True)]
+    assert not wheel
+
+
+def test_rescheduling(wheel):
+    """Re-scheduling replaces the timer, cancelling removes it"""
+    fired = []
+    start = time()
+    wheel.schedule("moved", start + 0.05, fired.append, "early")
+    wheel.schedule("moved", start + 0.1, fired.append, "late")
+    wheel.schedule("cancelled", start + 0.05, fired.append, "cancelled")
+    assert len(wheel) == 2
+    wheel.cancel("cancelled")
+    wheel.cancel("unknown")
+    assert "cancelled" not in wheel
+
+    sleep(0.1 + THRESHOLD)
+    assert fired == ["late"]
+    assert not wheel
+
+
+def test_failing_callback(wheel):
+    """A failing callback does not stop the others"""
+    done = Event()
+
+    def fail():
+        raise RuntimeError("Test")
+
+    start = time()
+    wheel.schedule("fail", start, fail)
+    wheel.schedule("done", start + 0.01, done.set)
+    assert done.wait(THRESHOLD)
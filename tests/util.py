@@ -1,5 +1,6 @@
 """Utility functions and classes for tests"""
 from threading import Event
+from time import monotonic, sleep
 from unittest import mock
 from unittest.mock import Mock
 
@@ -13,6 +14,14 @@ def waiter(event: Event):
     return mock.DEFAULT
 
 
+def wait_for(predicate, timeout=5):
+    """Waits for the threads to get something done"""
+    start = monotonic()
+    while not predicate():
+        assert monotonic() - start < timeout
+        sleep(0.01)
+
+
 class WaitingMock(Mock):
     """
     Waits for its built in event when called, otherwise it's a regular mock
@@ -46,3 +55,27 @@ class EventSetMock(Mock):
     def reset_mock(self, *args, **kwargs) -> None:
         super().reset_mock(*args, **kwargs)
         self.event.clear()
+
+
+class FakeParser:
+    """Just keeps the handlers, the tests call them"""
+
+    def add_handler(self, regexp, handler, priority=0):
+        """Handlers get called directly"""
+
+    def remove_handler(self, regexp, handler):
+        """Handlers get called directly"""
+
+    def add_decoupled_handler(self, regexp, handler, priority=0):
+        """Handlers get called directly"""
+
+
+class FakeAdapter:
+    """Remembers what got written"""
+
+    def __init__(self):
+        self.written = []
+
+    def write(self, data):
+        """Records the written line"""
+        self.written.append(data)